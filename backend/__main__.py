@@ -0,0 +1,100 @@
+"""
+Command line entry point.
+
+    python -m backend serve --workers 4 --port 8000
+
+With more than one worker, uvicorn forks N processes that each import
+backend.main. They share state through SQLite files in one directory
+(--state-dir, a fresh temporary directory by default): the disk tier of
+the prediction cache and the metrics snapshots that /metrics sums. The
+bulk job store (JOBS_DB_PATH) is shared as well.
+
+    python -m backend traces traces.jsonl --slowest 5
+
+prints flame-style latency breakdowns of the traces kept under TRACE_PATH.
+"""
+import argparse
+import os
+import tempfile
+
+def serve(args: argparse.Namespace):
+    import uvicorn
+
+    if args.workers > 1 or args.state_dir:
+        state_dir = args.state_dir or tempfile.mkdtemp(prefix="ckd-state-")
+        os.makedirs(state_dir, exist_ok=True)
+        # Workers inherit the environment; explicit settings win
+        os.environ.setdefault("PREDICTION_CACHE_PATH", os.path.join(state_dir, "prediction_cache.sqlite3"))
+        os.environ.setdefault("METRICS_SHARED_PATH", os.path.join(state_dir, "metrics.sqlite3"))
+        print(f"Sharing cache and metrics across {args.workers} workers in {state_dir}")
+
+    uvicorn.run(
+        "backend.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+def traces(args: argparse.Namespace):
+    from backend.tracing import format_trace, load_traces, select_traces, summarize, trace_duration, trace_failed
+
+    traces = load_traces(args.path)
+    if args.trace_id:
+        if args.trace_id not in traces:
+            raise SystemExit(f"Trace {args.trace_id} is not in {args.path}")
+        chosen = [(args.trace_id, traces[args.trace_id])]
+    else:
+        chosen = list(select_traces(traces, args.name, args.errors, args.min_ms))
+
+    if args.folded:
+        # Collapsed stacks (self time in microseconds) for flamegraph.pl or speedscope
+        for row in summarize(spans for _, spans in chosen):
+            print(f"{row['path']} {row['self_ns'] // 1000}")
+        return
+    print(f"{len(chosen)} of {len(traces)} traces")
+    if args.summary:
+        rows = summarize(spans for _, spans in chosen)
+        total = sum(row["self_ns"] for row in rows) or 1
+        print(f"{'count':>7} {'self ms':>12} {'self %':>7} {'p50 ms':>9} {'p95 ms':>9}  span path")
+        for row in rows:
+            print(
+                f"{row['count']:>7} {row['self_ns'] / 1e6:>12.1f} {100 * row['self_ns'] / total:>6.1f}% "
+                f"{row['p50_ns'] / 1e6:>9.2f} {row['p95_ns'] / 1e6:>9.2f}  {row['path']}"
+            )
+        return
+    for trace_id, spans in chosen[:args.slowest]:
+        status = "  ERROR" if trace_failed(spans) else ""
+        print(f"\ntrace {trace_id}  {trace_duration(spans) / 1e6:.1f} ms  {len(spans)} spans{status}")
+        print("\n".join(format_trace(spans, traces=traces)))
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m backend", description="CKD prediction backend")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Run the API, optionally with several worker processes")
+    serve_parser.add_argument("--host", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    serve_parser.add_argument("--state-dir", default=os.getenv("CKD_STATE_DIR"), help="Directory for state shared by workers")
+    serve_parser.add_argument("--log-level", default="info")
+    serve_parser.add_argument("--graceful-timeout", type=float, default=30.0, help="Seconds to drain in-flight requests on shutdown")
+    serve_parser.set_defaults(handler=serve)
+
+    traces_parser = commands.add_parser("traces", help="Print latency breakdowns of traces written under TRACE_PATH")
+    traces_parser.add_argument("path", nargs="?", default=os.getenv("TRACE_PATH", "traces.jsonl"))
+    traces_parser.add_argument("--slowest", type=int, default=5, help="Traces to draw, slowest first")
+    traces_parser.add_argument("--trace-id", help="Draw only this trace")
+    traces_parser.add_argument("--name", help="Only traces whose root span has this name, e.g. 'POST /predict'")
+    traces_parser.add_argument("--errors", action="store_true", help="Only traces with a failed span")
+    traces_parser.add_argument("--min-ms", type=float, default=0.0, help="Only traces at least this long")
+    traces_parser.add_argument("--summary", action="store_true", help="Self time and percentiles per span path instead")
+    traces_parser.add_argument("--folded", action="store_true", help="Collapsed stacks for flame graph tools instead")
+    traces_parser.set_defaults(handler=traces)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Admission control for the prediction endpoints.
+
+- AdmissionController: bounded concurrency plus a bounded wait queue;
+  requests beyond both are rejected immediately with 503 + Retry-After
+- CircuitBreaker: opens after consecutive backend failures and fails fast
+  until a probe call succeeds
+- RateLimiter: optional per-API-key token buckets (429 + Retry-After)
+- run_with_deadline: cancels work when the request deadline passes or the
+  client disconnects, so nobody pays for answers that will not be read
+"""
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+import asyncio
+import math
+import os
+import time
+
+from backend import tracing
+
+class Rejected(Exception):
+    """Request refused before doing backend work"""
+
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        if self.retry_after is None:
+            return {}
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+class AdmissionController:
+    """
+    At most max_concurrency requests run; at most max_queue wait for a slot
+    in FIFO order. Waiters are plain futures so the controller is not tied
+    to the event loop it was created on.
+    """
+
+    def __init__(self, max_concurrency: int = 256, max_queue: int = 1024):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.rejected = 0
+        # Smoothed time a request holds its slot, for Retry-After estimates
+        self.service_time = 0.5
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> float:
+        """Take a slot or raise Rejected; returns the time the slot was granted"""
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return time.monotonic()
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            retry_after = self.service_time * (len(self._waiters) + 1) / max(self.max_concurrency, 1)
+            raise Rejected(503, "queue_full", "Server is at capacity, retry later", retry_after)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            with tracing.span("admission.queue", attributes={"queue.position": len(self._waiters)}):
+                await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over as we were cancelled; pass it on
+                self._hand_over()
+            raise
+        finally:
+            if future in self._waiters:
+                self._waiters.remove(future)
+        return time.monotonic()
+
+    def release(self, granted_at: float):
+        self.service_time = 0.9 * self.service_time + 0.1 * (time.monotonic() - granted_at)
+        self._hand_over()
+
+    def _hand_over(self):
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                # active is unchanged: the slot moves straight to the waiter
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    async def run(self, work: Callable[[], Awaitable[Any]]) -> Any:
+        granted_at = await self.acquire()
+        try:
+            return await work()
+        finally:
+            self.release(granted_at)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+class CircuitBreaker:
+    """
+    Closed: calls flow. After failure_threshold consecutive failures the
+    breaker opens and rejects calls for reset_timeout seconds, then lets a
+    single probe through (half-open); its outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def _reject(self):
+        remaining = self.reset_timeout - (self.clock() - self.opened_at)
+        raise Rejected(503, "circuit_open", "LLM backend is failing, circuit open", max(remaining, 1))
+
+    def reject_if_open(self):
+        """Cheap pre-check at the door; does not claim the half-open probe"""
+        if self.state == "open":
+            self._reject()
+
+    def check(self) -> bool:
+        """Raise Rejected while open; returns True if this call is the half-open probe"""
+        state = self.state
+        if state == "open" or (state == "half-open" and self._probe_in_flight):
+            self._reject()
+        if state == "half-open":
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probe_in_flight or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """A call ended without an outcome (cancelled); let another probe through"""
+        self._probe_in_flight = False
+
+    async def call(self, work: Callable[[], Awaitable[Any]], failed: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Run work through the breaker; failed(result) marks soft failures such as all-error batches"""
+        probe = self.check()
+        try:
+            result = await work()
+        except asyncio.CancelledError:
+            if probe:
+                self.release_probe()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        if failed is not None and failed(result):
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """0 if a token was taken, else seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class RateLimiter:
+    """Token bucket per API key; the least recently seen keys are forgotten"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, max_keys: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def check(self, key: str):
+        now = self.clock()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        wait = bucket.take(now)
+        if wait:
+            raise Rejected(429, "rate_limited", "Rate limit exceeded", wait)
+
+async def _wait_for_disconnect(receive: Callable[[], Awaitable[Dict[str, Any]]]):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def run_with_deadline(work: Awaitable[Any], timeout: Optional[float], receive: Optional[Callable] = None) -> Any:
+    """
+    Await work, cancelling it when the deadline passes (504) or the client
+    disconnects (499). receive is the ASGI receive callable of a request
+    whose body has already been read.
+    """
+    task = asyncio.ensure_future(work)
+    watchers = {task}
+    disconnect = None
+    if receive is not None:
+        disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+        watchers.add(disconnect)
+    try:
+        done, _ = await asyncio.wait(watchers, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        if disconnect is not None:
+            disconnect.cancel()
+
+    if task in done:
+        return task.result()
+    task.cancel()
+    if disconnect is not None and disconnect in done:
+        raise Rejected(499, "disconnected", "Client closed request")
+    raise Rejected(504, "deadline", "Deadline exceeded before the prediction finished")
+
+def build_admission_from_env():
+    """(AdmissionController, CircuitBreaker, Optional[RateLimiter], default timeout) from environment"""
+    admission = AdmissionController(
+        max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "256")),
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "1024"))
+    )
+    breaker = CircuitBreaker(
+        failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+        reset_timeout=float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+    )
+    limiter = None
+    if os.getenv("RATE_LIMIT_RPS"):
+        limiter = RateLimiter(
+            rate=float(os.getenv("RATE_LIMIT_RPS")),
+            burst=float(os.getenv("RATE_LIMIT_BURST")) if os.getenv("RATE_LIMIT_BURST") else None
+        )
+    timeout = float(os.getenv("PREDICT_TIMEOUT", "30"))
+    return admission, breaker, limiter, timeout
@@ -0,0 +1,336 @@
+"""
+NumPy-only CKD baseline used as a fast tier in front of the LLM.
+
+The model is a class-balanced logistic regression trained on the Kaggle CKD
+dataset (backend/ckd_dataset.csv) and exported to plain arrays in
+backend/baseline_model.json. Only serum creatinine, blood urea and blood
+pressure overlap between that dataset and PatientData, so those are the
+inputs; the dataset's BUN is converted to blood urea (urea = BUN * 2.14).
+
+A stratified quarter of the rows is held out: its scores calibrate the
+probabilities (Platt scaling) and pick the router's confidence threshold.
+Both are stored with the weights.
+
+Regenerate the weights with:
+
+    python -m backend.baseline train
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+import argparse
+import json
+import os
+
+import numpy as np
+
+from backend.features import FEATURE_NAMES, PatientFeatures, PatientRecord
+from backend.providers import LLMProvider, StreamEvent, result_events
+
+DATASET_PATH = os.path.join(os.path.dirname(__file__), "ckd_dataset.csv")
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "baseline_model.json")
+
+UREA_PER_BUN = 2.14
+
+# (PatientFeatures column, log-transform, risk factor wording when it pushes towards CKD)
+BASELINE_INPUTS = (
+    ("serum_creatinine", True, "elevated serum creatinine"),
+    ("blood_urea", True, "elevated blood urea"),
+    ("blood_pressure", False, "high blood pressure"),
+)
+
+_COLUMNS = np.array([FEATURE_NAMES.index(name) for name, _, _ in BASELINE_INPUTS])
+_LOG = np.array([log for _, log, _ in BASELINE_INPUTS])
+
+# Kidney function markers; blood pressure alone never decides a fast-path answer
+KIDNEY_MARKERS = ("serum_creatinine", "blood_urea")
+_MARKERS = np.array([i for i, (name, _, _) in enumerate(BASELINE_INPUTS) if name in KIDNEY_MARKERS])
+
+HELD_OUT_FRACTION = 0.25
+TARGET_ACCURACY = 0.95
+
+def _transform(raw: np.ndarray) -> np.ndarray:
+    """Raw (n, k) baseline inputs -> model space"""
+    out = raw.astype(np.float64, copy=True)
+    out[:, _LOG] = np.log(np.maximum(out[:, _LOG], 1e-3))
+    return out
+
+def features_matrix(records: Sequence[PatientRecord]) -> np.ndarray:
+    """Stack records into an (n, len(FEATURE_NAMES)) float64 matrix"""
+    rows = [r if isinstance(r, PatientFeatures) else PatientFeatures.from_dict(r) for r in records]
+    return np.array(rows, dtype=np.float64).reshape(len(rows), len(FEATURE_NAMES))
+
+def load_dataset(path: str = DATASET_PATH) -> Tuple[np.ndarray, np.ndarray]:
+    """Baseline inputs and CKD labels from the Kaggle CSV, without pandas"""
+    with open(path) as f:
+        header = f.readline().strip().split(",")
+    columns = {name: i for i, name in enumerate(header)}
+    numeric = np.genfromtxt(
+        path, delimiter=",", skip_header=1,
+        usecols=(columns["serum_creatinine"], columns["bun"], columns["blood_pressure"])
+    )
+    labels = np.genfromtxt(path, delimiter=",", skip_header=1, usecols=columns["ckd_pred"], dtype=str)
+    raw = np.column_stack([numeric[:, 0], numeric[:, 1] * UREA_PER_BUN, numeric[:, 2]])
+    return raw, (labels == "CKD").astype(np.float64)
+
+def _class_weights(labels: np.ndarray) -> np.ndarray:
+    # Balance classes so the score reflects the labs, not the 97% CKD prior
+    positives = labels.mean()
+    return np.where(labels == 1, 0.5 / positives, 0.5 / (1 - positives))
+
+def _fit_logistic(Z: np.ndarray, labels: np.ndarray, penalty: np.ndarray, iterations: int) -> np.ndarray:
+    """Class-balanced, L2-regularized logistic regression via Newton's method"""
+    weights = _class_weights(labels)
+    beta = np.zeros(Z.shape[1])
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(-(Z @ beta)))
+        gradient = Z.T @ (weights * (p - labels)) + penalty * beta
+        hessian = (Z * (weights * p * (1 - p))[:, None]).T @ Z + np.diag(penalty)
+        step = np.linalg.solve(hessian, gradient)
+        beta -= step
+        if np.abs(step).max() < 1e-8:
+            break
+    return beta
+
+def _held_out_mask(labels: np.ndarray, fraction: float, seed: int) -> np.ndarray:
+    """Stratified split: the same fraction of each class is held out"""
+    rng = np.random.default_rng(seed)
+    held_out = np.zeros(len(labels), dtype=bool)
+    for label in (0.0, 1.0):
+        rows = np.flatnonzero(labels == label)
+        held_out[rng.permutation(rows)[:int(round(len(rows) * fraction))]] = True
+    return held_out
+
+class BaselineModel:
+    """Logistic regression with Platt calibration, stored as plain arrays"""
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray, coef: np.ndarray, intercept: float,
+                 metadata: Optional[Dict[str, Any]] = None, calibration: Tuple[float, float] = (1.0, 0.0)):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.metadata = metadata or {}
+        self.calibration = (float(calibration[0]), float(calibration[1]))
+        # Fold standardization and calibration into the weights so scoring is one matmul
+        slope, offset = self.calibration
+        self._weights = slope * self.coef / self.scale
+        self._bias = slope * (self.intercept - float(self.mean @ (self.coef / self.scale))) + offset
+
+    @property
+    def router_threshold(self) -> Optional[float]:
+        """Confidence threshold picked on the held-out rows, when the model was trained with one"""
+        return self.metadata.get("router", {}).get("threshold")
+
+    @classmethod
+    def fit(cls, raw: np.ndarray, labels: np.ndarray, l2: float = 1e-2, iterations: int = 50,
+            held_out_fraction: float = HELD_OUT_FRACTION, target_accuracy: float = TARGET_ACCURACY,
+            seed: int = 0) -> "BaselineModel":
+        """Fit on the training split, then calibrate and choose the router threshold on the held-out split"""
+        held_out = _held_out_mask(labels, held_out_fraction, seed)
+        X = _transform(raw[~held_out])
+        mean, scale = X.mean(axis=0), X.std(axis=0)
+        Z = np.column_stack([(X - mean) / scale, np.ones(len(X))])
+        penalty = np.full(Z.shape[1], l2)
+        penalty[-1] = 0.0
+        beta = _fit_logistic(Z, labels[~held_out], penalty, iterations)
+        model = cls(mean, scale, beta[:-1], beta[-1])
+
+        # Platt scaling on held-out logits, class-balanced like the fit
+        logits = _transform(raw[held_out]) @ model._weights + model._bias
+        slope, offset = _fit_logistic(np.column_stack([logits, np.ones(len(logits))]), labels[held_out], np.zeros(2), iterations)
+        model = cls(mean, scale, beta[:-1], beta[-1], calibration=(slope, offset))
+
+        truth = labels[held_out] == 1
+        probability = model.score_raw(raw[held_out])
+        answers = probability >= 0.5
+        weights = _class_weights(labels[held_out])
+        threshold, accuracy, coverage = 1.0, None, 0.0
+        # Lowest threshold whose fast-path answers reach the target balanced accuracy
+        for candidate in np.round(np.arange(0.5, 1.0, 0.01), 2):
+            fast = model.fast_path_raw(raw[held_out], candidate, probability)
+            if not fast.any():
+                break
+            correct = float((weights[fast] * (answers[fast] == truth[fast])).sum() / weights[fast].sum())
+            if correct >= target_accuracy:
+                threshold, accuracy, coverage = float(candidate), correct, float(fast.mean())
+                break
+
+        model.metadata = {
+            "inputs": [name for name, _, _ in BASELINE_INPUTS],
+            "training_rows": int((~held_out).sum()),
+            "held_out_rows": int(held_out.sum()),
+            "balanced_accuracy": float(0.5 * (answers[truth].mean() + (~answers[~truth]).mean())),
+            "calibration": {"method": "platt", "slope": float(slope), "offset": float(offset)},
+            "router": {
+                "threshold": threshold,
+                "target_accuracy": target_accuracy,
+                "held_out_accuracy": accuracy,
+                "held_out_coverage": coverage,
+                "requires": list(KIDNEY_MARKERS),
+            },
+        }
+        return model
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> "BaselineModel":
+        with open(path) as f:
+            payload = json.load(f)
+        metadata = payload.get("metadata") or {}
+        calibration = metadata.get("calibration", {})
+        return cls(
+            payload["mean"], payload["scale"], payload["coef"], payload["intercept"], metadata,
+            calibration=(calibration.get("slope", 1.0), calibration.get("offset", 0.0))
+        )
+
+    def save(self, path: str = MODEL_PATH):
+        payload = {
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "coef": self.coef.tolist(),
+            "intercept": self.intercept,
+            "metadata": self.metadata,
+        }
+        with open(path, "w") as f:
+            json.dump(payload, f, indent=2)
+
+    def score_raw(self, raw: np.ndarray) -> np.ndarray:
+        """CKD probability for an (n, 3) matrix of baseline inputs"""
+        return 1.0 / (1.0 + np.exp(-(_transform(raw) @ self._weights + self._bias)))
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        """CKD probability for an (n, len(FEATURE_NAMES)) features matrix"""
+        return self.score_raw(features[:, _COLUMNS])
+
+    def contributions(self, features: np.ndarray) -> np.ndarray:
+        """Per-input logit contributions relative to the training mean"""
+        return (_transform(features[:, _COLUMNS]) - self.mean) / self.scale * self.coef
+
+    def fast_path_raw(self, raw: np.ndarray, threshold: float, probability: Optional[np.ndarray] = None) -> np.ndarray:
+        """Rows of an (n, 3) baseline input matrix the baseline may answer without the LLM"""
+        if probability is None:
+            probability = self.score_raw(raw)
+        # Confident, and the kidney markers point the same way as the answer:
+        # high blood pressure with normal labs is left to the LLM
+        markers = ((_transform(raw) - self.mean) / self.scale * self.coef)[:, _MARKERS].sum(axis=1)
+        return (confidence_of(probability) >= threshold) & ((markers > 0) == (probability >= 0.5))
+
+    def fast_path(self, features: np.ndarray, threshold: float) -> np.ndarray:
+        """Rows of a features matrix the baseline may answer without the LLM"""
+        return self.fast_path_raw(features[:, _COLUMNS], threshold)
+
+def confidence_of(probability: np.ndarray) -> np.ndarray:
+    """Distance from the decision boundary, mapped to [0.5, 1]"""
+    return np.maximum(probability, 1 - probability)
+
+class BaselineProvider(LLMProvider):
+    """LLMClient-compatible backend that answers from the baseline model"""
+
+    model_name = "baseline-logreg-v1"
+
+    def __init__(self, model: Optional[BaselineModel] = None):
+        self.model = model or BaselineModel.load()
+
+    def predict_matrix(self, features: np.ndarray) -> List[Dict[str, Any]]:
+        probability = self.model.score(features)
+        confidence = confidence_of(probability)
+        contributions = self.model.contributions(features)
+        results = []
+        for p, c, contribution in zip(probability.tolist(), confidence.tolist(), contributions):
+            factors = [label for (_, _, label), value in zip(BASELINE_INPUTS, contribution) if value > 0.25]
+            level = "high" if p >= 0.5 else "low"
+            explanation = f"Based on the provided data, there is a {level} probability of CKD from the baseline model."
+            if factors:
+                explanation += " Key risk factors include " + ", ".join(factors) + "."
+            results.append({
+                "prediction": round(p, 4),
+                "confidence": round(c, 4),
+                "explanation": explanation,
+                "risk_factors": factors,
+            })
+        return results
+
+    async def complete(self, patient_data: PatientRecord) -> Dict[str, Any]:
+        return self.predict_matrix(features_matrix([patient_data]))[0]
+
+    async def complete_batch(self, records: List[PatientRecord]) -> List[Union[Dict[str, Any], Exception]]:
+        return self.predict_matrix(features_matrix(records))
+
+class RoutedProvider(LLMProvider):
+    """
+    Confidence-gated router: the baseline answers when it is sure, and only
+    uncertain records go to the slower LLM provider.
+    """
+
+    def __init__(self, llm: LLMProvider, baseline: Optional[BaselineProvider] = None, threshold: Optional[float] = None):
+        self.llm = llm
+        self.baseline = baseline or BaselineProvider()
+        # Default to the threshold chosen on held-out data at training time
+        self.threshold = threshold if threshold is not None else self.baseline.model.router_threshold
+        if self.threshold is None:
+            raise ValueError("The baseline model has no router threshold; pass one or retrain it")
+        self.model_name = f"{llm.model_name}+{self.baseline.model_name}@{self.threshold}"
+        self.prompt_version = llm.prompt_version
+        self.baseline_answers = 0
+        self.llm_calls = 0
+
+    def _route(self, records: List[PatientRecord]) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        features = features_matrix(records)
+        fast = self.baseline.predict_matrix(features)
+        uncertain = ~self.baseline.model.fast_path(features, self.threshold)
+        self.baseline_answers += int((~uncertain).sum())
+        self.llm_calls += int(uncertain.sum())
+        return fast, uncertain
+
+    async def complete(self, patient_data: PatientRecord) -> Dict[str, Any]:
+        return (await self.complete_batch([patient_data]))[0]
+
+    async def complete_batch(self, records: List[PatientRecord]) -> List[Union[Dict[str, Any], Exception]]:
+        fast, uncertain = self._route(records)
+        results: List[Union[Dict[str, Any], Exception]] = list(fast)
+        indices = np.flatnonzero(uncertain).tolist()
+        if indices:
+            slow = await self.llm.complete_batch([records[i] for i in indices])
+            for i, result in zip(indices, slow):
+                results[i] = result
+        return results
+
+    async def stream(self, patient_data: PatientRecord) -> AsyncIterator[StreamEvent]:
+        fast, uncertain = self._route([patient_data])
+        if uncertain[0]:
+            async for event in self.llm.stream(patient_data):
+                yield event
+        else:
+            for event in result_events(fast[0]):
+                yield event
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.baseline_answers + self.llm_calls
+        return {
+            "threshold": self.threshold,
+            "baseline_answers": self.baseline_answers,
+            "llm_calls": self.llm_calls,
+            "llm_call_fraction": self.llm_calls / total if total else 0.0,
+        }
+
+    def close(self):
+        self.llm.close()
+
+    async def astart(self):
+        await self.llm.astart()
+
+    async def aclose(self):
+        await self.llm.aclose()
+
+def main():
+    parser = argparse.ArgumentParser(description="CKD baseline model")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--output", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    raw, labels = load_dataset(args.dataset)
+    model = BaselineModel.fit(raw, labels)
+    model.save(args.output)
+    print(f"Saved baseline model to {args.output}: {model.metadata}")
+
+if __name__ == "__main__":
+    main()
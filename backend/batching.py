@@ -0,0 +1,84 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import os
+
+from backend import tracing
+from backend.features import PatientRecord
+
+BatchFn = Callable[[List[PatientRecord]], Awaitable[List[Any]]]
+
+class MicroBatcher:
+    """
+    Merges concurrent single predictions into one backend batch call.
+    A batch is flushed when it reaches max_batch_size or when the oldest
+    pending item has waited max_wait_ms, whichever comes first.
+    """
+
+    def __init__(self, predict_batch: BatchFn, max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size or int(os.getenv("BATCH_MAX_SIZE", "16"))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: List[Tuple[PatientRecord, asyncio.Future, Any]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def submit(self, record: PatientRecord) -> Dict[str, Any]:
+        """Queue one record and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with tracing.span("batch.wait") as wait:
+            self._pending.append((record, future, wait))
+
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+
+            return await future
+
+    async def submit_many(self, records: List[PatientRecord]) -> List[Any]:
+        """Queue several records; results (or exceptions) come back in input order"""
+        return await asyncio.gather(*(self.submit(r) for r in records), return_exceptions=True)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Callers that gave up (deadline, disconnect) are not sent to the backend
+        batch = [(record, future, wait) for record, future, wait in self._pending if not future.cancelled()]
+        self._pending = []
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._run_batch(batch))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[PatientRecord, asyncio.Future, Any]]):
+        waits = [wait for _, _, wait in batch]
+        # One backend call serves several requests, so the batch is a trace of
+        # its own, linked to each waiting request's span and back
+        with tracing.span("batch", parent=None, links=waits, attributes={"batch.size": len(batch)}) as batch_span:
+            for wait in waits:
+                wait.add_link(batch_span)
+            try:
+                results = await self.predict_batch([record for record, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Backend returned {len(results)} results for {len(batch)} records")
+            except Exception as e:
+                batch_span.record_error(e)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,281 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Union
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from backend.features import PatientFeatures
+from backend.instrumentation import timed_stage
+
+def cache_key(record: Union[PatientFeatures, Dict[str, Any]], model_name: str, prompt_version: str) -> str:
+    """Content address for a prediction: canonical payload + model + prompt version"""
+    digest = hashlib.sha256(f"{model_name}\0{prompt_version}\0".encode("utf-8"))
+    if isinstance(record, PatientFeatures):
+        digest.update(record.digest())
+    else:
+        digest.update(json.dumps(record, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+class MemoryCacheBackend:
+    """In-process LRU with a per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteCacheBackend:
+    """On-disk cache that survives restarts; least recently used rows are trimmed"""
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl: float = 86400.0, clock: Callable[[], float] = time.time,
+                 recount_every: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS predictions_accessed ON predictions (accessed_at)")
+        # Row count kept up to date by this process's own writes; other
+        # workers sharing the file are picked up by a recount every
+        # `recount_every` writes, so a write never pays for a full scan
+        self.recount_every = recount_every
+        self._write_count = 0
+        self._count = self._recount()
+
+    def _recount(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = self.clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM predictions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._count -= self._conn.execute("DELETE FROM predictions WHERE key = ?", (key,)).rowcount
+                return None
+            self._conn.execute("UPDATE predictions SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict[str, Any]):
+        now = self.clock()
+        row = (json.dumps(value), now + self.ttl, now, key)
+        with self._lock:
+            # One transaction, so a miss costs a single commit
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                added = 0
+                if not self._conn.execute(
+                    "UPDATE predictions SET value = ?, expires_at = ?, accessed_at = ? WHERE key = ?", row
+                ).rowcount:
+                    added = self._conn.execute(
+                        "INSERT OR IGNORE INTO predictions (value, expires_at, accessed_at, key) VALUES (?, ?, ?, ?)", row
+                    ).rowcount
+                self._write_count += 1
+                count = self._recount() if self._write_count % self.recount_every == 0 else self._count + added
+                evicted = 0
+                if count > self.max_entries:
+                    evicted = self._conn.execute(
+                        "DELETE FROM predictions WHERE key IN "
+                        "(SELECT key FROM predictions ORDER BY accessed_at LIMIT ?)",
+                        (count - self.max_entries,)
+                    ).rowcount
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._count = count - evicted
+            self.evictions += evicted
+
+    def __len__(self) -> int:
+        # The tracked count: no query, so callers on the event loop never wait on a write
+        return self._count
+
+    def close(self):
+        self._conn.close()
+
+class PredictionCache:
+    """
+    Two-level prediction cache (memory, then optional disk) with single-flight
+    deduplication: concurrent misses for the same key share one computation.
+
+    Inside the event loop only the memory LRU is touched inline; disk reads
+    run on a single cache thread and disk writes are queued behind it.
+    """
+
+    def __init__(self, memory: MemoryCacheBackend, disk: Optional[SQLiteCacheBackend] = None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[str, int] = {}
+        self.disk_write_errors = 0
+        self._writes: Set[asyncio.Future] = set()
+        # One worker keeps disk writes in order and off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prediction-cache") if disk is not None else None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Blocking two-level read, for callers outside the event loop"""
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Blocking two-level write, for callers outside the event loop"""
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    async def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = await asyncio.get_running_loop().run_in_executor(self._executor, self.disk.get, key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    async def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Counted lookup for callers that compute misses themselves"""
+        with timed_stage("cache"):
+            value = await self._load(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def store(self, key: str, value: Dict[str, Any]):
+        """Cache a value from inside the event loop; the disk write happens in the background"""
+        self.memory.set(key, value)
+        if self.disk is None:
+            return
+        write = asyncio.get_running_loop().run_in_executor(self._executor, self.disk.set, key, value)
+        self._writes.add(write)
+        write.add_done_callback(self._written)
+
+    def _written(self, write: asyncio.Future):
+        self._writes.discard(write)
+        if not write.cancelled() and write.exception() is not None:
+            # A lost write only costs a later miss
+            self.disk_write_errors += 1
+
+    async def flush(self):
+        """Wait for queued disk writes"""
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Return the cached value or run compute once for all concurrent callers"""
+        with timed_stage("cache"):
+            value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            # Run the disk lookup and computation as their own task so a
+            # cancelled caller does not take down the result for everyone
+            # else waiting on it
+            task = asyncio.ensure_future(self._load_or_compute(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Nobody is left waiting for this result: stop paying for it
+            if self._waiters[key] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    async def _load_or_compute(self, key: str, compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        if self.disk is not None:
+            with timed_stage("cache"):
+                value = await self._load(key)
+            if value is not None:
+                self.hits += 1
+                return value
+        self.misses += 1
+        value = await compute()
+        # Errors are never cached; only successful predictions are stored
+        self.store(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+            "disk_entries": len(self.disk) if self.disk is not None else None,
+            "disk_evictions": self.disk.evictions if self.disk is not None else None,
+            "disk_write_errors": self.disk_write_errors,
+        }
+
+def build_prediction_cache() -> PredictionCache:
+    """Create the cache from PREDICTION_CACHE_* environment variables"""
+    memory = MemoryCacheBackend(
+        max_entries=int(os.getenv("PREDICTION_CACHE_SIZE", "1024")),
+        ttl=float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+    )
+    disk = None
+    path = os.getenv("PREDICTION_CACHE_PATH")
+    if path:
+        disk = SQLiteCacheBackend(path, ttl=float(os.getenv("PREDICTION_CACHE_DISK_TTL", "86400")))
+    return PredictionCache(memory, disk)
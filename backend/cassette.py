@@ -0,0 +1,212 @@
+"""
+Record/replay LLM backend.
+
+A cassette is an append-only log of provider answers keyed by the same
+content hash as the prediction cache (payload + model + prompt version):
+
+    b"CKDCAS1\\n" then, per answer, a 32-byte sha256 key, a little-endian
+    uint32 length and that many bytes of compact JSON
+
+Opening a cassette walks the record headers once to build an in-memory
+offset index; answers are read from a memory map of the file. Replayed
+answers are the recorded bytes, so reruns give byte-identical output with
+no backend latency. A later record for the same key wins, which is how a
+case is re-recorded. A torn record at the end (a crash mid-write) is
+ignored and cut off before the next append.
+
+Recording is per process: workers that record into the same file do not
+see each other's new answers until they reopen it.
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+import json
+import mmap
+import os
+import struct
+import threading
+
+from backend.cache import cache_key
+from backend.features import PatientRecord
+from backend.providers import LLMProvider, ProviderError, StreamEvent, result_events
+
+MAGIC = b"CKDCAS1\n"
+HEADER = struct.Struct("<32sI")
+MODES = ("replay", "record", "auto")
+
+class CassetteMiss(ProviderError):
+    """Replay-only cassette has no answer for the request"""
+
+class Cassette:
+    """Memory-mapped answer log with an offset index"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, Tuple[int, int]] = {}
+        self._map: Optional[mmap.mmap] = None
+        self._fd: Optional[int] = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "wb") as f:
+                f.write(MAGIC)
+        self._end = self._scan()
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+        with open(self.path, "rb") as f:
+            # An mmap of an empty region is not allowed; the magic is always there
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _scan(self) -> int:
+        """Index every complete record; returns the end of the last one"""
+        self._remap()
+        data = self._map
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a cassette")
+        offset, size = len(MAGIC), len(data)
+        while offset + HEADER.size <= size:
+            key, length = HEADER.unpack_from(data, offset)
+            start = offset + HEADER.size
+            if start + length > size:
+                break
+            self._index[key] = (start, length)
+            offset = start + length
+        return offset
+
+    def _raw(self, key: bytes) -> Optional[bytes]:
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        start, length = entry
+        if self._map is None or start + length > len(self._map):
+            self._remap()
+        return self._map[start:start + length]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self._raw(bytes.fromhex(key))
+        return None if raw is None else json.loads(raw)
+
+    def put(self, key: str, value: Dict[str, Any]):
+        payload = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        digest = bytes.fromhex(key)
+        with self._lock:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR)
+                # Drop a torn record left by an interrupted writer
+                os.ftruncate(self._fd, self._end)
+                os.lseek(self._fd, self._end, os.SEEK_SET)
+            # One write per record so a reader never indexes half of one
+            os.write(self._fd, HEADER.pack(digest, len(payload)) + payload)
+            self._index[digest] = (self._end + HEADER.size, len(payload))
+            self._end += HEADER.size + len(payload)
+
+    def __contains__(self, key: str) -> bool:
+        return bytes.fromhex(key) in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def close(self):
+        """Release the map and file; the cassette reopens them on next use"""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+
+class CassetteProvider(LLMProvider):
+    """
+    Answers from a cassette in front of another provider.
+    replay: recorded answers only, misses raise CassetteMiss
+    record: always ask the provider and (re)record its answer
+    auto: replay what is recorded, record the rest
+    """
+
+    def __init__(self, provider: LLMProvider, cassette: Cassette, mode: str = "auto"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode!r}")
+        self.provider = provider
+        self.cassette = cassette
+        self.mode = mode
+        # Replayed answers stand in for the provider's own, including in cache keys
+        self.model_name = provider.model_name
+        self.prompt_version = provider.prompt_version
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    def _key(self, patient_data: PatientRecord) -> str:
+        return cache_key(patient_data, self.model_name, self.prompt_version)
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.mode == "record":
+            return None
+        result = self.cassette.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def _record(self, key: str, result: Dict[str, Any]):
+        self.cassette.put(key, result)
+        self.recorded += 1
+
+    async def complete(self, patient_data: PatientRecord) -> Dict[str, Any]:
+        key = self._key(patient_data)
+        result = self._lookup(key)
+        if result is not None:
+            return result
+        if self.mode == "replay":
+            raise CassetteMiss(f"No recorded answer for {key} in {self.cassette.path}")
+        result = await self.provider.complete(patient_data)
+        self._record(key, result)
+        return result
+
+    async def complete_batch(self, records: List[PatientRecord]) -> List[Union[Dict[str, Any], Exception]]:
+        keys = [self._key(r) for r in records]
+        results: List[Union[Dict[str, Any], Exception, None]] = [self._lookup(k) for k in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing and self.mode == "replay":
+            for i in missing:
+                results[i] = CassetteMiss(f"No recorded answer for {keys[i]} in {self.cassette.path}")
+        elif missing:
+            answers = await self.provider.complete_batch([records[i] for i in missing])
+            for i, answer in zip(missing, answers):
+                # Failures are passed through, not recorded
+                if not isinstance(answer, Exception):
+                    self._record(keys[i], answer)
+                results[i] = answer
+        return results  # type: ignore[return-value]
+
+    async def stream(self, patient_data: PatientRecord) -> AsyncIterator[StreamEvent]:
+        # A miss is recorded as a whole answer, so it is not streamed incrementally
+        for event in result_events(await self.complete(patient_data)):
+            yield event
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": self.cassette.path,
+            "entries": len(self.cassette),
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+        }
+
+    async def astart(self):
+        # Replay never reaches the provider, so it needs no connections (offline runs)
+        if self.mode != "replay":
+            await self.provider.astart()
+
+    def close(self):
+        self.provider.close()
+        self.cassette.close()
+
+    async def aclose(self):
+        await self.provider.aclose()
+        self.cassette.close()
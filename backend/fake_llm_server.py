@@ -0,0 +1,109 @@
+"""
+Local stand-in for an OpenAI-compatible chat-completions server.
+
+Answers POST /v1/chat/completions (plain and streaming) with a fixed CKD
+assessment after a configurable delay, so throughput against a real HTTP
+backend can be measured offline:
+
+    python -m backend.fake_llm_server --port 8001 --latency 0.5
+    LLM_PROVIDER=openai LLM_BASE_URL=http://localhost:8001/v1 uvicorn backend.main:app
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, Dict
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+def create_app(latency: float = 0.5, jitter: float = 0.0, token_delay: float = 0.01, error_rate: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI-compatible LLM")
+    app.state.requests = 0
+
+    def _answer() -> Dict[str, Any]:
+        return {
+            "prediction": 0.85,
+            "confidence": 0.92,
+            "explanation": "Based on the provided data, there is a high probability of CKD. Key risk factors include high blood pressure, diabetes, and age.",
+            "risk_factors": ["high blood pressure", "diabetes", "age"]
+        }
+
+    async def _delay():
+        await asyncio.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        model = body.get("model", "fake-llm")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        content = json.dumps(_answer())
+
+        if error_rate and random.random() < error_rate:
+            return JSONResponse({"error": {"message": "simulated overload"}}, status_code=503, headers={"Retry-After": "0"})
+
+        if not body.get("stream"):
+            await _delay()
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(json.dumps(body["messages"])) // 4, "completion_tokens": len(content) // 4}
+            }
+
+        async def chunks():
+            # Time to first token is the configured latency; the rest trickles in
+            await _delay()
+            for i in range(0, len(content), 8):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + 8]}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake-llm", "object": "model"}]}
+
+    return app
+
+app = create_app(
+    latency=float(os.getenv("FAKE_LLM_LATENCY", "0.5")),
+    jitter=float(os.getenv("FAKE_LLM_JITTER", "0")),
+    token_delay=float(os.getenv("FAKE_LLM_TOKEN_DELAY", "0.01")),
+    error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+)
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before the answer (or first token)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter on latency")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.latency, args.jitter, args.token_delay, args.error_rate),
+        host=args.host,
+        port=args.port,
+        log_level="warning"
+    )
+
+if __name__ == "__main__":
+    main()
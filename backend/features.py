@@ -0,0 +1,102 @@
+from typing import Any, Dict, NamedTuple, Union
+import struct
+
+from backend.schemas import PatientData
+
+# Categorical fields encode as 0/1; index 1 is the risk-associated level
+CATEGORICAL_LEVELS = {
+    "red_blood_cells": ("normal", "abnormal"),
+    "pus_cell": ("normal", "abnormal"),
+    "pus_cell_clumps": ("notpresent", "present"),
+    "bacteria": ("notpresent", "present"),
+    "hypertension": ("no", "yes"),
+    "diabetes_mellitus": ("no", "yes"),
+    "coronary_artery_disease": ("no", "yes"),
+    "appetite": ("good", "poor"),
+    "pedal_edema": ("no", "yes"),
+    "anemia": ("no", "yes"),
+}
+
+INTEGER_FIELDS = frozenset(
+    name for name, field in PatientData.model_fields.items() if field.annotation is int
+)
+
+_CODES = {name: {level: float(i) for i, level in enumerate(levels)} for name, levels in CATEGORICAL_LEVELS.items()}
+
+class PatientFeatures(NamedTuple):
+    """
+    Validated patient record as a fixed-order tuple of floats.
+    Built once per request and shared by the cache key, the batcher and
+    the prompt builder so nothing downstream re-parses dicts.
+    """
+    age: float
+    blood_pressure: float
+    specific_gravity: float
+    albumin: float
+    sugar: float
+    red_blood_cells: float
+    pus_cell: float
+    pus_cell_clumps: float
+    bacteria: float
+    blood_glucose_random: float
+    blood_urea: float
+    serum_creatinine: float
+    sodium: float
+    potassium: float
+    hemoglobin: float
+    packed_cell_volume: float
+    white_blood_cell_count: float
+    red_blood_cell_count: float
+    hypertension: float
+    diabetes_mellitus: float
+    coronary_artery_disease: float
+    appetite: float
+    pedal_edema: float
+    anemia: float
+
+    @classmethod
+    def from_patient(cls, patient: PatientData) -> "PatientFeatures":
+        values = []
+        for name in cls._fields:
+            value = getattr(patient, name)
+            codes = _CODES.get(name)
+            values.append(codes[value] if codes is not None else float(value))
+        return cls(*values)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PatientFeatures":
+        """Validate a raw dict against PatientData and encode it"""
+        return cls.from_patient(PatientData.model_validate(data))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Human-readable field values, as PatientData would dump them"""
+        result: Dict[str, Any] = {}
+        for name, value in zip(self._fields, self):
+            levels = CATEGORICAL_LEVELS.get(name)
+            if levels is not None:
+                result[name] = levels[int(value)]
+            elif name in INTEGER_FIELDS:
+                result[name] = int(value)
+            else:
+                result[name] = value
+        return result
+
+    def digest(self) -> bytes:
+        """Packed little-endian doubles; the canonical bytes for hashing"""
+        return _PACKER.pack(*self)
+
+FEATURE_NAMES = PatientFeatures._fields
+
+_PACKER = struct.Struct("<%dd" % len(FEATURE_NAMES))
+
+if set(FEATURE_NAMES) != set(PatientData.model_fields):
+    raise RuntimeError("PatientFeatures must mirror the PatientData fields")
+
+# Anything LLMClient accepts as one patient
+PatientRecord = Union[PatientFeatures, Dict[str, Any]]
+
+def patient_dict(record: PatientRecord) -> Dict[str, Any]:
+    """Readable dict for backends that need named fields"""
+    if isinstance(record, PatientFeatures):
+        return record.to_dict()
+    return record
@@ -0,0 +1,335 @@
+"""
+Low-overhead Prometheus-style metrics for the backend.
+
+Metrics are aggregated per worker process in plain dicts and lists with no
+locks: updates happen on the event loop thread, so an observation is a
+couple of dict lookups and an integer add. GET /metrics renders the
+registry in the Prometheus text exposition format.
+
+With several worker processes, each one publishes a snapshot of its
+registry to a shared SQLite file (SharedMetricsStore) and /metrics renders
+the sum over all workers. Counters and histograms of workers that have
+exited are kept; their gauges are dropped. Snapshots are taken on the event
+loop; the SQLite reads and writes run in the default executor.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from backend import tracing
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, *labels: str):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+    def empty_copy(self):
+        return type(self)(self.name, self.documentation, self.labelnames)
+
+    def snapshot(self) -> List[Any]:
+        return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merge(self, snapshot: List[Any]):
+        for labels, value in snapshot:
+            key = tuple(labels)
+            self._values[key] = self._values.get(key, 0) + value
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def dec(self, amount: float = 1, *labels: str):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *labels: str):
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def count(self, *labels: str) -> int:
+        return sum(self._counts.get(labels, ()))
+
+    def sum(self, *labels: str) -> float:
+        return self._sums.get(labels, 0.0)
+
+    def samples(self) -> Iterator[str]:
+        for labels, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(self._sums[labels])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+    def empty_copy(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, self.labelnames, self.buckets)
+
+    def snapshot(self) -> List[Any]:
+        return [[list(labels), counts, self._sums[labels]] for labels, counts in self._counts.items()]
+
+    def merge(self, snapshot: List[Any]):
+        for labels, counts, total in snapshot:
+            key = tuple(labels)
+            mine = self._counts.get(key)
+            if mine is None:
+                self._counts[key] = list(counts)
+                self._sums[key] = total
+            else:
+                self._counts[key] = [a + b for a, b in zip(mine, counts)]
+                self._sums[key] += total
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collect: Callable[[], None]):
+        """Callback run before rendering, for values that are cheaper to read at scrape time"""
+        self._collectors.append(collect)
+
+    def get(self, name: str):
+        return self._metrics[name]
+
+    def collect(self):
+        for collect in self._collectors:
+            collect()
+
+    def render(self) -> str:
+        self.collect()
+        return self._render_lines()
+
+    def _render_lines(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, List[Any]]:
+        """Current values of every metric, JSON-serializable"""
+        self.collect()
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def merged(self, snapshots: Sequence[Tuple[Dict[str, List[Any]], bool]]) -> "Registry":
+        """A registry holding the sum of (snapshot, worker alive) pairs; gauges only from live workers"""
+        merged = Registry()
+        for metric in self._metrics.values():
+            merged.register(metric.empty_copy())
+        for snapshot, alive in snapshots:
+            for name, values in snapshot.items():
+                metric = merged._metrics.get(name)
+                if metric is None or (metric.kind == "gauge" and not alive):
+                    continue
+                metric.merge(values)
+        return merged
+
+class SharedMetricsStore:
+    """
+    Per-worker registry snapshots in one SQLite file. Each worker upserts its
+    own row; readers merge all rows. A worker whose row is older than
+    stale_after seconds is treated as gone.
+    """
+
+    def __init__(self, path: str, worker_id: Optional[str] = None, stale_after: float = 30.0, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.worker_id = worker_id or str(os.getpid())
+        self.stale_after = stale_after
+        self.clock = clock
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metric_snapshots ("
+            "worker TEXT PRIMARY KEY, snapshot TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def publish(self, snapshot: Dict[str, List[Any]]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO metric_snapshots (worker, snapshot, updated_at) VALUES (?, ?, ?)",
+                (self.worker_id, json.dumps(snapshot), self.clock())
+            )
+
+    def load(self) -> List[Tuple[Dict[str, List[Any]], bool]]:
+        """(snapshot, alive) for every worker that has published"""
+        now = self.clock()
+        with self._lock:
+            rows = self._conn.execute("SELECT snapshot, updated_at FROM metric_snapshots").fetchall()
+        return [(json.loads(snapshot), now - updated_at <= self.stale_after) for snapshot, updated_at in rows]
+
+    async def apublish(self, snapshot: Dict[str, List[Any]]):
+        """publish() off the event loop; the busy timeout can stall it under contention"""
+        await asyncio.get_running_loop().run_in_executor(None, self.publish, snapshot)
+
+    async def aload(self) -> List[Tuple[Dict[str, List[Any]], bool]]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.load)
+
+    def workers(self) -> int:
+        return sum(1 for _, alive in self.load() if alive)
+
+    def close(self):
+        self._conn.close()
+
+def build_shared_metrics_store() -> Optional[SharedMetricsStore]:
+    """SharedMetricsStore at METRICS_SHARED_PATH, or None for a single worker"""
+    path = os.getenv("METRICS_SHARED_PATH")
+    return SharedMetricsStore(path) if path else None
+
+def render_metrics(registry: "Registry", shared: Optional[SharedMetricsStore]) -> str:
+    """This worker's metrics, or the sum over all workers when they share a store"""
+    if shared is None:
+        return registry.render()
+    shared.publish(registry.snapshot())
+    return registry.merged(shared.load())._render_lines()
+
+async def arender_metrics(registry: "Registry", shared: Optional[SharedMetricsStore]) -> str:
+    """render_metrics for the event loop: the shared store is read and written in the executor"""
+    if shared is None:
+        return registry.render()
+    await shared.apublish(registry.snapshot())
+    return registry.merged(await shared.aload())._render_lines()
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter("ckd_http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = REGISTRY.histogram("ckd_http_request_duration_seconds", "HTTP request latency by route and status", ("method", "route", "status"))
+STAGE_LATENCY = REGISTRY.histogram("ckd_stage_duration_seconds", "Time spent per /predict stage", ("stage",))
+LLM_INFLIGHT = REGISTRY.gauge("ckd_llm_inflight_requests", "LLM backend calls currently in flight")
+LLM_ERRORS = REGISTRY.counter("ckd_llm_errors_total", "Failed LLM backend calls", ("provider",))
+LLM_RETRIES = REGISTRY.counter("ckd_llm_retries_total", "Retried LLM backend requests", ("provider",))
+LLM_TOKENS = REGISTRY.counter("ckd_llm_tokens_total", "Tokens reported by the LLM backend", ("provider", "kind"))
+
+StageHook = Callable[[str, float], None]
+
+_stage_hooks: List[StageHook] = []
+
+def add_stage_hook(hook: StageHook):
+    """Call hook(stage, seconds) for every timed stage, in addition to the histogram"""
+    _stage_hooks.append(hook)
+
+def remove_stage_hook(hook: StageHook):
+    _stage_hooks.remove(hook)
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_LATENCY.observe(seconds, stage)
+    for hook in _stage_hooks:
+        hook(stage, seconds)
+
+@contextmanager
+def timed_stage(stage: str):
+    """Time the enclosed block as one /predict stage, and trace it as a span"""
+    start = time.perf_counter()
+    try:
+        with tracing.span(stage):
+            yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request count and latency per route
+    template (not raw path, to keep label cardinality bounded) and status.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        scope["ckd.start"] = start
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            labels = (scope.get("method", ""), path, str(status["code"]))
+            HTTP_REQUESTS.inc(1, *labels)
+            HTTP_LATENCY.observe(time.perf_counter() - start, *labels)
+
+def request_start(scope: Dict[str, Any]) -> Optional[float]:
+    """When MetricsMiddleware first saw this request"""
+    return scope.get("ckd.start")
@@ -0,0 +1,461 @@
+"""
+Bulk scoring jobs.
+
+An uploaded CSV/Parquet file is copied row by row into a SQLite job store
+and split into fixed-size chunks. A small pool of asyncio workers claims
+pending chunks, scores them through the batched LLM call and writes each
+chunk's results in the same transaction that marks it done, so a restart
+re-queues only the chunks that were in flight.
+"""
+from typing import Any, Awaitable, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+import asyncio
+import csv
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from backend import tracing
+from backend.admission import Rejected
+from backend.features import PatientFeatures
+from backend.records import coerce_csv_value
+
+BatchFn = Callable[[List[PatientFeatures]], Awaitable[List[Any]]]
+
+RESULT_CSV_COLUMNS = ["row", "prediction", "confidence", "explanation", "risk_factors", "error"]
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _orphaned(worker: Optional[int]) -> bool:
+    """Whether work owned by this process id can be taken over (a restart or a dead sibling)"""
+    return worker is None or worker == os.getpid() or not _pid_alive(worker)
+
+class JobInputError(ValueError):
+    """The uploaded file cannot be read as PatientData rows"""
+
+def iter_csv_rows(file: IO[bytes]) -> Iterator[Dict[str, Any]]:
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    try:
+        for row in csv.DictReader(text):
+            yield {k: coerce_csv_value(v) for k, v in row.items() if k}
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise JobInputError(f"Unreadable CSV: {e}")
+    finally:
+        # Leave the underlying upload open for its owner to close
+        text.detach()
+
+def iter_parquet_rows(file: IO[bytes]) -> Iterator[Dict[str, Any]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise JobInputError("Parquet uploads need the pyarrow package")
+    try:
+        parquet = pq.ParquetFile(file)
+    except Exception as e:
+        raise JobInputError(f"Unreadable Parquet file: {e}")
+    for batch in parquet.iter_batches(batch_size=1000):
+        yield from batch.to_pylist()
+
+def iter_upload_rows(file: IO[bytes], filename: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """Rows of an uploaded file, read lazily; the format follows the file extension"""
+    if (filename or "").lower().endswith((".parquet", ".pq")):
+        return iter_parquet_rows(file)
+    return iter_csv_rows(file)
+
+class JobStore:
+    """SQLite-backed job, input, chunk and result tables"""
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.clock = clock
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection per thread: ingestion runs in the threadpool while
+        # workers write results from the executor
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT, total_rows INTEGER NOT NULL DEFAULT 0,"
+            " processed_rows INTEGER NOT NULL DEFAULT 0, failed_rows INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS job_inputs ("
+            " job_id TEXT NOT NULL, row_index INTEGER NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (job_id, row_index)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS job_chunks ("
+            " job_id TEXT NOT NULL, chunk_index INTEGER NOT NULL, start_row INTEGER NOT NULL, stop_row INTEGER NOT NULL,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (job_id, chunk_index)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS job_chunks_status ON job_chunks (status);"
+            "CREATE TABLE IF NOT EXISTS job_results ("
+            " job_id TEXT NOT NULL, row_index INTEGER NOT NULL, result TEXT, error TEXT,"
+            " PRIMARY KEY (job_id, row_index)) WITHOUT ROWID;"
+        )
+        # Stores created before multi-worker serving lack the owning process ids
+        for table in ("jobs", "job_chunks"):
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if "worker" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN worker INTEGER")
+        # Nor the trace context of the upload, which chunk workers continue
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "traceparent" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN traceparent TEXT")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def create_job(self, filename: Optional[str], rows: Iterable[Dict[str, Any]], chunk_size: int,
+                   traceparent: Optional[str] = None) -> Dict[str, Any]:
+        """Copy rows into the store and queue their chunks; returns the job"""
+        conn = self._conn()
+        job_id = uuid.uuid4().hex
+        now = self.clock()
+        conn.execute(
+            "INSERT INTO jobs (id, status, filename, created_at, updated_at, worker, traceparent)"
+            " VALUES (?, 'uploading', ?, ?, ?, ?, ?)",
+            (job_id, filename, now, now, os.getpid(), traceparent)
+        )
+        total = 0
+        try:
+            batch: List[Tuple[str, int, str]] = []
+            for row in rows:
+                batch.append((job_id, total, json.dumps(row)))
+                total += 1
+                if len(batch) >= 1000:
+                    # Short write transactions keep workers from waiting on the upload
+                    self._insert_inputs(conn, batch)
+                    batch = []
+            if batch:
+                self._insert_inputs(conn, batch)
+            if not total:
+                raise JobInputError("The uploaded file has no rows")
+        except Exception:
+            self.delete_job(job_id)
+            raise
+
+        chunks = [
+            (job_id, i, start, min(start + chunk_size, total))
+            for i, start in enumerate(range(0, total, chunk_size))
+        ]
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO job_chunks (job_id, chunk_index, start_row, stop_row, status) VALUES (?, ?, ?, ?, 'pending')",
+            chunks
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', total_rows = ?, updated_at = ? WHERE id = ?",
+            (total, self.clock(), job_id)
+        )
+        conn.execute("COMMIT")
+        return self.get_job(job_id)
+
+    @staticmethod
+    def _insert_inputs(conn: sqlite3.Connection, batch: List[Tuple[str, int, str]]):
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO job_inputs (job_id, row_index, data) VALUES (?, ?, ?)", batch)
+        conn.execute("COMMIT")
+
+    def delete_job(self, job_id: str):
+        conn = self._conn()
+        conn.execute("BEGIN")
+        for table, column in (("job_results", "job_id"), ("job_chunks", "job_id"), ("job_inputs", "job_id"), ("jobs", "id")):
+            conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (job_id,))
+        conn.execute("COMMIT")
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT id, status, filename, total_rows, processed_rows, failed_rows, error, created_at, updated_at"
+            " FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(
+            ("id", "status", "filename", "total_rows", "processed_rows", "failed_rows", "error", "created_at", "updated_at"),
+            row
+        ))
+        job["progress"] = job["processed_rows"] / job["total_rows"] if job["total_rows"] else 0.0
+        return job
+
+    def job_traceparent(self, job_id: str) -> Optional[str]:
+        """Trace context of the request that uploaded the job"""
+        row = self._conn().execute("SELECT traceparent FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def requeue_interrupted(self) -> int:
+        """
+        After a restart: chunks whose worker process is gone go back to
+        pending, half-uploaded jobs fail. Chunks held by live sibling
+        workers are left alone.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        orphaned = [
+            (job_id, chunk_index)
+            for job_id, chunk_index, worker in conn.execute(
+                "SELECT job_id, chunk_index, worker FROM job_chunks WHERE status = 'running'"
+            ).fetchall()
+            if _orphaned(worker)
+        ]
+        conn.executemany(
+            "UPDATE job_chunks SET status = 'pending' WHERE job_id = ? AND chunk_index = ?", orphaned
+        )
+        requeued = len(orphaned)
+        abandoned = [
+            (self.clock(), job_id)
+            for job_id, worker in conn.execute("SELECT id, worker FROM jobs WHERE status = 'uploading'").fetchall()
+            if _orphaned(worker)
+        ]
+        conn.executemany(
+            "UPDATE jobs SET status = 'failed', error = 'Upload interrupted by a restart', updated_at = ? WHERE id = ?",
+            abandoned
+        )
+        conn.execute("COMMIT")
+        return requeued
+
+    def claim_chunk(self) -> Optional[Tuple[str, int, int, int, int]]:
+        """Mark the oldest pending chunk running; (job_id, chunk_index, start, stop, attempts)"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT c.job_id, c.chunk_index, c.start_row, c.stop_row, c.attempts"
+                " FROM job_chunks c JOIN jobs j ON j.id = c.job_id"
+                " WHERE c.status = 'pending' ORDER BY j.created_at, c.chunk_index LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE job_chunks SET status = 'running', worker = ? WHERE job_id = ? AND chunk_index = ?",
+                    (os.getpid(), row[0], row[1])
+                )
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                    (self.clock(), row[0])
+                )
+        finally:
+            conn.execute("COMMIT")
+        return row
+
+    def chunk_inputs(self, job_id: str, start: int, stop: int) -> List[Tuple[int, Dict[str, Any]]]:
+        rows = self._conn().execute(
+            "SELECT row_index, data FROM job_inputs WHERE job_id = ? AND row_index >= ? AND row_index < ?"
+            " ORDER BY row_index",
+            (job_id, start, stop)
+        ).fetchall()
+        return [(index, json.loads(data)) for index, data in rows]
+
+    def release_chunk(self, job_id: str, chunk_index: int, count_attempt: bool = True):
+        """Put a chunk back after a transient failure"""
+        self._conn().execute(
+            "UPDATE job_chunks SET status = 'pending', attempts = attempts + ? WHERE job_id = ? AND chunk_index = ?",
+            (int(count_attempt), job_id, chunk_index)
+        )
+
+    def complete_chunk(self, job_id: str, chunk_index: int, results: List[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]):
+        """Store a chunk's results and progress atomically"""
+        conn = self._conn()
+        failed = sum(1 for _, _, error in results if error is not None)
+        conn.execute("BEGIN")
+        claimed = conn.execute(
+            "UPDATE job_chunks SET status = 'done' WHERE job_id = ? AND chunk_index = ? AND status = 'running'",
+            (job_id, chunk_index)
+        ).rowcount
+        if not claimed:
+            # Another worker already finished this chunk; do not count it twice
+            conn.execute("ROLLBACK")
+            return
+        conn.executemany(
+            "INSERT OR REPLACE INTO job_results (job_id, row_index, result, error) VALUES (?, ?, ?, ?)",
+            [(job_id, index, json.dumps(result) if result is not None else None, error) for index, result, error in results]
+        )
+        remaining = conn.execute(
+            "SELECT COUNT(*) FROM job_chunks WHERE job_id = ? AND status != 'done'", (job_id,)
+        ).fetchone()[0]
+        conn.execute(
+            "UPDATE jobs SET processed_rows = processed_rows + ?, failed_rows = failed_rows + ?,"
+            " status = ?, updated_at = ? WHERE id = ?",
+            (len(results), failed, "running" if remaining else "completed", self.clock(), job_id)
+        )
+        conn.execute("COMMIT")
+
+    def iter_results(self, job_id: str, page_size: int = 1000) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+        """Results in row order, fetched page by page"""
+        last = -1
+        while True:
+            # Streaming responses advance this generator from whichever
+            # threadpool thread is free, so look the connection up per page
+            page = self._conn().execute(
+                "SELECT row_index, result, error FROM job_results WHERE job_id = ? AND row_index > ?"
+                " ORDER BY row_index LIMIT ?",
+                (job_id, last, page_size)
+            ).fetchall()
+            if not page:
+                return
+            for index, result, error in page:
+                yield index, json.loads(result) if result is not None else None, error
+            last = page[-1][0]
+
+class JobRunner:
+    """Worker pool that drains pending chunks from the job store"""
+
+    def __init__(
+        self,
+        predict_batch: BatchFn,
+        path: Optional[str] = None,
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        max_attempts: int = 3,
+        poll_interval: Optional[float] = None
+    ):
+        self.predict_batch = predict_batch
+        self.path = path or os.getenv("JOBS_DB_PATH", "jobs.db")
+        self.workers = workers or int(os.getenv("JOBS_WORKERS", "2"))
+        self.chunk_size = chunk_size or int(os.getenv("JOBS_CHUNK_SIZE", "256"))
+        self.max_attempts = max_attempts
+        # Sibling worker processes are not notified of uploads; they poll
+        self.poll_interval = poll_interval or float(os.getenv("JOBS_POLL_SECONDS", "5"))
+        self._store: Optional[JobStore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+
+    @property
+    def store(self) -> JobStore:
+        # Opened on first use so importing the app does not create the file
+        if self._store is None:
+            self._store = JobStore(self.path)
+        return self._store
+
+    def resume(self):
+        """Restart work left over from a previous process, if there is a store"""
+        if os.path.exists(self.path):
+            self.store.requeue_interrupted()
+            self.start()
+
+    def start(self):
+        """Start the workers on the running loop (no-op if already running there)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and any(not t.done() for t in self._tasks):
+            return
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    def notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, fn, *args):
+        # SQLite calls stay off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def _work(self):
+        while True:
+            chunk = await self._run(self.store.claim_chunk)
+            if chunk is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            job_id, chunk_index, start, stop, attempts = chunk
+            # Chunks continue the upload's trace, possibly in another process;
+            # never the span this worker task happened to be started under
+            parent = None
+            if tracing.enabled():
+                parent = tracing.parse_traceparent(await self._run(self.store.job_traceparent, job_id))
+            attributes = {"job.id": job_id, "job.chunk": chunk_index, "job.rows": stop - start, "job.attempt": attempts + 1}
+            try:
+                with tracing.span("job.chunk", parent=parent, attributes=attributes):
+                    results = await self._score(job_id, start, stop, give_up=attempts + 1 >= self.max_attempts)
+            except asyncio.CancelledError:
+                # Shutdown: the chunk is re-queued on the next start
+                raise
+            except Rejected as e:
+                # Circuit open: wait it out without using up the chunk's attempts
+                await self._run(self.store.release_chunk, job_id, chunk_index, False)
+                await asyncio.sleep(e.retry_after or 1)
+                continue
+            except Exception:
+                await self._run(self.store.release_chunk, job_id, chunk_index)
+                await asyncio.sleep(min(2 ** attempts, 30))
+                continue
+            await self._run(self.store.complete_chunk, job_id, chunk_index, results)
+
+    async def _score(self, job_id: str, start: int, stop: int, give_up: bool) -> List[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+        """Score one chunk; raises on a whole-batch failure unless this is the last attempt"""
+        rows = await self._run(self.store.chunk_inputs, job_id, start, stop)
+        results: Dict[int, Tuple[int, Optional[Dict[str, Any]], Optional[str]]] = {}
+        indices, records = [], []
+        for index, data in rows:
+            try:
+                records.append(PatientFeatures.from_dict(data))
+                indices.append(index)
+            except ValueError as e:
+                results[index] = (index, None, str(e))
+
+        if records:
+            try:
+                outcomes = await self.predict_batch(records)
+            except Rejected:
+                raise
+            except Exception as e:
+                if not give_up:
+                    raise
+                outcomes = [e] * len(records)
+            for index, outcome in zip(indices, outcomes):
+                if isinstance(outcome, Exception):
+                    results[index] = (index, None, str(outcome))
+                else:
+                    results[index] = (index, outcome, None)
+        return [results[index] for index, _ in rows]
+
+def results_ndjson(rows: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]) -> Iterator[str]:
+    for index, result, error in rows:
+        if error is not None:
+            yield json.dumps({"row": index, "error": error}) + "\n"
+        else:
+            yield json.dumps({"row": index, "prediction": result}) + "\n"
+
+def results_csv(rows: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(RESULT_CSV_COLUMNS)
+    for index, result, error in rows:
+        result = result or {}
+        writer.writerow([
+            index,
+            result.get("prediction", ""),
+            result.get("confidence", ""),
+            result.get("explanation", ""),
+            ";".join(result.get("risk_factors", [])),
+            error or "",
+        ])
+        if buffer.tell() >= 65536:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -1,21 +1,142 @@
-from typing import Dict, Any, List
+from typing import AsyncIterator, Dict, Any, List, Optional, Union
+import asyncio
+import threading
 import time
 
+from backend import tracing
+from backend.features import PatientRecord
+from backend.instrumentation import LLM_ERRORS, LLM_INFLIGHT, observe_stage
+from backend.providers import (
+    LLMProvider,
+    MockProvider,
+    StreamEvent,
+    build_provider_from_env,
+    result_events,
+)
+
 class LLMClient:
-    def __init__(self):
-        self.model_name = "mock-llm-model"
+    def __init__(self, provider: Optional[LLMProvider] = None, latency: Optional[float] = None, max_workers: Optional[int] = None):
+        if provider is None:
+            if latency is None and max_workers is None:
+                provider = build_provider_from_env()
+            else:
+                provider = MockProvider(latency=0.5 if latency is None else latency, max_workers=max_workers)
+        self.provider = provider
+        # Sync calls run here rather than in a fresh asyncio.run() loop each
+        # time, so they reuse one provider connection pool
+        self._sync_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sync_thread: Optional[threading.Thread] = None
+        self._sync_lock = threading.Lock()
+
+    @property
+    def model_name(self) -> str:
+        return self.provider.model_name
+
+    @property
+    def prompt_version(self) -> str:
+        return self.provider.prompt_version
 
-    def predict(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def apredict(self, patient_data: PatientRecord) -> Dict[str, Any]:
+        """Predict without blocking the event loop"""
+        LLM_INFLIGHT.inc(1)
+        start = time.perf_counter()
+        try:
+            with tracing.span("llm.predict", attributes={"llm.model": self.model_name}):
+                return await self.provider.complete(patient_data)
+        except Exception:
+            LLM_ERRORS.inc(1, self.model_name)
+            raise
+        finally:
+            LLM_INFLIGHT.dec(1)
+            observe_stage("llm", time.perf_counter() - start)
+
+    async def apredict_batch(self, records: List[PatientRecord]) -> List[Union[Dict[str, Any], Exception]]:
         """
-        Mock prediction function that returns a simulated LLM response
+        Predict a batch without blocking the event loop.
+        Failed records come back as exception instances in their slot.
         """
-        # Simulate processing time
-        time.sleep(0.5)
-        
-        # Mock response
-        return {
-            "prediction": 0.85,
-            "confidence": 0.92,
-            "explanation": "Based on the provided data, there is a high probability of CKD. Key risk factors include high blood pressure, diabetes, and age.",
-            "risk_factors": ["high blood pressure", "diabetes", "age"]
-        }
\ No newline at end of file
+        LLM_INFLIGHT.inc(1)
+        start = time.perf_counter()
+        try:
+            with tracing.span("llm.predict_batch", attributes={"llm.model": self.model_name, "batch.size": len(records)}) as span:
+                results = await self.provider.complete_batch(records)
+                failures = sum(1 for r in results if isinstance(r, Exception))
+                if failures:
+                    span.set_attribute("batch.failures", failures)
+                    if failures == len(results):
+                        span.record_error(results[0])
+        except Exception:
+            LLM_ERRORS.inc(1, self.model_name)
+            raise
+        finally:
+            LLM_INFLIGHT.dec(1)
+            observe_stage("llm", time.perf_counter() - start)
+        if failures:
+            LLM_ERRORS.inc(failures, self.model_name)
+        return results
+
+    async def astream(self, patient_data: PatientRecord) -> AsyncIterator[StreamEvent]:
+        """Stream a prediction as (event, data) pairs"""
+        LLM_INFLIGHT.inc(1)
+        start = time.perf_counter()
+        first = True
+        # Not made current: the consumer runs between yields
+        span = tracing.span("llm.stream", attributes={"llm.model": self.model_name})
+        try:
+            async for event in self.provider.stream(patient_data):
+                if first:
+                    observe_stage("llm_first_event", time.perf_counter() - start)
+                    span.set_attribute("llm.first_event_ms", (time.perf_counter() - start) * 1000)
+                    first = False
+                yield event
+        except Exception as e:
+            LLM_ERRORS.inc(1, self.model_name)
+            span.record_error(e)
+            raise
+        finally:
+            LLM_INFLIGHT.dec(1)
+            observe_stage("llm", time.perf_counter() - start)
+            span.end()
+
+    def predict(self, patient_data: PatientRecord) -> Dict[str, Any]:
+        """Synchronous prediction for existing callers"""
+        if isinstance(self.provider, MockProvider):
+            with tracing.span("llm.predict", attributes={"llm.model": self.model_name}):
+                return self.provider.complete_blocking(patient_data)
+        return self._run_sync(self.apredict(patient_data))
+
+    def predict_batch(self, records: List[PatientRecord]) -> List[Union[Dict[str, Any], Exception]]:
+        """Synchronous batch prediction"""
+        if isinstance(self.provider, MockProvider):
+            with tracing.span("llm.predict_batch", attributes={"llm.model": self.model_name, "batch.size": len(records)}):
+                return self.provider.complete_batch_blocking(records)
+        return self._run_sync(self.apredict_batch(records))
+
+    def _run_sync(self, coro):
+        """Run a coroutine on this client's background event loop and wait for it"""
+        with self._sync_lock:
+            if self._sync_loop is None:
+                self._sync_loop = asyncio.new_event_loop()
+                self._sync_thread = threading.Thread(target=self._sync_loop.run_forever, name="llm-client-sync", daemon=True)
+                self._sync_thread.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._sync_loop).result()
+
+    async def astart(self):
+        """Open backend connections ahead of the first request"""
+        await self.provider.astart()
+
+    async def aclose(self):
+        """Release pooled connections and worker threads"""
+        await self.provider.aclose()
+
+    def close(self):
+        """Release worker threads held by blocking providers, and the sync calls' loop and pool"""
+        with self._sync_lock:
+            loop, thread = self._sync_loop, self._sync_thread
+            self._sync_loop = self._sync_thread = None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self.provider.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        self.provider.close()
@@ -1,13 +1,44 @@
-from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, HTTPException, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
-from backend.llm_client import LLMClient
+from backend.llm_client import LLMClient, result_events
+from backend.admission import Rejected, build_admission_from_env, run_with_deadline
+from backend.batching import MicroBatcher
+from backend.cache import build_prediction_cache, cache_key
+from backend.jobs import JobInputError, JobRunner, iter_upload_rows, results_csv, results_ndjson
+from backend.features import PatientFeatures
+from backend.schemas import PatientData
+from backend import instrumentation, tracing
+from backend.instrumentation import MetricsMiddleware, arender_metrics, build_shared_metrics_store, timed_stage
+from backend.web import CachedPage, CachedStaticFiles, CompressionMiddleware, FastJSONResponse, dumps
+import asyncio
 import os
+import time
 
-app = FastAPI(title="CKD Prediction System")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up before /ready reports OK; drain and close clients on shutdown"""
+    app.state.ready = False
+    await llm_client.astart()
+    # Pick up bulk jobs a previous process did not finish
+    job_runner.resume()
+    publisher = asyncio.ensure_future(_publish_metrics()) if shared_metrics is not None else None
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        if publisher is not None:
+            publisher.cancel()
+        await job_runner.stop()
+        await prediction_cache.flush()
+        await llm_client.aclose()
+
+app = FastAPI(title="CKD Prediction System", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -18,56 +49,300 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Serve static files (if any)
-app.mount("/static", StaticFiles(directory=os.path.join(os.path.dirname(__file__), "../static")), name="static")
+# gzip/brotli for bodies over the threshold; event streams are never buffered
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESS_MIN_SIZE", "1024")),
+    compresslevel=int(os.getenv("COMPRESS_LEVEL", "6")),
+)
+
+# Request rate and latency per route/status for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Outermost: one server span per request when TRACE_PATH is set
+app.add_middleware(tracing.TracingMiddleware)
+
+# Serve static files (if any); browsers reuse them for STATIC_MAX_AGE seconds, then revalidate by ETag
+app.mount(
+    "/static",
+    CachedStaticFiles(
+        directory=os.path.join(os.path.dirname(__file__), "../static"), max_age=int(os.getenv("STATIC_MAX_AGE", "3600"))
+    ),
+    name="static"
+)
+
+# Serve frontend at root from memory, pre-compressed
+frontend_page = CachedPage(os.path.join(os.path.dirname(__file__), "../frontend/index.html"))
 
-# Serve frontend at root
 @app.get("/")
-async def serve_frontend():
-    return FileResponse(os.path.join(os.path.dirname(__file__), "../frontend/index.html"))
+async def serve_frontend(request: Request):
+    return frontend_page.response(request)
 
-# Initialize LLM client
+# Cheap to construct; connections are opened in lifespan
 llm_client = LLMClient()
 
-class PatientData(BaseModel):
-    age: int = Field(..., ge=0, le=120)
-    blood_pressure: int = Field(..., ge=60, le=250)
-    specific_gravity: float = Field(..., ge=1.0, le=1.05)
-    albumin: int = Field(..., ge=0, le=5)
-    sugar: int = Field(..., ge=0, le=5)
-    red_blood_cells: str = Field(..., pattern="^(normal|abnormal)$")
-    pus_cell: str = Field(..., pattern="^(normal|abnormal)$")
-    pus_cell_clumps: str = Field(..., pattern="^(present|notpresent)$")
-    bacteria: str = Field(..., pattern="^(present|notpresent)$")
-    blood_glucose_random: int = Field(..., ge=0, le=500)
-    blood_urea: int = Field(..., ge=0, le=200)
-    serum_creatinine: float = Field(..., ge=0.0, le=20.0)
-    sodium: int = Field(..., ge=0, le=200)
-    potassium: float = Field(..., ge=0.0, le=20.0)
-    hemoglobin: float = Field(..., ge=0.0, le=20.0)
-    packed_cell_volume: int = Field(..., ge=0, le=100)
-    white_blood_cell_count: int = Field(..., ge=0, le=20000)
-    red_blood_cell_count: float = Field(..., ge=0.0, le=10.0)
-    hypertension: str = Field(..., pattern="^(yes|no)$")
-    diabetes_mellitus: str = Field(..., pattern="^(yes|no)$")
-    coronary_artery_disease: str = Field(..., pattern="^(yes|no)$")
-    appetite: str = Field(..., pattern="^(good|poor)$")
-    pedal_edema: str = Field(..., pattern="^(yes|no)$")
-    anemia: str = Field(..., pattern="^(yes|no)$")
+# Set by `python -m backend serve --workers N` so /metrics sums all workers
+shared_metrics = build_shared_metrics_store()
+
+async def _publish_metrics():
+    interval = float(os.getenv("METRICS_PUBLISH_SECONDS", "1"))
+    while True:
+        await asyncio.sleep(interval)
+        await shared_metrics.apublish(instrumentation.REGISTRY.snapshot())
+
+# Bounded concurrency and queue, circuit breaker and optional per-key rate limits
+admission, breaker, rate_limiter, default_timeout = build_admission_from_env()
+
+def _all_failed(results: List[Any]) -> bool:
+    return bool(results) and all(isinstance(r, Exception) for r in results)
+
+async def _call_backend(records: List[PatientFeatures]) -> List[Any]:
+    return await breaker.call(lambda: llm_client.apredict_batch(records), failed=_all_failed)
+
+# Merge concurrent /predict calls into batched backend calls
+batcher = MicroBatcher(_call_backend)
+
+# Bulk scoring jobs, processed in chunks by background workers
+job_runner = JobRunner(_call_backend)
+
+# Identical payloads are answered from cache instead of another LLM round trip
+prediction_cache = build_prediction_cache()
+
+async def _predict_one(features: PatientFeatures) -> Dict[str, Any]:
+    key = cache_key(features, llm_client.model_name, llm_client.prompt_version)
+    return await prediction_cache.get_or_compute(key, lambda: batcher.submit(features))
+
+def _collect_cache_metrics():
+    stats = prediction_cache.stats()
+    for name in ("hits", "misses", "coalesced"):
+        CACHE_LOOKUPS.set(stats[name], name)
+    CACHE_ENTRIES.set(stats["memory_entries"], "memory")
+    if stats["disk_entries"] is not None:
+        CACHE_ENTRIES.set(stats["disk_entries"], "disk")
+
+def _collect_admission_metrics():
+    ADMISSION_REQUESTS.set(admission.active, "active")
+    ADMISSION_REQUESTS.set(admission.waiting, "waiting")
+    CIRCUIT_OPEN.set(0 if breaker.state == "closed" else 1)
+
+CACHE_LOOKUPS = instrumentation.REGISTRY.gauge("ckd_cache_lookups", "Prediction cache lookups by outcome", ("outcome",))
+CACHE_ENTRIES = instrumentation.REGISTRY.gauge("ckd_cache_entries", "Prediction cache entries by tier", ("tier",))
+instrumentation.REGISTRY.add_collector(_collect_cache_metrics)
+
+ADMISSION_REQUESTS = instrumentation.REGISTRY.gauge("ckd_admission_requests", "Prediction requests running or queued for a slot", ("state",))
+ADMISSION_REJECTIONS = instrumentation.REGISTRY.counter("ckd_admission_rejections_total", "Prediction requests refused or abandoned", ("reason",))
+CIRCUIT_OPEN = instrumentation.REGISTRY.gauge("ckd_circuit_open", "1 while the LLM circuit breaker is open or half-open")
+instrumentation.REGISTRY.add_collector(_collect_admission_metrics)
+
+@app.exception_handler(Rejected)
+async def rejected_handler(request: Request, exc: Rejected):
+    ADMISSION_REJECTIONS.inc(1, exc.reason)
+    return JSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers())
+
+def _admit(http_request: Request) -> float:
+    """Fail fast before queueing; returns this request's timeout in seconds"""
+    if rate_limiter is not None:
+        client = http_request.client.host if http_request.client else "anonymous"
+        rate_limiter.check(http_request.headers.get("X-API-Key") or client)
+    breaker.reject_if_open()
+    header = http_request.headers.get("X-Request-Timeout")
+    if header is None:
+        return default_timeout
+    try:
+        timeout = float(header)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Request-Timeout must be a number of seconds")
+    if timeout <= 0:
+        raise HTTPException(status_code=400, detail="X-Request-Timeout must be positive")
+    return min(timeout, default_timeout)
 
 class PredictionRequest(BaseModel):
-    data: Dict[str, Any]
+    data: PatientData
+
+class BatchPredictionRequest(BaseModel):
+    records: List[PatientData] = Field(..., min_length=1)
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """OK once startup warm-up has finished; 503 while starting or shutting down"""
+    if not getattr(app.state, "ready", False):
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready"}
+
 @app.post("/predict")
-async def predict(request: PredictionRequest):
+async def predict(request: PredictionRequest, http_request: Request):
     """Predict CKD probability using LLM"""
+    started = instrumentation.request_start(http_request.scope)
+    if started is not None:
+        # Body read, routing and PatientData validation happen before we get here
+        validation = time.perf_counter() - started
+        instrumentation.observe_stage("validation", validation)
+        tracing.record_span("validation", validation)
+    timeout = _admit(http_request)
     try:
-        prediction = llm_client.predict(request.data)
-        return {"prediction": prediction}
+        with timed_stage("encode"):
+            features = PatientFeatures.from_patient(request.data)
+        # The deadline covers the wait for a slot as well as the backend call
+        prediction = await run_with_deadline(
+            admission.run(lambda: _predict_one(features)), timeout, http_request.receive
+        )
+    except Rejected:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    with timed_stage("serialize"):
+        body = dumps({"prediction": prediction})
+    return Response(body, media_type="application/json")
+
+@app.post("/predict/batch")
+async def predict_batch(request: BatchPredictionRequest, http_request: Request):
+    """Predict CKD probability for a list of patients, in input order"""
+    timeout = _admit(http_request)
+    records = [PatientFeatures.from_patient(record) for record in request.records]
+    outcomes = await run_with_deadline(
+        admission.run(lambda: asyncio.gather(*(_predict_one(r) for r in records), return_exceptions=True)),
+        timeout, http_request.receive
+    )
+    results = []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            results.append({"index": index, "error": str(outcome)})
+        else:
+            results.append({"index": index, "prediction": outcome})
+    return {"results": results}
+
+def _sse(event: str, data: Dict[str, Any]) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+@app.post("/predict/stream")
+async def predict_stream(request: PredictionRequest, http_request: Request):
+    """Stream a CKD prediction as Server-Sent Events: score, explanation tokens, risk factors"""
+    features = PatientFeatures.from_patient(request.data)
+    key = cache_key(features, llm_client.model_name, llm_client.prompt_version)
+    cached = await prediction_cache.lookup(key)
+    if cached is not None:
+        async def replay():
+            for event, data in result_events(cached):
+                yield _sse(event, data)
+        return StreamingResponse(
+            replay(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    timeout = _admit(http_request)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    # Hold the slot for the life of the stream; it is released when the generator ends
+    granted_at = await run_with_deadline(admission.acquire(), timeout)
+
+    async def events():
+        result = {"explanation": "", "risk_factors": []}
+        stream = llm_client.astream(features)
+        probe = False
+        try:
+            probe = breaker.check()
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(stream.__anext__(), deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                if event == "score":
+                    result.update(data)
+                elif event == "explanation":
+                    result["explanation"] += data["token"]
+                elif event == "risk_factor":
+                    result["risk_factors"].append(data["risk_factor"])
+                elif event == "done":
+                    breaker.record_success()
+                    prediction_cache.store(key, result)
+                yield _sse(event, data)
+        except asyncio.TimeoutError:
+            ADMISSION_REJECTIONS.inc(1, "deadline")
+            yield _sse("error", {"detail": "Deadline exceeded before the prediction finished"})
+        except Rejected as e:
+            ADMISSION_REJECTIONS.inc(1, e.reason)
+            yield _sse("error", {"detail": e.detail})
+        except Exception as e:
+            breaker.record_failure()
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            if probe:
+                # No-op if the outcome was recorded; frees the probe otherwise
+                breaker.release_probe()
+            await stream.aclose()
+            admission.release(granted_at)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/jobs", status_code=202)
+async def create_job(file: UploadFile = File(...)):
+    """Queue a CSV or Parquet file of PatientData rows for bulk scoring"""
+    try:
+        job = await run_in_threadpool(
+            job_runner.store.create_job, file.filename, iter_upload_rows(file.file, file.filename), job_runner.chunk_size,
+            tracing.current_traceparent()
+        )
+    except JobInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job_runner.start()
+    job_runner.notify()
+    return JSONResponse(job, status_code=202, headers={"Location": f"/jobs/{job['id']}"})
+
+async def _get_job(job_id: str) -> Dict[str, Any]:
+    job = await run_in_threadpool(job_runner.store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status and progress"""
+    return await _get_job(job_id)
+
+@app.get("/jobs/{job_id}/results")
+async def job_results(job_id: str, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """Stream the rows scored so far, in row order, as NDJSON or CSV"""
+    job = await _get_job(job_id)
+    rows = job_runner.store.iter_results(job_id)
+    headers = {"X-Job-Status": job["status"]}
+    if format == "csv":
+        headers["Content-Disposition"] = f'attachment; filename="{job_id}.csv"'
+        return StreamingResponse(results_csv(rows), media_type="text/csv", headers=headers)
+    return StreamingResponse(results_ndjson(rows), media_type="application/x-ndjson", headers=headers)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this worker"""
+    return PlainTextResponse(
+        await arender_metrics(instrumentation.REGISTRY, shared_metrics), media_type="text/plain; version=0.0.4"
+    )
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """Concurrency limiter and circuit breaker state"""
+    return {**admission.stats(), "circuit": breaker.state, "consecutive_failures": breaker.failures}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Prediction cache hit/miss counters, summed over workers when they share state"""
+    stats = prediction_cache.stats()
+    if shared_metrics is not None:
+        await shared_metrics.apublish(instrumentation.REGISTRY.snapshot())
+        snapshots = await shared_metrics.aload()
+        lookups = instrumentation.REGISTRY.merged(snapshots).get(CACHE_LOOKUPS.name)
+        for name in ("hits", "misses", "coalesced"):
+            stats[name] = int(lookups.value(name))
+        total = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / total if total else 0.0
+        stats["workers"] = sum(1 for _, alive in snapshots if alive)
+    return stats
@@ -0,0 +1,277 @@
+"""
+Prompt construction for chat-completion backends.
+
+Templates are compiled once at import into a list of per-field formatters,
+so rendering a prompt is one pass over the PatientFeatures tuple. All
+instructions and the field legend live in the system message, which is
+byte-identical for every request of a version: providers that cache
+prompt prefixes (KV / prompt caching) only process the short patient line.
+
+Token counts are estimated offline (tiktoken is used when installed) and
+prompts over a budget are shortened by dropping the least informative
+fields first.
+
+    python -m backend.prompts bench
+"""
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import argparse
+import json
+import math
+import re
+import time
+
+from backend.features import CATEGORICAL_LEVELS, FEATURE_NAMES, INTEGER_FIELDS, PatientFeatures, PatientRecord, patient_dict
+
+SYSTEM_PROMPT = (
+    "You are a nephrology assistant. Given a patient's lab values, estimate the "
+    "probability of chronic kidney disease. Reply with a single JSON object with keys "
+    "in this order: \"prediction\" (0-1), \"confidence\" (0-1), \"explanation\" (string), "
+    "\"risk_factors\" (list of short strings)."
+)
+
+# Per-message framing tokens added by chat formats (role markers, separators)
+MESSAGE_OVERHEAD = 4
+REPLY_PRIMER = 3
+
+class PromptBudgetError(ValueError):
+    """The prompt cannot fit the token budget even after dropping optional fields"""
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+def estimate_tokens(text: str) -> int:
+    """BPE-like estimate: words by ~4 characters, digits in groups of 3, punctuation alone"""
+    count = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        piece = match.group()
+        count += math.ceil(len(piece) / 4) if piece[0].isalpha() else 1
+    return count
+
+def default_token_counter() -> Callable[[str], int]:
+    """tiktoken's cl100k_base when available, else the offline estimate"""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return estimate_tokens
+    return lambda text: len(encoding.encode(text))
+
+# Compact keys follow the abbreviations of the UCI/Kaggle CKD dataset
+# (PatientFeatures field, key, legend text, drop priority; None = never dropped)
+COMPACT_FIELDS = (
+    ("age", "age", "years", 12),
+    ("blood_pressure", "bp", "blood pressure mmHg", None),
+    ("specific_gravity", "sg", "urine specific gravity", None),
+    ("albumin", "al", "urine albumin 0-5", None),
+    ("sugar", "su", "urine sugar 0-5", 8),
+    ("blood_glucose_random", "bgr", "random glucose mg/dL", 5),
+    ("blood_urea", "bu", "blood urea mg/dL", None),
+    ("serum_creatinine", "sc", "serum creatinine mg/dL", None),
+    ("sodium", "sod", "sodium mEq/L", 3),
+    ("potassium", "pot", "potassium mEq/L", 4),
+    ("hemoglobin", "hemo", "hemoglobin g/dL", None),
+    ("packed_cell_volume", "pcv", "packed cell volume %", 6),
+    ("white_blood_cell_count", "wc", "WBC cells/cumm", 1),
+    ("red_blood_cell_count", "rc", "RBC millions/cmm", 2),
+    ("red_blood_cells", "rbc_abn", "abnormal urine RBCs", 10),
+    ("pus_cell", "pc_abn", "abnormal pus cells", 9),
+    ("pus_cell_clumps", "pcc", "pus cell clumps", 7),
+    ("bacteria", "ba", "bacteria", 7),
+    ("hypertension", "htn", "hypertension", None),
+    ("diabetes_mellitus", "dm", "diabetes", None),
+    ("coronary_artery_disease", "cad", "coronary artery disease", 11),
+    ("appetite", "appet_poor", "poor appetite", 11),
+    ("pedal_edema", "pe", "pedal edema", 13),
+    ("anemia", "ane", "anemia", 13),
+)
+
+# Optional fields, least informative for CKD first; the rest are never dropped
+DROP_ORDER = tuple(name for name, _, _, priority in sorted(
+    (f for f in COMPACT_FIELDS if f[3] is not None), key=lambda f: f[3]
+))
+
+def _format_number(name: str) -> Callable[[float], str]:
+    if name in INTEGER_FIELDS:
+        return lambda value: str(int(value))
+    return lambda value: ("%.4f" % value).rstrip("0").rstrip(".")
+
+class Prompt(NamedTuple):
+    messages: List[Dict[str, str]]
+    tokens: int
+    dropped: Tuple[str, ...]
+
+class PromptTemplate:
+    """A prompt version: a fixed system prefix plus a compiled patient renderer"""
+
+    def __init__(self, version: str, system: str):
+        self.version = version
+        self.system = system
+
+    def render_user(self, record: PatientRecord, dropped: frozenset = frozenset()) -> str:
+        raise NotImplementedError
+
+    def drop_order(self) -> Sequence[str]:
+        return DROP_ORDER
+
+class JSONTemplate(PromptTemplate):
+    """v1: the patient as sorted-key JSON (the original request layout)"""
+
+    def render_user(self, record: PatientRecord, dropped: frozenset = frozenset()) -> str:
+        data = patient_dict(record)
+        if dropped:
+            data = {k: v for k, v in data.items() if k not in dropped}
+        return json.dumps(data, sort_keys=True, separators=(",", ":"))
+
+class CompactTemplate(PromptTemplate):
+    """v2: one `key=value` line with a flags list; the legend lives in the system prefix"""
+
+    def __init__(self, version: str, fields: Sequence[Tuple[str, str, str, Optional[int]]]):
+        numeric = [f for f in fields if f[0] not in CATEGORICAL_LEVELS]
+        flags = [f for f in fields if f[0] in CATEGORICAL_LEVELS]
+        legend = ", ".join(f"{key} {text}" for _, key, text, _ in numeric)
+        flag_legend = ", ".join(f"{key} {text}" for _, key, text, _ in flags)
+        system = (
+            SYSTEM_PROMPT
+            + " The patient is one line of key=value pairs (" + legend + ")"
+            + " then flags: listing findings present (" + flag_legend + ")."
+            + " Unlisted flags are absent; missing keys were not measured."
+        )
+        super().__init__(version, system)
+        # Compiled once: (column index, field, key[, formatter])
+        self._numeric = [
+            (FEATURE_NAMES.index(name), name, key, _format_number(name)) for name, key, _, _ in numeric
+        ]
+        self._flags = [(FEATURE_NAMES.index(name), name, key) for name, key, _, _ in flags]
+
+    def render_user(self, record: PatientRecord, dropped: frozenset = frozenset()) -> str:
+        if isinstance(record, PatientFeatures):
+            parts = [
+                f"{key}={fmt(record[index])}" for index, name, key, fmt in self._numeric if name not in dropped
+            ]
+            present = [key for index, name, key in self._flags if record[index] == 1.0 and name not in dropped]
+        else:
+            # Raw dicts may be partial; absent keys are simply left out
+            parts = [
+                f"{key}={fmt(record[name])}" for _, name, key, fmt in self._numeric
+                if name in record and name not in dropped
+            ]
+            present = [
+                key for _, name, key in self._flags
+                if record.get(name) == CATEGORICAL_LEVELS[name][1] and name not in dropped
+            ]
+        if present:
+            parts.append("flags:" + ",".join(present))
+        return " ".join(parts)
+
+TEMPLATES: Dict[str, PromptTemplate] = {
+    "v1": JSONTemplate("v1", SYSTEM_PROMPT),
+    "v2": CompactTemplate("v2", COMPACT_FIELDS),
+}
+
+class PromptBuilder:
+    """Renders chat messages for one template version within an optional token budget"""
+
+    def __init__(self, version: str = "v2", max_tokens: Optional[int] = None, count_tokens: Optional[Callable[[str], int]] = None):
+        if version not in TEMPLATES:
+            raise ValueError(f"Unknown prompt version {version!r}; expected one of {sorted(TEMPLATES)}")
+        self.version = version
+        self.template = TEMPLATES[version]
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens or default_token_counter()
+        self.system_message = {"role": "system", "content": self.template.system}
+        # The shared prefix is the same for every request: count it once
+        self.prefix_tokens = self.count_tokens(self.template.system) + MESSAGE_OVERHEAD + REPLY_PRIMER
+
+    def build(self, record: PatientRecord) -> Prompt:
+        """Messages plus their estimated token count; drops optional fields to fit max_tokens"""
+        dropped: frozenset = frozenset()
+        user = self.template.render_user(record)
+        tokens = self.prefix_tokens + self.count_tokens(user) + MESSAGE_OVERHEAD
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            for name in self.template.drop_order():
+                dropped = dropped | {name}
+                user = self.template.render_user(record, dropped)
+                tokens = self.prefix_tokens + self.count_tokens(user) + MESSAGE_OVERHEAD
+                if tokens <= self.max_tokens:
+                    break
+            else:
+                raise PromptBudgetError(
+                    f"Prompt needs {tokens} tokens with all optional fields dropped; budget is {self.max_tokens}"
+                )
+        messages = [self.system_message, {"role": "user", "content": user}]
+        return Prompt(messages, tokens, tuple(sorted(dropped)))
+
+    def messages(self, record: PatientRecord) -> List[Dict[str, str]]:
+        return self.build(record).messages
+
+def _bench_records(n: int) -> List[PatientFeatures]:
+    """Deterministic, varied in-range records"""
+    base = PatientFeatures.from_dict({
+        "age": 65, "blood_pressure": 140, "specific_gravity": 1.02, "albumin": 1, "sugar": 0,
+        "red_blood_cells": "normal", "pus_cell": "normal", "pus_cell_clumps": "notpresent",
+        "bacteria": "notpresent", "blood_glucose_random": 117, "blood_urea": 56, "serum_creatinine": 3.8,
+        "sodium": 111, "potassium": 2.5, "hemoglobin": 11.2, "packed_cell_volume": 32,
+        "white_blood_cell_count": 6700, "red_blood_cell_count": 3.9, "hypertension": "yes",
+        "diabetes_mellitus": "yes", "coronary_artery_disease": "no", "appetite": "good",
+        "pedal_edema": "yes", "anemia": "yes",
+    })
+    return [
+        base._replace(age=float(20 + i % 70), serum_creatinine=round(0.5 + (i % 90) / 10, 1), anemia=float(i % 2))
+        for i in range(n)
+    ]
+
+def benchmark(n: int = 20000, max_tokens: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Render throughput and token usage per prompt version"""
+    records = _bench_records(n)
+    rows = []
+    for version in TEMPLATES:
+        builder = PromptBuilder(version, max_tokens=max_tokens)
+        start = time.perf_counter()
+        for record in records:
+            builder.template.render_user(record)
+        render_seconds = time.perf_counter() - start
+        prompts, over_budget = [], 0
+        start = time.perf_counter()
+        for record in records:
+            try:
+                prompts.append(builder.build(record))
+            except PromptBudgetError:
+                over_budget += 1
+        build_seconds = time.perf_counter() - start
+        built = max(len(prompts), 1)
+        rows.append({
+            "version": version,
+            "renders_per_second": n / render_seconds,
+            "builds_per_second": n / build_seconds,
+            "prefix_tokens": builder.prefix_tokens,
+            "mean_tokens": sum(p.tokens for p in prompts) / built,
+            "mean_uncached_tokens": sum(p.tokens - builder.prefix_tokens for p in prompts) / built,
+            "truncated": sum(1 for p in prompts if p.dropped),
+            "over_budget": over_budget,
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="CKD prompt builder")
+    parser.add_argument("command", choices=["bench", "show"])
+    parser.add_argument("--version", default="v2", help="Prompt version for show")
+    parser.add_argument("-n", type=int, default=20000, help="Records to render for bench")
+    parser.add_argument("--max-tokens", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "show":
+        prompt = PromptBuilder(args.version, max_tokens=args.max_tokens).build(_bench_records(1)[0])
+        for message in prompt.messages:
+            print(f"[{message['role']}]\n{message['content']}\n")
+        print(f"~{prompt.tokens} tokens, dropped: {', '.join(prompt.dropped) or 'none'}")
+        return
+
+    print(f"{'version':<8} {'renders/s':>11} {'builds/s':>10} {'prefix':>7} {'tokens':>7} {'uncached':>9} {'truncated':>10} {'over budget':>12}")
+    for row in benchmark(args.n, args.max_tokens):
+        print(
+            f"{row['version']:<8} {row['renders_per_second']:>11,.0f} {row['builds_per_second']:>10,.0f} "
+            f"{row['prefix_tokens']:>7} {row['mean_tokens']:>7.1f} {row['mean_uncached_tokens']:>9.1f} "
+            f"{row['truncated']:>10} {row['over_budget']:>12}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import re
+import time
+
+from backend import tracing
+from backend.features import PatientRecord
+from backend.instrumentation import LLM_RETRIES, LLM_TOKENS, timed_stage
+from backend.prompts import PromptBuilder
+
+if TYPE_CHECKING:
+    # httpx is only imported once an OpenAI-compatible provider is built
+    import httpx
+
+StreamEvent = Tuple[str, Dict[str, Any]]
+
+def result_events(result: Dict[str, Any]) -> Iterator[StreamEvent]:
+    """
+    Split a complete prediction into the event sequence used for streaming:
+    score first, then explanation tokens, then risk factors, then done.
+    """
+    yield "score", {"prediction": result.get("prediction"), "confidence": result.get("confidence")}
+    for token in re.findall(r"\S+\s*", result.get("explanation", "")):
+        yield "explanation", {"token": token}
+    for factor in result.get("risk_factors", []):
+        yield "risk_factor", {"risk_factor": factor}
+    yield "done", {}
+
+class LLMProvider:
+    """
+    Backend interface behind LLMClient.
+    Subclasses implement complete(); batching and streaming fall back to it.
+    """
+
+    model_name = "unknown"
+    # Part of the cache key: bump when the request layout changes
+    prompt_version = "v1"
+
+    async def astart(self):
+        """Warm up (open connection pools) before the first request"""
+
+    async def complete(self, patient_data: PatientRecord) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def complete_batch(self, records: List[PatientRecord]) -> List[Union[Dict[str, Any], Exception]]:
+        return list(await asyncio.gather(*(self.complete(r) for r in records), return_exceptions=True))
+
+    async def stream(self, patient_data: PatientRecord) -> AsyncIterator[StreamEvent]:
+        for event in result_events(await self.complete(patient_data)):
+            yield event
+
+    async def aclose(self):
+        pass
+
+    def close(self):
+        pass
+
+class MockProvider(LLMProvider):
+    """Simulated blocking LLM; blocking calls run on a bounded thread pool"""
+
+    model_name = "mock-llm-model"
+
+    def __init__(self, latency: float = 0.5, max_workers: Optional[int] = None):
+        self.latency = latency
+        # Blocking backends run on a bounded pool so concurrent requests overlap
+        # without spawning an unbounded number of threads
+        self.max_workers = max_workers or int(os.getenv("LLM_MAX_WORKERS", "16"))
+        self._executor = self._new_executor()
+
+    def _new_executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm-client")
+
+    def _respond(self, patient_data: PatientRecord) -> Dict[str, Any]:
+        """
+        Mock prediction function that returns a simulated LLM response
+        """
+        return {
+            "prediction": 0.85,
+            "confidence": 0.92,
+            "explanation": "Based on the provided data, there is a high probability of CKD. Key risk factors include high blood pressure, diabetes, and age.",
+            "risk_factors": ["high blood pressure", "diabetes", "age"]
+        }
+
+    def complete_blocking(self, patient_data: PatientRecord) -> Dict[str, Any]:
+        """Blocking single prediction"""
+        # Simulate processing time
+        time.sleep(self.latency)
+        return self._respond(patient_data)
+
+    def complete_batch_blocking(self, records: List[PatientRecord]) -> List[Union[Dict[str, Any], Exception]]:
+        """Blocking batch prediction; one backend round trip for all records"""
+        time.sleep(self.latency)
+        results: List[Union[Dict[str, Any], Exception]] = []
+        for record in records:
+            try:
+                results.append(self._respond(record))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def complete(self, patient_data: PatientRecord) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.complete_blocking, patient_data)
+
+    async def complete_batch(self, records: List[PatientRecord]) -> List[Union[Dict[str, Any], Exception]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.complete_batch_blocking, records)
+
+    async def stream(self, patient_data: PatientRecord) -> AsyncIterator[StreamEvent]:
+        """
+        The mock emits the score after a tenth of its latency and spreads the
+        remaining tokens over the rest, like a streaming LLM would.
+        """
+        events = list(result_events(self._respond(patient_data)))
+        await asyncio.sleep(self.latency * 0.1)
+        delay = self.latency * 0.9 / max(len(events) - 1, 1)
+        for i, event in enumerate(events):
+            if i:
+                await asyncio.sleep(delay)
+            yield event
+
+    def close(self):
+        # Threads start on demand, so a fresh pool keeps the provider usable
+        # after an app restart in the same process (tests, reloads)
+        self._executor.shutdown(wait=False)
+        self._executor = self._new_executor()
+
+    async def aclose(self):
+        self.close()
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class ProviderError(Exception):
+    """The backend returned an unusable response or ran out of retries"""
+
+_LENIENT_JSON = json.JSONDecoder(strict=False)
+
+def _parse_completion(content: str) -> Dict[str, Any]:
+    try:
+        payload = _LENIENT_JSON.decode(content)
+    except ValueError as e:
+        raise ProviderError(f"Model returned non-JSON content: {content[:200]!r}") from e
+    return {
+        "prediction": float(payload.get("prediction", 0.0)),
+        "confidence": float(payload.get("confidence", 0.0)),
+        "explanation": str(payload.get("explanation", "")),
+        "risk_factors": [str(f) for f in payload.get("risk_factors", [])]
+    }
+
+class _StreamingJSONParser:
+    """
+    Incrementally pulls score and explanation text out of a JSON object as
+    the model writes it, so they can be forwarded before the object closes.
+    """
+
+    _NUMBER = r"\s*:\s*(-?[0-9.]+(?:[eE][-+]?[0-9]+)?)\s*[,}]"
+    _EXPLANATION_START = re.compile(r'"explanation"\s*:\s*"')
+
+    def __init__(self):
+        self.buffer = ""
+        self.score_sent = False
+        self.explanation_start: Optional[int] = None
+        self.explanation_sent = 0
+
+    def feed(self, text: str) -> Iterator[StreamEvent]:
+        self.buffer += text
+        if not self.score_sent:
+            prediction = re.search('"prediction"' + self._NUMBER, self.buffer)
+            confidence = re.search('"confidence"' + self._NUMBER, self.buffer)
+            if prediction and confidence:
+                self.score_sent = True
+                yield "score", {"prediction": float(prediction.group(1)), "confidence": float(confidence.group(1))}
+        if self.explanation_start is None:
+            match = self._EXPLANATION_START.search(self.buffer)
+            if match:
+                self.explanation_start = match.end()
+        if self.explanation_start is not None and self.score_sent:
+            raw = self.buffer[self.explanation_start:]
+            end = self._string_end(raw)
+            safe = raw[:end] if end is not None else self._safe_prefix(raw)
+            decoded = _LENIENT_JSON.decode('"' + safe + '"')
+            if len(decoded) > self.explanation_sent:
+                yield "explanation", {"token": decoded[self.explanation_sent:]}
+                self.explanation_sent = len(decoded)
+
+    @staticmethod
+    def _string_end(raw: str) -> Optional[int]:
+        escaped = False
+        for i, ch in enumerate(raw):
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                return i
+        return None
+
+    @staticmethod
+    def _safe_prefix(raw: str) -> str:
+        # Do not cut an escape sequence in half
+        i = 0
+        while i < len(raw):
+            if raw[i] == "\\":
+                need = 6 if raw[i + 1:i + 2] == "u" else 2
+                if i + need > len(raw):
+                    return raw[:i]
+                i += need
+            else:
+                i += 1
+        return raw
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Chat-completions backend for any OpenAI-compatible server.
+    One pooled httpx.AsyncClient is shared by all requests; a semaphore caps
+    in-flight calls and transient failures are retried with jittered backoff.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        api_key: Optional[str] = None,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+        max_retries: int = 3,
+        backoff_base: float = 0.25,
+        backoff_max: float = 8.0,
+        max_concurrency: int = 64,
+        transport: Optional["httpx.AsyncBaseTransport"] = None,
+        prompt_builder: Optional[PromptBuilder] = None,
+    ):
+        import httpx
+
+        self.base_url = base_url.rstrip("/")
+        self.model_name = model
+        self.api_key = api_key
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        # HTTP/2 needs the optional h2 package
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self.transport = transport
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.prompt_version = self.prompt_builder.version
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _session(self) -> Tuple["httpx.AsyncClient", asyncio.Semaphore]:
+        """The pooled client and semaphore for the running event loop"""
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            headers = {"Content-Type": "application/json"}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                transport=self.transport
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client, self._semaphore
+
+    async def astart(self):
+        """Create the pool and open one keep-alive connection; the backend being down is not fatal"""
+        import httpx
+
+        client, _ = self._session()
+        try:
+            await client.get("/models", timeout=self.timeout.connect)
+        except httpx.HTTPError:
+            pass
+
+    def _request_body(self, patient_data: PatientRecord, stream: bool = False) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "temperature": 0,
+            "response_format": {"type": "json_object"},
+            "stream": stream,
+            "messages": self.prompt_builder.messages(patient_data)
+        }
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # Full jitter keeps retrying clients from synchronizing
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _post(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        import httpx
+
+        client, semaphore = self._session()
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with semaphore:
+                try:
+                    with tracing.span("llm.http", attributes={"http.request.attempt": attempt}) as http_span:
+                        response = await client.post("/chat/completions", json=body, headers=tracing.propagation_headers())
+                        http_span.set_attribute("http.response.status_code", response.status_code)
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    last_error = e
+                else:
+                    if response.status_code < 400:
+                        return response.json()
+                    last_error = ProviderError(f"Backend returned HTTP {response.status_code}: {response.text[:200]}")
+                    if response.status_code not in RETRYABLE_STATUS:
+                        raise last_error
+                    retry_after = response.headers.get("Retry-After")
+            if attempt < self.max_retries:
+                LLM_RETRIES.inc(1, self.model_name)
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+        raise ProviderError(f"Backend failed after {self.max_retries + 1} attempts: {last_error}")
+
+    async def complete(self, patient_data: PatientRecord) -> Dict[str, Any]:
+        with timed_stage("prompt"):
+            body = self._request_body(patient_data)
+        payload = await self._post(body)
+        usage = payload.get("usage") or {}
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind):
+                LLM_TOKENS.inc(usage[kind], self.model_name, kind.split("_")[0])
+        try:
+            content = payload["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise ProviderError(f"Unexpected completion payload: {payload!r}") from e
+        return _parse_completion(content)
+
+    async def stream(self, patient_data: PatientRecord) -> AsyncIterator[StreamEvent]:
+        client, semaphore = self._session()
+        parser = _StreamingJSONParser()
+        with timed_stage("prompt"):
+            body = self._request_body(patient_data, stream=True)
+        async with semaphore:
+            async with client.stream("POST", "/chat/completions", json=body, headers=tracing.propagation_headers()) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    raise ProviderError(f"Backend returned HTTP {response.status_code}: {response.text[:200]}")
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[len("data: "):]
+                    if data.strip() == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        for event in parser.feed(delta):
+                            yield event
+
+        result = _parse_completion(parser.buffer)
+        if not parser.score_sent:
+            yield "score", {"prediction": result["prediction"], "confidence": result["confidence"]}
+        if len(result["explanation"]) > parser.explanation_sent:
+            yield "explanation", {"token": result["explanation"][parser.explanation_sent:]}
+        for factor in result["risk_factors"]:
+            yield "risk_factor", {"risk_factor": factor}
+        yield "done", {}
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+def build_provider_from_env() -> LLMProvider:
+    """
+    Create the provider selected by LLM_PROVIDER (mock, openai or baseline).
+    Setting LLM_ROUTER_THRESHOLD puts the baseline model in front of it, and
+    LLM_CASSETTE records/replays its answers (LLM_CASSETTE_MODE).
+    """
+    kind = os.getenv("LLM_PROVIDER", "mock").lower()
+    if kind == "mock":
+        provider: LLMProvider = MockProvider(latency=float(os.getenv("LLM_MOCK_LATENCY", "0.5")))
+    elif kind == "openai":
+        provider = OpenAICompatibleProvider(
+            base_url=os.getenv("LLM_BASE_URL", "https://api.openai.com/v1"),
+            model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
+            api_key=os.getenv("LLM_API_KEY") or os.getenv("OPENAI_API_KEY"),
+            timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", "20")),
+            http2=os.getenv("LLM_HTTP2", "1") == "1",
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "64")),
+            prompt_builder=PromptBuilder(
+                version=os.getenv("LLM_PROMPT_VERSION", "v2"),
+                max_tokens=int(os.getenv("LLM_PROMPT_MAX_TOKENS")) if os.getenv("LLM_PROMPT_MAX_TOKENS") else None
+            )
+        )
+    elif kind == "baseline":
+        from backend.baseline import BaselineProvider
+        provider = BaselineProvider()
+    else:
+        raise ValueError(f"Unknown LLM_PROVIDER: {kind!r}")
+
+    threshold = os.getenv("LLM_ROUTER_THRESHOLD")
+    if threshold and kind != "baseline":
+        from backend.baseline import RoutedProvider
+        provider = RoutedProvider(provider, threshold=None if threshold == "auto" else float(threshold))
+
+    cassette_path = os.getenv("LLM_CASSETTE")
+    if cassette_path:
+        from backend.cassette import Cassette, CassetteProvider
+        provider = CassetteProvider(provider, Cassette(cassette_path), mode=os.getenv("LLM_CASSETTE_MODE", "auto"))
+    return provider
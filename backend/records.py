@@ -0,0 +1,10 @@
+from typing import Any
+
+def coerce_csv_value(value: str) -> Any:
+    """CSV cell as int, then float, else the string unchanged"""
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
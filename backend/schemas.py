@@ -0,0 +1,27 @@
+from pydantic import BaseModel, Field
+
+class PatientData(BaseModel):
+    age: int = Field(..., ge=0, le=120)
+    blood_pressure: int = Field(..., ge=60, le=250)
+    specific_gravity: float = Field(..., ge=1.0, le=1.05)
+    albumin: int = Field(..., ge=0, le=5)
+    sugar: int = Field(..., ge=0, le=5)
+    red_blood_cells: str = Field(..., pattern="^(normal|abnormal)$")
+    pus_cell: str = Field(..., pattern="^(normal|abnormal)$")
+    pus_cell_clumps: str = Field(..., pattern="^(present|notpresent)$")
+    bacteria: str = Field(..., pattern="^(present|notpresent)$")
+    blood_glucose_random: int = Field(..., ge=0, le=500)
+    blood_urea: int = Field(..., ge=0, le=200)
+    serum_creatinine: float = Field(..., ge=0.0, le=20.0)
+    sodium: int = Field(..., ge=0, le=200)
+    potassium: float = Field(..., ge=0.0, le=20.0)
+    hemoglobin: float = Field(..., ge=0.0, le=20.0)
+    packed_cell_volume: int = Field(..., ge=0, le=100)
+    white_blood_cell_count: int = Field(..., ge=0, le=20000)
+    red_blood_cell_count: float = Field(..., ge=0.0, le=10.0)
+    hypertension: str = Field(..., pattern="^(yes|no)$")
+    diabetes_mellitus: str = Field(..., pattern="^(yes|no)$")
+    coronary_artery_disease: str = Field(..., pattern="^(yes|no)$")
+    appetite: str = Field(..., pattern="^(good|poor)$")
+    pedal_edema: str = Field(..., pattern="^(yes|no)$")
+    anemia: str = Field(..., pattern="^(yes|no)$")
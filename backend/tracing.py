@@ -0,0 +1,494 @@
+"""
+Sampled request tracing with OpenTelemetry-compatible spans.
+
+Spans carry W3C trace and span ids and nest through a ContextVar, so asyncio
+tasks inherit the span that was current when they were created. Between
+processes the context travels as a `traceparent` string: the HTTP header in
+both directions, and a column on bulk jobs so that the workers scoring a
+job's chunks continue the trace of its upload.
+
+Tracing is off unless TRACE_PATH is set, and then every span of a local
+trace is buffered until the trace's first span ends. The trace is kept if it
+was head-sampled (TRACE_SAMPLE_RATE, or the sampled flag of a remote parent),
+if any span recorded an error, or if it took at least TRACE_SLOW_MS.
+Everything else is dropped, so most requests cost a few small objects and no
+I/O. Kept spans are appended to TRACE_PATH as JSON lines with OTLP field
+names by a background thread. Several worker processes can share the file.
+
+    python -m backend traces traces.jsonl             # slowest traces as flame charts
+    python -m backend traces traces.jsonl --summary   # self time per span path
+"""
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+import atexit
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """A SpanContext from a W3C traceparent value, or None if it is missing or malformed"""
+    match = _TRACEPARENT.match(value.strip().lower()) if value else None
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return SpanContext(match.group(1), match.group(2), bool(int(match.group(3), 16) & 1))
+
+def format_traceparent(context: SpanContext) -> str:
+    return f"00-{context.trace_id}-{context.span_id}-{'01' if context.sampled else '00'}"
+
+class _Trace:
+    """The spans of one trace recorded in this process, held until its first span ends"""
+
+    __slots__ = ("root", "sampled", "spans", "error", "done", "kept", "dropped")
+
+    def __init__(self, sampled: bool):
+        self.root: Optional[Span] = None
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self.error = False
+        self.done = False
+        self.kept = False
+        self.dropped = 0
+
+class Span:
+    """One timed operation; a context manager that makes it the current span"""
+
+    __slots__ = (
+        "tracer", "name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+        "attributes", "error", "links", "_trace", "_token",
+    )
+
+    def __init__(self, tracer: "Tracer", name: str, trace: _Trace, trace_id: str, parent_id: Optional[str],
+                 kind: str, attributes: Optional[Dict[str, Any]], links: List[SpanContext]):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes if attributes is not None else {}
+        self.error: Optional[str] = None
+        self.links = links
+        self._trace = trace
+        self._token = None
+
+    @property
+    def context(self) -> SpanContext:
+        return SpanContext(self.trace_id, self.span_id, self._trace.sampled)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add_link(self, other: "Span"):
+        if isinstance(other, Span):
+            self.links.append(other.context)
+
+    def record_error(self, error: Any):
+        self.error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+        self._trace.error = True
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer._finish(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            if isinstance(exc, Exception):
+                self.record_error(exc)
+            else:
+                # Cancelled by a deadline or disconnect; the request span carries the outcome
+                self.attributes["cancelled"] = True
+        _current.reset(self._token)
+        self.end()
+        return False
+
+    def to_dict(self, resource: Dict[str, Any]) -> Dict[str, Any]:
+        """OTLP/JSON span fields, with attributes as a plain object"""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": self.attributes,
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_UNSET"},
+            "resource": resource,
+        }
+        if self.links:
+            span["links"] = [{"traceId": link.trace_id, "spanId": link.span_id} for link in self.links]
+        return span
+
+class _NoopSpan:
+    """Stands in for Span while tracing is off"""
+
+    trace_id = span_id = None
+    context = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def add_link(self, other: Any):
+        pass
+
+    def record_error(self, error: Any):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+# Default for `parent`: the current span, if any
+CURRENT = object()
+
+class FileExporter:
+    """Appends spans to a JSON-lines file from a background thread"""
+
+    def __init__(self, path: str, resource: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.resource = resource or {}
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+        self._queue.put(spans)
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # O_APPEND and one write per batch keep lines from several processes intact
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            while True:
+                item = self._queue.get()
+                lines = []
+                # Everything already queued goes out in the same write
+                while isinstance(item, list):
+                    lines.extend(json.dumps(span.to_dict(self.resource), default=str) for span in item)
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        item = False
+                if lines:
+                    os.write(fd, ("\n".join(lines) + "\n").encode())
+                if item is None:
+                    return
+                if isinstance(item, threading.Event):
+                    item.set()
+        finally:
+            os.close(fd)
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until everything exported so far is on disk"""
+        if self._thread is not None and self._thread.is_alive():
+            done = threading.Event()
+            self._queue.put(done)
+            done.wait(timeout)
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(5.0)
+
+class Tracer:
+    """Creates spans and applies head and tail sampling to each local trace"""
+
+    def __init__(self, exporter: Any, sample_rate: float = 0.01, slow_seconds: float = 1.0, max_spans: int = 512):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_ns = int(slow_seconds * 1e9)
+        self.max_spans = max_spans
+        self.kept = 0
+        self.dropped = 0
+
+    def start_span(self, name: str, parent: Any = CURRENT, links: Sequence[Any] = (),
+                   attributes: Optional[Dict[str, Any]] = None, kind: str = "SPAN_KIND_INTERNAL") -> Span:
+        """A new span; parent is a Span, a remote SpanContext, None for a new trace, or the current span"""
+        if parent is CURRENT:
+            parent = _current.get()
+        link_contexts = [
+            link.context if isinstance(link, Span) else link for link in links if isinstance(link, (Span, SpanContext))
+        ] if links else []
+        if isinstance(parent, Span):
+            return Span(self, name, parent._trace, parent.trace_id, parent.span_id, kind, attributes, link_contexts)
+        if isinstance(parent, SpanContext):
+            # Remote parent: follow its sampling decision
+            trace = _Trace(parent.sampled)
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            # A new trace is head-sampled if any trace it is linked to was
+            sampled = any(link.sampled for link in link_contexts) or random.random() < self.sample_rate
+            trace = _Trace(sampled)
+            trace_id, parent_id = "%032x" % random.getrandbits(128), None
+        span = Span(self, name, trace, trace_id, parent_id, kind, attributes, link_contexts)
+        trace.root = span
+        return span
+
+    def _finish(self, span: Span):
+        trace = span._trace
+        if trace.done:
+            # A late child, e.g. a background task that outlived its request
+            if trace.kept:
+                self.exporter.export([span])
+            return
+        if span is not trace.root:
+            if len(trace.spans) < self.max_spans:
+                trace.spans.append(span)
+            else:
+                trace.dropped += 1
+            return
+        trace.done = True
+        trace.kept = trace.sampled or trace.error or span.end_ns - span.start_ns >= self.slow_ns
+        if trace.kept:
+            if trace.dropped:
+                span.attributes["trace.dropped_spans"] = trace.dropped
+            self.kept += 1
+            self.exporter.export(trace.spans + [span])
+        else:
+            self.dropped += 1
+        trace.spans = []
+
+_current: ContextVar[Optional[Span]] = ContextVar("ckd_trace_span", default=None)
+
+def build_tracer_from_env() -> Optional[Tracer]:
+    """A Tracer writing to TRACE_PATH, or None (tracing off) when it is unset"""
+    path = os.getenv("TRACE_PATH")
+    if not path:
+        return None
+    resource = {"service.name": os.getenv("OTEL_SERVICE_NAME", "ckd-llm-poc"), "process.pid": os.getpid()}
+    exporter = FileExporter(path, resource)
+    atexit.register(exporter.close)
+    return Tracer(
+        exporter,
+        sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+        slow_seconds=float(os.getenv("TRACE_SLOW_MS", "1000")) / 1000,
+        max_spans=int(os.getenv("TRACE_MAX_SPANS", "512")),
+    )
+
+_tracer: Optional[Tracer] = build_tracer_from_env()
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+def set_tracer(tracer: Optional[Tracer]) -> Optional[Tracer]:
+    """Install a tracer (None turns tracing off); returns the previous one"""
+    global _tracer
+    previous, _tracer = _tracer, tracer
+    return previous
+
+def enabled() -> bool:
+    return _tracer is not None
+
+def span(name: str, parent: Any = CURRENT, links: Sequence[Any] = (),
+         attributes: Optional[Dict[str, Any]] = None, kind: str = "SPAN_KIND_INTERNAL"):
+    """A span to use as a context manager, or to end() by hand; a no-op while tracing is off"""
+    if _tracer is None:
+        return NOOP_SPAN
+    return _tracer.start_span(name, parent, links, attributes, kind)
+
+def record_span(name: str, seconds: float, attributes: Optional[Dict[str, Any]] = None):
+    """A child of the current span that ends now and took `seconds`, for stages timed elsewhere"""
+    if _tracer is None or _current.get() is None:
+        return
+    recorded = _tracer.start_span(name, attributes=attributes)
+    recorded.start_ns -= int(seconds * 1e9)
+    recorded.end()
+
+def current_traceparent() -> Optional[str]:
+    """traceparent of the current span, for handing the trace to another process"""
+    current = _current.get()
+    return format_traceparent(current.context) if current is not None else None
+
+def propagation_headers() -> Dict[str, str]:
+    """Headers that continue the current trace in an outgoing HTTP request"""
+    traceparent = current_traceparent()
+    return {"traceparent": traceparent} if traceparent else {}
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening the server span of each HTTP request. An
+    incoming traceparent header becomes its parent; the trace id goes back
+    in an X-Trace-Id header so a slow response can be looked up.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        tracer = _tracer
+        if tracer is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+        method = scope.get("method", "")
+        request_span = tracer.start_span(
+            method, parent=parent, kind="SPAN_KIND_SERVER",
+            attributes={"http.request.method": method, "url.path": scope.get("path", "")}
+        )
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", request_span.trace_id.encode())]
+            await send(message)
+
+        with request_span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Route template, not raw path, like MetricsMiddleware
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                request_span.name = f"{method} {route}"
+                request_span.set_attribute("http.route", route)
+                request_span.set_attribute("http.response.status_code", status["code"])
+                if status["code"] >= 500 and request_span.error is None:
+                    request_span.record_error(f"HTTP {status['code']}")
+
+def load_traces(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Spans from a trace file, grouped by trace id"""
+    traces: Dict[str, List[Dict[str, Any]]] = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                span = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash
+                continue
+            span["start"] = int(span["startTimeUnixNano"])
+            span["end"] = int(span["endTimeUnixNano"])
+            traces.setdefault(span["traceId"], []).append(span)
+    return traces
+
+def _tree(spans: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+    """Root spans (no parent in the file) and children by parent id, both in start order"""
+    ids = {span["spanId"] for span in spans}
+    roots, children = [], {}
+    for span in sorted(spans, key=lambda s: s["start"]):
+        parent = span.get("parentSpanId")
+        if parent and parent in ids:
+            children.setdefault(parent, []).append(span)
+        else:
+            roots.append(span)
+    return roots, children
+
+def trace_duration(spans: List[Dict[str, Any]]) -> int:
+    return max(s["end"] for s in spans) - min(s["start"] for s in spans)
+
+def trace_failed(spans: List[Dict[str, Any]]) -> bool:
+    return any(s["status"].get("code") == "STATUS_CODE_ERROR" for s in spans)
+
+def format_trace(spans: List[Dict[str, Any]], width: int = 40, traces: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> List[str]:
+    """
+    A flame-style chart: one line per span with its duration and a bar
+    placed on the trace's timeline. Spans linked to another trace in
+    `traces` (a batch serving this request) are drawn under the link.
+    """
+    origin = min(s["start"] for s in spans)
+    total = max(trace_duration(spans), 1)
+    roots, children = _tree(spans)
+    name_width = 36
+    lines = []
+
+    def bar(span: Dict[str, Any]) -> str:
+        offset = min(width - 1, max(0, int((span["start"] - origin) / total * width)))
+        length = max(1, min(width - offset, round((span["end"] - span["start"]) / total * width)))
+        return " " * offset + "█" * length + " " * (width - offset - length)
+
+    def walk(span: Dict[str, Any], depth: int, seen: set):
+        label = ("  " * depth + span["name"])[:name_width]
+        flag = "  ! " + span["status"].get("message", "") if span["status"].get("code") == "STATUS_CODE_ERROR" else ""
+        lines.append(f"{label:<{name_width}} {(span['end'] - span['start']) / 1e6:>10.2f} ms |{bar(span)}|{flag}")
+        for child in children.get(span["spanId"], []):
+            walk(child, depth + 1, seen)
+        for link in span.get("links", ()):
+            linked = (traces or {}).get(link["traceId"])
+            if not linked or link["traceId"] in seen:
+                continue
+            for target in linked:
+                if target["spanId"] == link["spanId"]:
+                    children.update(_tree(linked)[1])
+                    lines.append(f"{'  ' * (depth + 1)}~ linked trace {link['traceId']}")
+                    walk(target, depth + 1, seen | {link["traceId"]})
+
+    for root in roots:
+        walk(root, 0, {root["traceId"]})
+    return lines
+
+def summarize(traces: Iterable[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Count, self time and duration percentiles per span path (root;child;...), most self time first"""
+    stats: Dict[str, Dict[str, Any]] = {}
+    for spans in traces:
+        roots, children = _tree(spans)
+        stack = [(root, root["name"]) for root in roots]
+        while stack:
+            span, path = stack.pop()
+            duration = span["end"] - span["start"]
+            kids = children.get(span["spanId"], [])
+            # Concurrent children can add up to more than the parent
+            own = max(0, duration - sum(k["end"] - k["start"] for k in kids))
+            entry = stats.setdefault(path, {"path": path, "count": 0, "self_ns": 0, "durations": []})
+            entry["count"] += 1
+            entry["self_ns"] += own
+            entry["durations"].append(duration)
+            stack.extend((kid, f"{path};{kid['name']}") for kid in kids)
+    rows = []
+    for entry in stats.values():
+        durations = sorted(entry.pop("durations"))
+        entry["p50_ns"] = durations[len(durations) // 2]
+        entry["p95_ns"] = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        rows.append(entry)
+    return sorted(rows, key=lambda row: row["self_ns"], reverse=True)
+
+def select_traces(traces: Dict[str, List[Dict[str, Any]]], name: Optional[str] = None, errors: bool = False,
+                  min_ms: float = 0.0) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Traces whose root is called `name` (or any), optionally only failed or slow ones, slowest first"""
+    chosen = []
+    for trace_id, spans in traces.items():
+        if name is not None and not any(root["name"] == name for root in _tree(spans)[0]):
+            continue
+        if errors and not trace_failed(spans):
+            continue
+        if trace_duration(spans) < min_ms * 1e6:
+            continue
+        chosen.append((trace_id, spans))
+    return iter(sorted(chosen, key=lambda item: trace_duration(item[1]), reverse=True))
@@ -0,0 +1,215 @@
+from typing import Any, Dict, Optional
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers, MutableHeaders
+import gzip
+import hashlib
+import json
+import os
+import zlib
+
+# Both are optional: without orjson responses use the stdlib encoder,
+# without brotli only gzip is offered
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON bytes, through orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with `dumps`"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def accepted_encodings(headers: Headers) -> set:
+    """Content codings named in Accept-Encoding, without q=0 ones"""
+    accepted = set()
+    for part in headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.partition(";")
+        name, _, value = params.replace(" ", "").partition("=")
+        try:
+            refused = name == "q" and float(value) == 0
+        except ValueError:
+            refused = False
+        if coding.strip() and not refused:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+# Already compressed, or must reach the client unbuffered
+EXCLUDED_CONTENT_TYPES = frozenset({
+    "application/gzip", "application/x-gzip", "application/zip", "application/grpc",
+    "audio/*", "video/*", "font/woff", "font/woff2",
+    "image/avif", "image/gif", "image/jpeg", "image/png", "image/webp",
+    "text/event-stream",
+})
+
+class _GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def __call__(self, body: bytes, final: bool) -> bytes:
+        # Sync-flush so each streamed chunk reaches the client without waiting for the next
+        return self._compressor.compress(body) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class _BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def __call__(self, body: bytes, final: bool) -> bytes:
+        return self._compressor.process(body) + (self._compressor.finish() if final else self._compressor.flush())
+
+class CompressionMiddleware:
+    """Brotli when the client accepts it and the package is installed, gzip otherwise
+
+    Bodies under `minimum_size` bytes, event streams and already encoded
+    responses go out as they are; streamed bodies are compressed chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, compresslevel: int = 6, brotli_quality: int = 4,
+                 exclude_content_types=EXCLUDED_CONTENT_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.brotli_quality = brotli_quality
+        self.exclude_content_types = frozenset(exclude_content_types)
+
+    def _encoder(self, scope):
+        accepted = accepted_encodings(Headers(scope=scope))
+        if brotli is not None and "br" in accepted:
+            return _BrotliEncoder(self.brotli_quality)
+        if "gzip" in accepted:
+            return _GzipEncoder(self.compresslevel)
+        return None
+
+    def _excluded(self, headers: Headers, status: int) -> bool:
+        if "content-encoding" in headers or status in (204, 206, 304):
+            return True
+        media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+        return media_type in self.exclude_content_types or media_type.partition("/")[0] + "/*" in self.exclude_content_types
+
+    async def __call__(self, scope, receive, send):
+        encoder = self._encoder(scope) if scope["type"] == "http" else None
+        if encoder is None:
+            await self.app(scope, receive, send)
+            return
+
+        # The start message is held back until the first body chunk shows
+        # whether compressing is worth it
+        pending = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal pending, passthrough
+            if message["type"] == "http.response.start":
+                if self._excluded(Headers(raw=message["headers"]), message["status"]):
+                    passthrough = True
+                    await send(message)
+                else:
+                    pending = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                if pending is not None:
+                    await send(pending)
+                    pending, passthrough = None, True
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if pending is not None:
+                start, pending = pending, None
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoder.name
+                headers.add_vary_header("Accept-Encoding")
+                body = encoder(body, not more_body)
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+            else:
+                body = encoder(body, not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+class CachedPage:
+    """A small file served from memory with a content ETag and pre-compressed bodies
+
+    The file is re-read only when its modification time changes, so edits
+    show up without a restart. Clients revalidate on every load (`no-cache`)
+    and get an empty 304 while the content is unchanged.
+    """
+
+    def __init__(self, path: str, media_type: str = "text/html; charset=utf-8", cache_control: str = "no-cache"):
+        self.path = path
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.etag = ""
+        self.bodies: Dict[str, bytes] = {}
+        self._mtime: Optional[int] = None
+
+    def _refresh(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return
+        with open(self.path, "rb") as f:
+            body = f.read()
+        bodies = {"identity": body, "gzip": gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            bodies["br"] = brotli.compress(body)
+        self.bodies = bodies
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self._mtime = mtime
+
+    def response(self, request: Request) -> Response:
+        self._refresh()
+        headers = {"ETag": self.etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if _etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        accepted = accepted_encodings(request.headers)
+        encoding = next((e for e in ("br", "gzip") if e in accepted and e in self.bodies), "identity")
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(self.bodies[encoding], media_type=self.media_type, headers=headers)
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles (ETag, Last-Modified, 304) with a Cache-Control max-age"""
+
+    def __init__(self, *args, max_age: int = 3600, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = f"public, max-age={max_age}"
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers.setdefault("Cache-Control", self.cache_control)
+        return response
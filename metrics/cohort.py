@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Synthetic patient cohorts at benchmark scale.
+
+Serum creatinine, blood urea and blood pressure are the PatientData fields
+that the Kaggle CKD dataset (backend/ckd_dataset.csv) also has. For those,
+the generator fits a Gaussian mixture on log creatinine, log urea and
+blood pressure, with one component per CKD stage (0 = no CKD) and dataset
+cluster. That keeps both the severe CKD group and the correlation between
+the three values. The dataset has no other PatientData field. Those are drawn
+from the per-class priors in CLASS_PRIORS, which are typical values from the
+UCI CKD study that PatientData mirrors. Hemoglobin drives packed cell
+volume, red cell count and the anemia flag.
+
+The ground-truth prediction is the posterior P(CKD) of the fitted mixture
+at the patient's lab values. Ground-truth risk factors are derived from
+the record with the rules in risk_factor_matrix, using the canonical terms
+of semantic_scorer.
+
+Rows are generated in fixed blocks, each seeded from (seed, block number).
+The same seed and size therefore give the same cohort whatever the
+chunking or shard size.
+
+    python metrics/cohort.py -n 1000000 --format jsonl --shard-size 100000 --out reports/cohort
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+# Same file and conversion as backend/baseline.py, kept here so this tool
+# runs without the backend package importable
+DATASET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend", "ckd_dataset.csv")
+UREA_PER_BUN = 2.14
+
+BLOCK_SIZE = 65_536
+FORMATS = ("jsonl", "csv", "parquet")
+
+# PatientData fields in schema order
+PATIENT_FIELDS = (
+    "age", "blood_pressure", "specific_gravity", "albumin", "sugar", "red_blood_cells", "pus_cell",
+    "pus_cell_clumps", "bacteria", "blood_glucose_random", "blood_urea", "serum_creatinine", "sodium",
+    "potassium", "hemoglobin", "packed_cell_volume", "white_blood_cell_count", "red_blood_cell_count",
+    "hypertension", "diabetes_mellitus", "coronary_artery_disease", "appetite", "pedal_edema", "anemia"
+)
+
+# Fields the Kaggle dataset does not have, per class: (no CKD, CKD).
+# Continuous: (mean, sd); levels: probabilities of 0..5 or of the specific gravity levels;
+# flags: probability of the abnormal/present/yes value
+CLASS_PRIORS: Dict[str, Tuple[Any, Any]] = {
+    "age": ((46.5, 15.6), (54.5, 17.4)),
+    "blood_glucose_random": ((107.7, 18.6), (175.4, 92.1)),
+    "sodium": ((141.7, 4.8), (133.9, 8.0)),
+    "potassium": ((4.3, 0.6), (4.9, 1.0)),
+    "hemoglobin": ((15.2, 1.3), (10.6, 2.2)),
+    "white_blood_cell_count": ((7700, 1800), (9070, 3200)),
+    "specific_gravity": ((0.0, 0.0, 0.02, 0.45, 0.53), (0.04, 0.35, 0.30, 0.28, 0.03)),
+    "albumin": ((0.98, 0.02, 0.0, 0.0, 0.0, 0.0), (0.30, 0.20, 0.20, 0.20, 0.09, 0.01)),
+    "sugar": ((0.98, 0.02, 0.0, 0.0, 0.0, 0.0), (0.75, 0.05, 0.07, 0.06, 0.05, 0.02)),
+    "red_blood_cells": (0.01, 0.25),
+    "pus_cell": (0.02, 0.30),
+    "pus_cell_clumps": (0.01, 0.17),
+    "bacteria": (0.01, 0.09),
+    "hypertension": (0.10, 0.59),
+    "diabetes_mellitus": (0.05, 0.55),
+    "coronary_artery_disease": (0.02, 0.14),
+    "appetite": (0.02, 0.33),
+    "pedal_edema": (0.01, 0.30),
+}
+SPECIFIC_GRAVITY_LEVELS = np.array([1.005, 1.010, 1.015, 1.020, 1.025])
+
+# Categorical fields: (value when the flag is False, value when True)
+FLAG_VALUES = {
+    "red_blood_cells": ("normal", "abnormal"),
+    "pus_cell": ("normal", "abnormal"),
+    "pus_cell_clumps": ("notpresent", "present"),
+    "bacteria": ("notpresent", "present"),
+    "hypertension": ("no", "yes"),
+    "diabetes_mellitus": ("no", "yes"),
+    "coronary_artery_disease": ("no", "yes"),
+    "appetite": ("good", "poor"),
+    "pedal_edema": ("no", "yes"),
+    "anemia": ("no", "yes"),
+}
+
+# PatientData bounds
+LIMITS = {
+    "age": (0, 120), "blood_pressure": (60, 250), "blood_glucose_random": (0, 500), "blood_urea": (0, 200),
+    "serum_creatinine": (0.0, 20.0), "sodium": (0, 200), "potassium": (0.0, 20.0), "hemoglobin": (0.0, 20.0),
+    "packed_cell_volume": (0, 100), "white_blood_cell_count": (0, 20000), "red_blood_cell_count": (0.0, 10.0),
+}
+INTEGER_FIELDS = {"age", "blood_pressure", "albumin", "sugar", "blood_glucose_random", "blood_urea", "sodium",
+                  "packed_cell_volume", "white_blood_cell_count"}
+
+RISK_FACTORS = (
+    "hypertension", "diabetes", "age", "anemia", "albuminuria", "elevated creatinine", "elevated urea",
+    "coronary artery disease", "edema", "poor appetite"
+)
+
+Cohort = Dict[str, np.ndarray]
+
+# Mixture components fitted on fewer rows than this are dropped
+MIN_COMPONENT_ROWS = 10
+
+class CohortModel:
+    """Gaussian mixture over (log creatinine, log urea, blood pressure), one component per (stage, cluster)"""
+
+    def __init__(self, stages: np.ndarray, weights: np.ndarray, means: np.ndarray, covariances: np.ndarray):
+        self.stages = np.asarray(stages, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.covariances = np.asarray(covariances, dtype=np.float64)
+        self._cholesky = np.linalg.cholesky(self.covariances)
+        self._log_norm = -0.5 * np.linalg.slogdet(self.covariances)[1]
+        # Mahalanobis distances to every component as one matmul over quadratic features:
+        # (x - m)' A (x - m) = sum_ij A_ij x_i x_j - 2 (A m)' x + m' A m
+        inverse = np.linalg.inv(self.covariances)
+        self._pairs = np.triu_indices(self.means.shape[1])
+        rows, cols = self._pairs
+        quadratic = inverse[:, rows, cols] * np.where(rows == cols, 1.0, 2.0)
+        linear = -2.0 * np.einsum("kij,kj->ki", inverse, self.means)
+        constant = np.einsum("ki,ki->k", linear, self.means) / -2.0
+        self._mahalanobis = np.hstack([quadratic, linear, constant[:, None]]).T
+
+    @classmethod
+    def fit(cls, path: str = DATASET_PATH) -> "CohortModel":
+        with open(path) as f:
+            header = f.readline().strip().split(",")
+        columns = {name: i for i, name in enumerate(header)}
+        data = np.genfromtxt(
+            path, delimiter=",", skip_header=1,
+            usecols=tuple(columns[name] for name in ("serum_creatinine", "bun", "blood_pressure", "ckd_stage", "cluster"))
+        )
+        labs = np.column_stack([np.log(data[:, 0]), np.log(data[:, 1] * UREA_PER_BUN), data[:, 2]])
+        # The dataset's clusters separate e.g. the severe CKD group from near-normal labs within a stage
+        groups, inverse, counts = np.unique(data[:, 3:5].astype(int), axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        keep = np.flatnonzero(counts >= MIN_COMPONENT_ROWS)
+        return cls(
+            stages=groups[keep, 0],
+            weights=counts[keep] / counts[keep].sum(),
+            means=np.array([labs[inverse == k].mean(axis=0) for k in keep]),
+            covariances=np.array([np.cov(labs[inverse == k], rowvar=False) for k in keep])
+        )
+
+    def component_weights(self, prevalence: Optional[float] = None) -> np.ndarray:
+        """Component probabilities, optionally rescaled to a CKD prevalence"""
+        if prevalence is None:
+            return self.weights
+        ckd = self.stages > 0
+        return np.where(ckd, prevalence * self.weights / self.weights[ckd].sum(), (1.0 - prevalence) * self.weights / self.weights[~ckd].sum())
+
+    def sample(self, components: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        noise = rng.standard_normal((len(components), self.means.shape[1]))
+        return self.means[components] + np.einsum("nij,nj->ni", self._cholesky[components], noise)
+
+    def posterior(self, labs: np.ndarray, prevalence: Optional[float] = None) -> np.ndarray:
+        """P(CKD) of the mixture at each row of (log creatinine, log urea, blood pressure)"""
+        rows, cols = self._pairs
+        features = np.hstack([labs[:, rows] * labs[:, cols], labs, np.ones((len(labs), 1))])
+        mahalanobis = features @ self._mahalanobis
+        log_joint = np.log(self.component_weights(prevalence)) + self._log_norm - 0.5 * mahalanobis
+        log_joint -= log_joint.max(axis=1, keepdims=True)
+        joint = np.exp(log_joint)
+        return joint[:, self.stages > 0].sum(axis=1) / joint.sum(axis=1)
+
+def _normal(rng: np.random.Generator, ckd: np.ndarray, name: str) -> np.ndarray:
+    (mean0, sd0), (mean1, sd1) = CLASS_PRIORS[name]
+    return np.where(ckd, mean1, mean0) + np.where(ckd, sd1, sd0) * rng.standard_normal(len(ckd))
+
+def _levels(rng: np.random.Generator, ckd: np.ndarray, name: str) -> np.ndarray:
+    """Draw level indices from the class's cumulative probabilities"""
+    cumulative = np.cumsum(np.array(CLASS_PRIORS[name]), axis=1)
+    cumulative[:, -1] = 1.0
+    u = rng.random(len(ckd))
+    return np.where(ckd, np.searchsorted(cumulative[1], u, side="right"), np.searchsorted(cumulative[0], u, side="right"))
+
+def _flag(rng: np.random.Generator, ckd: np.ndarray, name: str) -> np.ndarray:
+    p0, p1 = CLASS_PRIORS[name]
+    return rng.random(len(ckd)) < np.where(ckd, p1, p0)
+
+def generate_block(model: CohortModel, n: int, rng: np.random.Generator, prevalence: Optional[float] = None) -> Cohort:
+    """n patients with PatientData fields plus stage, true_prediction and risk factor flags"""
+    components = rng.choice(len(model.weights), size=n, p=model.component_weights(prevalence))
+    stages = model.stages[components]
+    ckd = stages > 0
+    labs = model.sample(components, rng)
+    hemoglobin = _normal(rng, ckd, "hemoglobin")
+    flags = {name: _flag(rng, ckd, name) for name in FLAG_VALUES if name != "anemia"}
+    flags["anemia"] = hemoglobin < 11.0
+
+    values: Dict[str, np.ndarray] = {
+        "age": _normal(rng, ckd, "age"),
+        "blood_pressure": labs[:, 2],
+        "specific_gravity": SPECIFIC_GRAVITY_LEVELS[_levels(rng, ckd, "specific_gravity")],
+        "albumin": _levels(rng, ckd, "albumin"),
+        "sugar": _levels(rng, ckd, "sugar"),
+        "blood_glucose_random": _normal(rng, ckd, "blood_glucose_random"),
+        "blood_urea": np.exp(labs[:, 1]),
+        "serum_creatinine": np.exp(labs[:, 0]),
+        "sodium": _normal(rng, ckd, "sodium"),
+        "potassium": _normal(rng, ckd, "potassium"),
+        "hemoglobin": hemoglobin,
+        # Hematocrit and red cell count track hemoglobin
+        "packed_cell_volume": 3.0 * hemoglobin + 2.0 * rng.standard_normal(n),
+        "white_blood_cell_count": _normal(rng, ckd, "white_blood_cell_count"),
+        "red_blood_cell_count": hemoglobin / 2.9 + 0.3 * rng.standard_normal(n),
+    }
+    cohort: Cohort = {}
+    for name in PATIENT_FIELDS:
+        if name in FLAG_VALUES:
+            cohort[name] = np.where(flags[name], FLAG_VALUES[name][1], FLAG_VALUES[name][0])
+            continue
+        column = values[name]
+        if name in LIMITS:
+            column = np.clip(column, *LIMITS[name])
+        cohort[name] = np.rint(column).astype(np.int64) if name in INTEGER_FIELDS else np.round(column, 2)
+    cohort["ckd_stage"] = stages
+    cohort["true_prediction"] = np.round(model.posterior(labs, prevalence), 4)
+    cohort["risk_factors"] = risk_factor_matrix(cohort)
+    return cohort
+
+def risk_factor_matrix(cohort: Cohort) -> np.ndarray:
+    """(n, len(RISK_FACTORS)) flags of the risk factors present in each record"""
+    return np.column_stack([
+        (cohort["hypertension"] == "yes") | (cohort["blood_pressure"] >= 140),
+        cohort["diabetes_mellitus"] == "yes",
+        cohort["age"] >= 60,
+        cohort["anemia"] == "yes",
+        cohort["albumin"] >= 1,
+        cohort["serum_creatinine"] > 1.3,
+        cohort["blood_urea"] > 50,
+        cohort["coronary_artery_disease"] == "yes",
+        cohort["pedal_edema"] == "yes",
+        cohort["appetite"] == "poor",
+    ])
+
+def iter_cohort(n: int, seed: int = 0, prevalence: Optional[float] = None, model: Optional[CohortModel] = None) -> Iterator[Cohort]:
+    """Yield the cohort in blocks of at most BLOCK_SIZE rows"""
+    model = model or CohortModel.fit()
+    for block, start in enumerate(range(0, n, BLOCK_SIZE)):
+        rng = np.random.default_rng([seed, block])
+        cohort = generate_block(model, BLOCK_SIZE, rng, prevalence)
+        size = min(BLOCK_SIZE, n - start)
+        yield {name: column[:size] for name, column in cohort.items()}
+
+def generate_cohort(n: int, seed: int = 0, prevalence: Optional[float] = None) -> Cohort:
+    """The whole cohort as columns"""
+    blocks = list(iter_cohort(n, seed, prevalence))
+    if not blocks:
+        return generate_block(CohortModel.fit(), 0, np.random.default_rng(seed), prevalence)
+    return {name: np.concatenate([b[name] for b in blocks]) for name in blocks[0]}
+
+def _factor_codes(matrix: np.ndarray) -> Tuple[np.ndarray, Dict[int, List[str]]]:
+    """Each row's flags as one integer, and the factor list of every code that occurs"""
+    codes = matrix.astype(np.int64) @ (1 << np.arange(matrix.shape[1], dtype=np.int64))
+    table = {code: [name for bit, name in enumerate(RISK_FACTORS) if code >> bit & 1] for code in np.unique(codes).tolist()}
+    return codes, table
+
+def _factor_lists(matrix: np.ndarray) -> List[List[str]]:
+    codes, table = _factor_codes(matrix)
+    return [list(table[code]) for code in codes.tolist()]
+
+def simulate_predictions(cohort: Cohort, rng: np.random.Generator, noise: float = 0.08, recall: float = 0.85) -> Dict[str, Any]:
+    """Imperfect model answers for evaluator benchmarks: noisy scores, some risk factors missed"""
+    n = len(cohort["true_prediction"])
+    prediction = np.clip(cohort["true_prediction"] + noise * rng.standard_normal(n), 0.0, 1.0)
+    return {
+        "prediction": np.round(prediction, 4),
+        "confidence": np.round(0.5 + np.abs(prediction - 0.5), 4),
+        "risk_factors": cohort["risk_factors"] & (rng.random(cohort["risk_factors"].shape) < recall),
+        "response_time": np.round(rng.lognormal(np.log(0.5), 0.3, n), 4),
+    }
+
+def _explanation(prediction: float, factors: List[str]) -> str:
+    level = "a high" if prediction >= 0.5 else "a low"
+    detail = f"Key risk factors include {', '.join(factors)}." if factors else "No major risk factors are present."
+    return f"Based on the provided data, there is {level} risk of CKD with a probability of {prediction:.0%}. {detail}"
+
+def cohort_records(cohort: Cohort, start: int = 0, predictions: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Cases in the live_evaluation JSONL layout; with predictions, also the
+    "prediction" block eval_driver scores
+    """
+    columns = [cohort[name].tolist() for name in PATIENT_FIELDS]
+    truth = cohort["true_prediction"].tolist()
+    stages = cohort["ckd_stage"].tolist()
+    factors = _factor_lists(cohort["risk_factors"])
+    if predictions is not None:
+        predicted = zip(
+            predictions["prediction"].tolist(), predictions["confidence"].tolist(),
+            _factor_lists(predictions["risk_factors"]), predictions["response_time"].tolist()
+        )
+    for i, values in enumerate(zip(*columns)):
+        case: Dict[str, Any] = {
+            "id": f"synthetic_{start + i:08d}",
+            "data": dict(zip(PATIENT_FIELDS, values)),
+            "ground_truth": {"prediction": truth[i], "risk_factors": factors[i], "ckd_stage": stages[i]},
+        }
+        if predictions is not None:
+            prediction, confidence, risk_factors, response_time = next(predicted)
+            case["prediction"] = {
+                "prediction": prediction,
+                "confidence": confidence,
+                "explanation": _explanation(prediction, risk_factors),
+                "risk_factors": risk_factors,
+                "response_time": response_time,
+            }
+        yield case
+
+def _line_rows(cohort: Cohort, start: int, factor_text: Callable[[List[str]], str]) -> Iterator[tuple]:
+    """(row number, PatientData values..., true_prediction, risk factor text, stage) per row"""
+    codes, table = _factor_codes(cohort["risk_factors"])
+    factors = {code: factor_text(names) for code, names in table.items()}
+    columns = [cohort[name].tolist() for name in PATIENT_FIELDS]
+    return zip(range(start, start + len(codes)), *columns, cohort["true_prediction"].tolist(),
+               [factors[code] for code in codes.tolist()], cohort["ckd_stage"].tolist())
+
+# Shard lines are formatted from templates instead of json.dumps / csv.writer;
+# the field values never need escaping or quoting
+def jsonl_lines(cohort: Cohort, start: int = 0) -> Iterator[str]:
+    """cohort_records (without predictions) as JSONL lines"""
+    fields = ", ".join(f'"{name}": "%s"' if name in FLAG_VALUES else f'"{name}": %r' for name in PATIENT_FIELDS)
+    template = (
+        '{"id": "synthetic_%08d", "data": {' + fields + '}, '
+        '"ground_truth": {"prediction": %r, "risk_factors": %s, "ckd_stage": %d}}\n'
+    )
+    for row in _line_rows(cohort, start, json.dumps):
+        yield template % row
+
+CSV_HEADER = ",".join(("id",) + PATIENT_FIELDS + ("true_prediction", "true_risk_factors")) + "\n"
+
+def csv_lines(cohort: Cohort, start: int = 0) -> Iterator[str]:
+    """Rows in the live_evaluation CSV layout, without the header"""
+    template = "synthetic_%08d," + ",".join("%s" if name in FLAG_VALUES else "%r" for name in PATIENT_FIELDS) + ",%r,%s\n"
+    for row in _line_rows(cohort, start, ";".join):
+        yield template % row[:-1]
+
+def cohort_frame(cohort: Cohort, start: int = 0) -> "pd.DataFrame":
+    """The csv_lines columns as a DataFrame (for Parquet shards)"""
+    import pandas as pd
+
+    frame = pd.DataFrame({name: cohort[name] for name in PATIENT_FIELDS})
+    frame.insert(0, "id", [f"synthetic_{i:08d}" for i in range(start, start + len(frame))])
+    frame["true_prediction"] = cohort["true_prediction"]
+    frame["true_risk_factors"] = [";".join(f) for f in _factor_lists(cohort["risk_factors"])]
+    return frame
+
+class _ShardWriter:
+    """Rolls over to a new file every shard_size rows"""
+
+    def __init__(self, out_dir: str, fmt: str, shard_size: int):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format: {fmt!r}")
+        if fmt == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise RuntimeError("Parquet shards need the pyarrow package") from None
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir, self.fmt, self.shard_size = out_dir, fmt, shard_size
+        self.paths: List[str] = []
+        self._file: Any = None
+        self._parquet: Any = None
+        self._rows = 0
+
+    def _open(self):
+        self.close()
+        path = os.path.join(self.out_dir, f"cohort-{len(self.paths):05d}.{self.fmt}")
+        self.paths.append(path)
+        self._rows = 0
+        if self.fmt != "parquet":
+            self._file = open(path, "w", newline="")
+
+    def write(self, cohort: Cohort, start: int):
+        n = len(cohort["true_prediction"])
+        offset = 0
+        while offset < n:
+            if not self.paths or self._rows >= self.shard_size:
+                self._open()
+            take = min(n - offset, self.shard_size - self._rows)
+            part = {name: column[offset:offset + take] for name, column in cohort.items()}
+            self._write_part(part, start + offset)
+            self._rows += take
+            offset += take
+
+    def _write_part(self, part: Cohort, start: int):
+        if self.fmt == "jsonl":
+            self._file.writelines(jsonl_lines(part, start))
+        elif self.fmt == "csv":
+            if self._rows == 0:
+                self._file.write(CSV_HEADER)
+            self._file.writelines(csv_lines(part, start))
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(cohort_frame(part, start), preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.paths[-1], table.schema)
+            self._parquet.write_table(table)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+
+def write_shards(out_dir: str, n: int, seed: int = 0, fmt: str = "jsonl", shard_size: int = 100_000,
+                 prevalence: Optional[float] = None) -> List[str]:
+    """Stream a cohort to JSONL, CSV or Parquet shards; returns the shard paths"""
+    writer = _ShardWriter(out_dir, fmt, shard_size)
+    start = 0
+    try:
+        for cohort in iter_cohort(n, seed, prevalence):
+            writer.write(cohort, start)
+            start += len(cohort["true_prediction"])
+    finally:
+        writer.close()
+    return writer.paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic CKD patient cohort")
+    parser.add_argument("-n", type=int, default=100_000, help="Patients")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prevalence", type=float, default=None, help="CKD prevalence (default: the dataset's)")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--shard-size", type=int, default=100_000, help="Rows per file")
+    parser.add_argument("--out", default=os.path.join("reports", "cohort"))
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        paths = write_shards(args.out, args.n, args.seed, args.format, args.shard_size, args.prevalence)
+    except RuntimeError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {args.n} patients to {len(paths)} {args.format} shards in {args.out} ({args.n / elapsed:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
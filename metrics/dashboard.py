@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Static evaluation dashboard whose size does not grow with the run.
+
+Everything on the page is aggregated in NumPy before the HTML is written:
+per-metric histograms (binned like the results store, for this run and for
+every stored run), quantiles, and the worst cases. Charts are inline SVG,
+so the page needs no charting library. The per-case rows go to a sidecar
+directory of small script pages, and the browser loads a page only when
+it is opened. Script pages are used instead of one data file because a
+report opened from disk (file://) cannot fetch() files next to it.
+
+    python metrics/dashboard.py                 # rebuild for the latest stored run
+    python metrics/dashboard.py --run-id <id>
+"""
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+import argparse
+import glob
+import html
+import json
+import os
+
+import numpy as np
+
+from results_store import HISTOGRAM_EDGES, METRIC_COLUMNS, ResultsStore, bin_counts
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+PAGE_SIZE = 1000
+WORST_CASES = 20
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+REPORT_PATH = os.path.join("reports", "llm_evaluation_report.html")
+
+LABELS = {
+    "prediction_accuracy": "Prediction Accuracy",
+    "confidence_score": "Confidence Score",
+    "explanation_quality": "Explanation Quality",
+    "response_time": "Response Time (s)",
+    "risk_factors_accuracy": "Risk Factors Accuracy",
+}
+
+def histogram_quantiles(counts: Sequence[int], edges: Sequence[float], quantiles: Sequence[float]) -> List[Optional[float]]:
+    """Quantiles of binned data, interpolating linearly inside a bin"""
+    counts = np.asarray(counts, dtype=np.float64)
+    total = counts.sum()
+    if not total:
+        return [None] * len(quantiles)
+    lows = np.concatenate([[0.0], edges[:-1]])
+    cumulative = np.cumsum(counts)
+    result: List[Optional[float]] = []
+    for q in quantiles:
+        target = q * total
+        i = min(int(np.searchsorted(cumulative, target, side="left")), len(counts) - 1)
+        before = cumulative[i - 1] if i else 0.0
+        fraction = (target - before) / counts[i] if counts[i] else 0.0
+        result.append(float(lows[i] + fraction * (edges[i] - lows[i])))
+    return result
+
+def worst_cases(values: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the n lowest values, lowest first; NaN is never picked"""
+    keyed = np.where(np.isnan(values), np.inf, values)
+    n = min(n, int(np.isfinite(keyed).sum()))
+    if not n:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(keyed, n - 1)[:n]
+    return candidates[np.lexsort((candidates, keyed[candidates]))]
+
+def summarize(ids: np.ndarray, columns: Dict[str, np.ndarray], store: Optional[ResultsStore] = None,
+              worst: int = WORST_CASES) -> Dict[str, Any]:
+    """Everything the page shows, independent of the number of cases"""
+    metrics = {}
+    for name in METRIC_COLUMNS:
+        values = columns[name]
+        finite = values[~np.isnan(values)]
+        edges = HISTOGRAM_EDGES[name]
+        history = [b["count"] for b in store.histogram(name)] if store is not None else None
+        metrics[name] = {
+            "mean": float(finite.mean()) if finite.size else None,
+            "quantiles": np.quantile(finite, QUANTILES).tolist() if finite.size else [None] * len(QUANTILES),
+            "bins": bin_counts(name, values).tolist(),
+            "history_bins": history,
+            "history_quantiles": histogram_quantiles(history, edges, QUANTILES) if history else None,
+        }
+    order = worst_cases(columns["prediction_accuracy"], worst)
+    return {
+        "cases": len(ids),
+        "metrics": metrics,
+        "worst": [
+            {"test_case_id": str(ids[i]), **{name: float(columns[name][i]) for name in METRIC_COLUMNS}}
+            for i in order.tolist()
+        ],
+    }
+
+def write_pages(data_dir: str, ids: np.ndarray, columns: Dict[str, np.ndarray], page_size: int = PAGE_SIZE) -> int:
+    """Write the rows as script pages (window.evalPage(i, {...})); returns the page count"""
+    os.makedirs(data_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(data_dir, "page-*.js")):
+        os.remove(stale)
+    pages = 0
+    for pages, start in enumerate(range(0, len(ids), page_size), start=1):
+        stop = start + page_size
+        page: Dict[str, Any] = {"test_case_id": [str(i) for i in ids[start:stop].tolist()]}
+        for name in METRIC_COLUMNS:
+            # 4 decimals is all the table shows; NaN is not valid JSON
+            values = np.round(columns[name][start:stop].astype(np.float64), 4)
+            page[name] = [None if v != v else v for v in values.tolist()]
+        with open(os.path.join(data_dir, f"page-{pages - 1:05d}.js"), "w") as f:
+            f.write(f"window.evalPage({pages - 1},{json.dumps(page, separators=(',', ':'))});\n")
+    return pages
+
+def _fmt(value: Optional[float]) -> str:
+    return "–" if value is None else f"{value:.3f}"
+
+def _bar_chart(counts: List[int], history: Optional[List[int]], edges: List[float]) -> str:
+    """SVG bars of this run's bin shares, with every stored run's shares as ticks"""
+    width, height, pad = 360, 140, 18
+    step = width / len(counts)
+    shares = np.asarray(counts, dtype=np.float64) / max(sum(counts), 1)
+    past = np.asarray(history, dtype=np.float64) / max(sum(history), 1) if history else None
+    top = max(float(shares.max()), float(past.max()) if past is not None else 0.0) or 1.0
+    parts = [f'<svg viewBox="0 0 {width} {height + pad}" role="img">']
+    for i, share in enumerate(shares.tolist()):
+        low = edges[i - 1] if i else 0.0
+        bar = share / top * height
+        parts.append(
+            f'<rect class="run" x="{i * step + 1:.1f}" y="{height - bar:.1f}" width="{step - 2:.1f}" height="{bar:.1f}">'
+            f'<title>{low:g}-{edges[i]:g}: {counts[i]} cases ({share:.1%})</title></rect>'
+        )
+        if past is not None:
+            y = height - past[i] / top * height
+            parts.append(f'<line class="history" x1="{i * step + 1:.1f}" x2="{(i + 1) * step - 1:.1f}" y1="{y:.1f}" y2="{y:.1f}"/>')
+    parts.append(f'<text x="0" y="{height + pad - 4}">0</text>')
+    parts.append(f'<text x="{width}" y="{height + pad - 4}" text-anchor="end">{edges[-1]:g}</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+_STYLE = """
+body{font-family:system-ui,sans-serif;margin:2rem;color:#222}
+.charts{display:grid;grid-template-columns:repeat(auto-fill,minmax(380px,1fr));gap:1.5rem}
+figure{margin:0}figcaption{font-weight:600;margin-bottom:.3rem}
+svg{width:100%;height:auto}rect.run{fill:#4c78a8}line.history{stroke:#e45756;stroke-width:2}
+svg text{font-size:11px;fill:#555}
+table{border-collapse:collapse;margin:.5rem 0 1.5rem;font-size:.9rem}
+th,td{padding:.25rem .6rem;border-bottom:1px solid #ddd;text-align:right}th:first-child,td:first-child{text-align:left}
+.meta{color:#555}.legend span{margin-right:1rem}
+"""
+
+_PAGER_SCRIPT = """
+const columns = %(columns)s, pages = %(pages)d, dataDir = %(data_dir)s, loaded = {};
+let current = 0;
+window.evalPage = (i, page) => { loaded[i] = page; if (i === current) render(i); };
+function show(i) {
+  current = Math.max(0, Math.min(pages - 1, i));
+  document.getElementById("page").textContent = pages ? `${current + 1} / ${pages}` : "0 / 0";
+  if (loaded[current]) return render(current);
+  const script = document.createElement("script");
+  script.src = `${dataDir}/page-${String(current).padStart(5, "0")}.js`;
+  document.head.appendChild(script);
+}
+function render(i) {
+  const page = loaded[i], body = document.querySelector("#rows tbody");
+  body.replaceChildren(...page.test_case_id.map((id, r) => {
+    const tr = document.createElement("tr");
+    for (const value of [id, ...columns.map(c => page[c][r])]) {
+      const td = document.createElement("td");
+      td.textContent = typeof value === "number" ? value.toFixed(3) : (value ?? "–");
+      tr.appendChild(td);
+    }
+    return tr;
+  }));
+}
+document.getElementById("prev").onclick = () => show(current - 1);
+document.getElementById("next").onclick = () => show(current + 1);
+document.getElementById("rows-section").addEventListener("toggle", e => { if (e.target.open && pages) show(current); });
+"""
+
+def render_html(summary: Dict[str, Any], run: Dict[str, Any], pages: int, data_dir: str) -> str:
+    metrics = summary["metrics"]
+    header = "".join(f"<th>{LABELS[name]}</th>" for name in METRIC_COLUMNS)
+    quantile_head = "".join(f"<th>p{round(q * 100)}</th>" for q in QUANTILES)
+    quantile_rows = []
+    for name in METRIC_COLUMNS:
+        m = metrics[name]
+        quantile_rows.append(
+            f"<tr><td>{LABELS[name]}</td><td>{_fmt(m['mean'])}</td>"
+            + "".join(f"<td>{_fmt(v)}</td>" for v in m["quantiles"])
+            + (f"<td>{_fmt(m['history_quantiles'][2])}</td><td>{_fmt(m['history_quantiles'][4])}</td>" if m["history_quantiles"] else "<td>–</td><td>–</td>")
+            + "</tr>"
+        )
+    charts = "".join(
+        f"<figure><figcaption>{LABELS[name]}</figcaption>"
+        f"{_bar_chart(metrics[name]['bins'], metrics[name]['history_bins'], HISTOGRAM_EDGES[name])}</figure>"
+        for name in METRIC_COLUMNS
+    )
+    worst_rows = "".join(
+        f"<tr><td>{html.escape(case['test_case_id'])}</td>" + "".join(f"<td>{_fmt(case[name])}</td>" for name in METRIC_COLUMNS) + "</tr>"
+        for case in summary["worst"]
+    )
+    script = _PAGER_SCRIPT % {"columns": json.dumps(METRIC_COLUMNS), "pages": pages, "data_dir": json.dumps(data_dir)}
+    return f"""<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>LLM Evaluation Results</title><style>{_STYLE}</style></head>
+<body>
+<h1>LLM Evaluation Results</h1>
+<p class="meta">Run {html.escape(str(run['run_id']))}: {summary['cases']} cases. History: {run['runs']} runs, {run['stored_cases']} cases.</p>
+<p class="legend"><span style="color:#4c78a8">&#9632; this run</span><span style="color:#e45756">&#8212; all runs</span></p>
+<section class="charts">{charts}</section>
+<h2>Quantiles</h2>
+<table><thead><tr><th>Metric</th><th>Mean</th>{quantile_head}<th>p50 (all runs)</th><th>p95 (all runs)</th></tr></thead>
+<tbody>{''.join(quantile_rows)}</tbody></table>
+<h2>Worst {len(summary['worst'])} cases by prediction accuracy</h2>
+<table><thead><tr><th>Test case</th>{header}</tr></thead><tbody>{worst_rows}</tbody></table>
+<details id="rows-section"><summary>All {summary['cases']} cases ({pages} pages, loaded on demand)</summary>
+<p><button id="prev">&larr;</button> <span id="page"></span> <button id="next">&rarr;</button></p>
+<table id="rows"><thead><tr><th>Test case</th>{header}</tr></thead><tbody></tbody></table>
+</details>
+<script>{script}</script>
+</body></html>
+"""
+
+def build_dashboard(ids: np.ndarray, columns: Dict[str, np.ndarray], run_id: str, store: Optional[ResultsStore] = None,
+                    path: str = REPORT_PATH, page_size: int = PAGE_SIZE, worst: int = WORST_CASES) -> str:
+    """Write the dashboard and its row pages; returns the HTML path"""
+    summary = summarize(ids, columns, store, worst)
+    base = os.path.splitext(os.path.basename(path))[0] + "_data"
+    pages = write_pages(os.path.join(os.path.dirname(path), base), ids, columns, page_size)
+    runs = store.runs() if store is not None else []
+    run = {"run_id": run_id, "runs": len(runs), "stored_cases": sum(r["cases"] for r in runs)}
+    with open(path, "w") as f:
+        f.write(render_html(summary, run, pages, base))
+    return path
+
+def frame_columns(results_df: "pd.DataFrame") -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """(ids, metric columns) of an evaluation DataFrame"""
+    ids = results_df["test_case_id"].astype(str).to_numpy()
+    return ids, {name: results_df[name].to_numpy(dtype=np.float64) for name in METRIC_COLUMNS}
+
+def run_columns(store: ResultsStore, run_id: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """(ids, metric columns) of a stored run"""
+    rows = store.conn.execute(
+        f"SELECT test_case_id, {', '.join(METRIC_COLUMNS)} FROM results WHERE run_id = ? ORDER BY test_case_id", (run_id,)
+    ).fetchall()
+    ids = np.array([row[0] for row in rows], dtype=object)
+    values = np.array([row[1:] for row in rows], dtype=np.float64).reshape(len(rows), len(METRIC_COLUMNS))
+    return ids, {name: values[:, i] for i, name in enumerate(METRIC_COLUMNS)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the evaluation dashboard from the results store")
+    parser.add_argument("--store", default=os.path.join("reports", "llm_results.sqlite3"))
+    parser.add_argument("--run-id", help="Run to show (default: the latest)")
+    parser.add_argument("--output", default=REPORT_PATH)
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    args = parser.parse_args()
+
+    store = ResultsStore(args.store)
+    runs = store.runs()
+    if not runs:
+        parser.error(f"No runs in {args.store}")
+    run_id = args.run_id or runs[-1]["run_id"]
+    ids, columns = run_columns(store, run_id)
+    path = build_dashboard(ids, columns, run_id, store, args.output, args.page_size)
+    print(f"Dashboard for run {run_id} ({len(ids)} cases) written to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,97 @@
 # eval_driver.py placeholder content
 
-import pandas as pd
-import numpy as np
-from typing import Dict, List, Any
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Any, Optional
 import json
 from datetime import datetime
+from itertools import islice
 import os
 
+from results_store import METRIC_COLUMNS, ResultsStore, new_run_id
+
+try:
+    from backend import tracing
+except ImportError:
+    # Run from metrics/ without the repository root on sys.path: no tracing
+    tracing = None
+
+def _span(name: str, **attributes: Any):
+    """A tracing span for an evaluation stage, or a no-op"""
+    if tracing is None:
+        return nullcontext()
+    return tracing.span(name, attributes=attributes)
+
+if TYPE_CHECKING:
+    # numpy and pandas are imported where the DataFrame paths run, so
+    # scoring single predictions and --help stay fast
+    import numpy as np
+    import pandas as pd
+    from semantic_scorer import SemanticScorer
+
+REQUIRED_EXPLANATION_TERMS = ("risk", "factors", "probability", "based on")
+
+FRAME_COLUMNS = [
+    "test_case_id",
+    "prediction",
+    "confidence",
+    "explanation",
+    "response_time",
+    "risk_factors",
+    "true_prediction",
+    "true_risk_factors"
+]
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _result_rows(df: "pd.DataFrame", chunk_size: int = 10_000) -> Iterator[Dict[str, Any]]:
+    """Rows for the results store, converted a slice at a time"""
+    columns = ["test_case_id"] + METRIC_COLUMNS
+    for start in range(0, len(df), chunk_size):
+        part = df.iloc[start:start + chunk_size]
+        for row in zip(*(part[name].tolist() for name in columns)):
+            yield dict(zip(columns, row))
+
+def cases_to_frame(test_cases: List[Dict[str, Any]]) -> "pd.DataFrame":
+    """Flatten nested test cases into the columnar layout used by evaluate_frame"""
+    import pandas as pd
+
+    columns: Dict[str, list] = {name: [] for name in FRAME_COLUMNS}
+    for case in test_cases:
+        prediction, ground_truth = case["prediction"], case["ground_truth"]
+        columns["test_case_id"].append(case["id"])
+        columns["prediction"].append(prediction.get("prediction", 0))
+        columns["confidence"].append(prediction.get("confidence", 0))
+        columns["explanation"].append(prediction.get("explanation", ""))
+        columns["response_time"].append(prediction.get("response_time", 0))
+        columns["risk_factors"].append(prediction.get("risk_factors", []))
+        columns["true_prediction"].append(ground_truth.get("prediction", 0))
+        columns["true_risk_factors"].append(ground_truth.get("risk_factors", []))
+    return pd.DataFrame(columns, columns=FRAME_COLUMNS)
+
 class LLMEvaluator:
-    def __init__(self, use_dummy: bool = True):
+    def __init__(self, use_dummy: bool = True, scorer: Optional["SemanticScorer"] = None):
         self.use_dummy = use_dummy
+        # None keeps the exact substring/equality scoring
+        self.scorer = scorer
         self.results_dir = "reports"
         os.makedirs(self.results_dir, exist_ok=True)
-        
+        self._results_store: Optional[ResultsStore] = None
+        self.last_run_id: Optional[str] = None
+
+    @property
+    def results_store(self) -> ResultsStore:
+        """Append-only history of every run saved under results_dir"""
+        path = os.path.join(self.results_dir, "llm_results.sqlite3")
+        if self._results_store is None or self._results_store.path != path:
+            self._results_store = ResultsStore(path)
+        return self._results_store
+
     def evaluate_prediction(self, prediction: Dict[str, Any], ground_truth: Dict[str, Any]) -> Dict[str, Any]:
         """Evaluate a single prediction against ground truth"""
         metrics = {
@@ -35,87 +114,283 @@ class LLMEvaluator:
     
     def _evaluate_explanation(self, explanation: str) -> float:
         """Evaluate explanation quality"""
-        required_terms = ["risk", "factors", "probability", "based on"]
+        if self.scorer is not None:
+            return float(self.scorer.score_explanations([explanation])[0])
         score = 0
-        for term in required_terms:
+        for term in REQUIRED_EXPLANATION_TERMS:
             if term in explanation.lower():
                 score += 0.25
         return score
     
     def _evaluate_risk_factors(self, predicted: List[str], actual: List[str]) -> float:
         """Evaluate risk factors accuracy"""
+        if self.scorer is not None:
+            return float(self.scorer.score_risk_factors([predicted], [actual])[0])
         if not actual:
             return 1.0 if not predicted else 0.0
         correct = sum(1 for factor in predicted if factor in actual)
         return correct / len(actual)
     
-    def run_evaluation_matrix(self, test_cases: List[Dict[str, Any]]) -> pd.DataFrame:
-        """Run evaluation matrix on multiple test cases"""
-        results = []
-        
-        for case in test_cases:
-            metrics = self.evaluate_prediction(case["prediction"], case["ground_truth"])
-            results.append({
-                "test_case_id": case["id"],
-                "timestamp": datetime.now().isoformat(),
-                **metrics
-            })
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(results)
-        
+    def evaluate_frame(self, frame: Any) -> "pd.DataFrame":
+        """
+        Compute every per-case metric with vectorized operations.
+        Accepts a DataFrame (or anything with to_pandas(), such as an Arrow
+        table) laid out like cases_to_frame; results match evaluate_prediction.
+        """
+        import numpy as np
+        import pandas as pd
+
+        if not isinstance(frame, pd.DataFrame):
+            frame = frame.to_pandas()
+        n = len(frame)
+
+        prediction = frame["prediction"].to_numpy(dtype=np.float64)
+        true_prediction = frame["true_prediction"].to_numpy(dtype=np.float64)
+
+        if self.scorer is not None:
+            explanation_quality = self.scorer.score_explanations(frame["explanation"].tolist())
+            risk_factors_accuracy = self.scorer.score_risk_factors(
+                frame["risk_factors"].tolist(), frame["true_risk_factors"].tolist()
+            )
+        else:
+            # Lowercase once, then plain substring checks per term
+            explanation = frame["explanation"].str.lower()
+            term_hits = np.zeros(n, dtype=np.int64)
+            for term in REQUIRED_EXPLANATION_TERMS:
+                term_hits += explanation.str.contains(term, regex=False).to_numpy(dtype=np.int64)
+            explanation_quality = term_hits * 0.25
+            risk_factors_accuracy = self._risk_factors_accuracy_vectorized(
+                frame["risk_factors"], frame["true_risk_factors"]
+            )
+
+        return pd.DataFrame({
+            "test_case_id": frame["test_case_id"].to_numpy(),
+            "prediction_accuracy": 1 - np.abs(prediction - true_prediction),
+            "confidence_score": frame["confidence"].to_numpy(dtype=np.float64),
+            "explanation_quality": explanation_quality,
+            "response_time": frame["response_time"].to_numpy(dtype=np.float64),
+            "risk_factors_accuracy": risk_factors_accuracy
+        })
+
+    @staticmethod
+    def _risk_factors_accuracy_vectorized(predicted: "pd.Series", actual: "pd.Series") -> "np.ndarray":
+        """Set-based overlap: each predicted factor counts if it is in that row's actual set"""
+        import numpy as np
+        import pandas as pd
+
+        n = len(predicted)
+        rows = np.arange(n)
+        predicted_len = predicted.str.len().fillna(0).to_numpy(dtype=np.int64)
+        actual_len = actual.str.len().fillna(0).to_numpy(dtype=np.int64)
+
+        exploded_predicted = pd.DataFrame({"row": rows, "factor": predicted.to_numpy()}).explode("factor").dropna()
+        exploded_actual = pd.DataFrame({"row": rows, "factor": actual.to_numpy()}).explode("factor").dropna().drop_duplicates()
+
+        if len(exploded_predicted) and len(exploded_actual):
+            hit = pd.MultiIndex.from_frame(exploded_predicted).isin(pd.MultiIndex.from_frame(exploded_actual))
+            correct = np.bincount(exploded_predicted["row"].to_numpy(dtype=np.int64)[hit], minlength=n)
+        else:
+            correct = np.zeros(n, dtype=np.int64)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            accuracy = correct / actual_len
+        empty_actual = actual_len == 0
+        accuracy[empty_actual] = np.where(predicted_len[empty_actual] == 0, 1.0, 0.0)
+        return accuracy
+
+    def run_evaluation_matrix(self, test_cases: List[Dict[str, Any]], chunk_size: int = 10_000) -> "pd.DataFrame":
+        """
+        Run evaluation matrix on multiple test cases. Cases are flattened and
+        scored chunk by chunk straight into preallocated typed columns.
+        """
+        from result_columns import ResultColumns
+
+        with _span("evaluation.matrix", cases=len(test_cases)):
+            columns = ResultColumns(len(test_cases), datetime.now().isoformat())
+            for chunk in _chunks(test_cases, chunk_size):
+                columns.extend(self._score_chunk(chunk))
+            return self._finish_evaluation(columns.to_frame())
+
+    def _score_chunk(self, chunk: List[Dict[str, Any]]) -> "pd.DataFrame":
+        with _span("evaluation.flatten", cases=len(chunk)):
+            frame = cases_to_frame(chunk)
+        with _span("evaluation.score", cases=len(chunk)):
+            return self.evaluate_frame(frame)
+
+    def run_evaluation_streaming(
+        self,
+        test_cases: Iterable[Dict[str, Any]],
+        chunk_size: int = 10_000,
+        memory_limit_mb: float = 256.0
+    ) -> Dict[str, Any]:
+        """
+        Evaluate any number of cases (a generator is fine) with bounded memory.
+        Results are spilled to llm_evaluation.csv and the results store each
+        time the typed buffer reaches memory_limit_mb. Returns the run summary.
+        """
+        from result_columns import ROW_BYTES, ResultColumns
+
+        run_id = new_run_id()
+        capacity = max(chunk_size, int(memory_limit_mb * 2 ** 20) // ROW_BYTES)
+        columns = ResultColumns(capacity, datetime.now().isoformat())
+        totals = dict.fromkeys(METRIC_COLUMNS, 0.0)
+        count = spills = 0
+
+        with _span("evaluation.streaming", run_id=run_id) as run_span:
+            for chunk in _chunks(test_cases, chunk_size):
+                metrics = self._score_chunk(chunk)
+                if columns.size + len(metrics) > capacity:
+                    self._write_results(columns.to_frame(), run_id, append=spills > 0)
+                    spills += 1
+                    columns.clear()
+                columns.extend(metrics)
+                for name in METRIC_COLUMNS:
+                    totals[name] += float(metrics[name].sum())
+                count += len(metrics)
+            if columns.size or not spills:
+                self._write_results(columns.to_frame(), run_id, append=spills > 0)
+
+            summary = {"run_id": run_id}
+            for name in METRIC_COLUMNS:
+                summary[f"mean_{name}"] = totals[name] / count if count else None
+            summary["total_test_cases"] = count
+            self._write_summary(summary)
+            if run_span is not None:
+                run_span.set_attribute("cases", count)
+        self.last_run_id = run_id
+        return summary
+
+    def run_evaluation_matrix_per_case(self, test_cases: List[Dict[str, Any]]) -> "pd.DataFrame":
+        """Reference per-case implementation of run_evaluation_matrix"""
+        import pandas as pd
+
+        with _span("evaluation.per_case", cases=len(test_cases)):
+            results = []
+
+            for case in test_cases:
+                metrics = self.evaluate_prediction(case["prediction"], case["ground_truth"])
+                results.append({
+                    "test_case_id": case["id"],
+                    "timestamp": datetime.now().isoformat(),
+                    **metrics
+                })
+
+            # Convert to DataFrame
+            return self._finish_evaluation(pd.DataFrame(results))
+
+    def _finish_evaluation(self, df: "pd.DataFrame", run_id: Optional[str] = None) -> "pd.DataFrame":
         # Calculate summary statistics
         summary = {
-            "mean_prediction_accuracy": df["prediction_accuracy"].mean(),
-            "mean_confidence_score": df["confidence_score"].mean(),
-            "mean_explanation_quality": df["explanation_quality"].mean(),
-            "mean_response_time": df["response_time"].mean(),
-            "mean_risk_factors_accuracy": df["risk_factors_accuracy"].mean(),
+            "run_id": run_id or new_run_id(),
+            "mean_prediction_accuracy": float(df["prediction_accuracy"].mean()),
+            "mean_confidence_score": float(df["confidence_score"].mean()),
+            "mean_explanation_quality": float(df["explanation_quality"].mean()),
+            "mean_response_time": float(df["response_time"].mean()),
+            "mean_risk_factors_accuracy": float(df["risk_factors_accuracy"].mean()),
             "total_test_cases": len(df)
         }
         
         # Save results
         self._save_results(df, summary)
+        self.last_run_id = summary["run_id"]
         
         return df
     
-    def _save_results(self, df: pd.DataFrame, summary: Dict[str, float]):
+    def evaluate_routing(
+        self,
+        baseline_probability: "np.ndarray",
+        labels: "np.ndarray",
+        threshold: float = 0.9,
+        llm_latency: float = 0.5,
+        llm_cost_per_call: float = 0.002,
+        baseline_latency: float = 0.0,
+        confident: Optional["np.ndarray"] = None
+    ) -> Dict[str, Any]:
+        """
+        Estimate cost and latency saved by answering confident cases with the baseline model.
+        `confident` is the router's own fast-path mask; without it a case is
+        confident when max(p, 1 - p) reaches the threshold.
+        """
+        import numpy as np
+
+        baseline_probability = np.asarray(baseline_probability, dtype=np.float64)
+        labels = np.asarray(labels, dtype=np.float64)
+        if confident is None:
+            confident = np.maximum(baseline_probability, 1 - baseline_probability) >= threshold
+        confident = np.asarray(confident, dtype=bool)
+        total = len(baseline_probability)
+        llm_calls = int((~confident).sum())
+        correct = (baseline_probability >= 0.5) == (labels >= 0.5)
+
+        llm_only_latency = total * llm_latency
+        routed_latency = total * baseline_latency + llm_calls * llm_latency
+        llm_only_cost = total * llm_cost_per_call
+        routed_cost = llm_calls * llm_cost_per_call
+
+        report = {
+            "threshold": threshold,
+            "total_cases": total,
+            "baseline_answers": total - llm_calls,
+            "llm_calls": llm_calls,
+            "llm_call_fraction": llm_calls / total if total else 0.0,
+            "baseline_accuracy_when_confident": float(correct[confident].mean()) if confident.any() else None,
+            "mean_latency_llm_only": llm_latency if total else 0.0,
+            "mean_latency_routed": routed_latency / total if total else 0.0,
+            "latency_savings_pct": 100 * (1 - routed_latency / llm_only_latency) if llm_only_latency else 0.0,
+            "cost_llm_only": llm_only_cost,
+            "cost_routed": routed_cost,
+            "cost_savings_pct": 100 * (1 - routed_cost / llm_only_cost) if llm_only_cost else 0.0
+        }
+
+        with open(os.path.join(self.results_dir, "llm_routing_report.json"), "w") as f:
+            json.dump(report, f, indent=2)
+
+        return report
+
+    def _save_results(self, df: "pd.DataFrame", summary: Dict[str, Any]):
         """Save evaluation results to files"""
-        # Save detailed results
-        df.to_csv(os.path.join(self.results_dir, "llm_evaluation.csv"), index=False)
-        
-        # Save summary
-        with open(os.path.join(self.results_dir, "llm_evaluation_summary.json"), "w") as f:
-            json.dump(summary, f, indent=2)
-        
-        # Generate classification report
-        self._generate_classification_report(df)
-    
-    def _generate_classification_report(self, df: pd.DataFrame):
-        """Generate classification report"""
+        self._write_results(df, summary["run_id"])
+        self._write_summary(summary)
+
+    def _write_results(self, df: "pd.DataFrame", run_id: str, append: bool = False):
+        """Write a run's detailed results, or the next chunk of them"""
+        with _span("evaluation.write_results", rows=len(df)):
+            df.to_csv(
+                os.path.join(self.results_dir, "llm_evaluation.csv"),
+                index=False, mode="a" if append else "w", header=not append
+            )
+
+            # Append the rows to the history; only this run's rows are read or written
+            self.results_store.append(run_id, _result_rows(df))
+
+    def _write_summary(self, summary: Dict[str, Any]):
+        with _span("evaluation.write_summary"):
+            # Save summary
+            with open(os.path.join(self.results_dir, "llm_evaluation_summary.json"), "w") as f:
+                json.dump(summary, f, indent=2)
+
+            # Generate classification report
+            self._generate_classification_report()
+
+    def _generate_classification_report(self):
+        """Generate the classification report over every stored run from the running aggregates"""
+        stats = self.results_store.stats()
+
+        def describe(metric: str) -> Dict[str, Any]:
+            return {key: stats.get(metric, {}).get(key) for key in ("mean", "std", "min", "max")}
+
         report = {
             "overall_metrics": {
-                "prediction_accuracy": {
-                    "mean": df["prediction_accuracy"].mean(),
-                    "std": df["prediction_accuracy"].std(),
-                    "min": df["prediction_accuracy"].min(),
-                    "max": df["prediction_accuracy"].max()
-                },
-                "explanation_quality": {
-                    "mean": df["explanation_quality"].mean(),
-                    "std": df["explanation_quality"].std(),
-                    "min": df["explanation_quality"].min(),
-                    "max": df["explanation_quality"].max()
-                }
+                "prediction_accuracy": describe("prediction_accuracy"),
+                "explanation_quality": describe("explanation_quality")
             },
-            "response_time_analysis": {
-                "mean": df["response_time"].mean(),
-                "std": df["response_time"].std(),
-                "min": df["response_time"].min(),
-                "max": df["response_time"].max()
+            "response_time_analysis": describe("response_time"),
+            "history": {
+                "runs": len(self.results_store.runs()),
+                "test_cases": stats.get("prediction_accuracy", {}).get("count", 0)
             }
         }
-        
+
         with open(os.path.join(self.results_dir, "llm_classification_report.json"), "w") as f:
             json.dump(report, f, indent=2)
 
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Import-time budget for the backend and the evaluation CLIs.
+
+Each target is imported in a fresh interpreter under `python -X importtime`.
+The check fails when a target takes longer than its budget to import, or
+when it loads a heavy dependency (numpy, pandas, httpx) that it is
+meant to import only on the code path that needs it. The slowest imports
+are listed so a regression is easy to trace.
+
+    python metrics/import_budget.py
+    python metrics/import_budget.py --module backend.main --top 20
+
+Budgets are in milliseconds. On slow machines, scale them all with
+IMPORT_BUDGET_SCALE=2 instead of editing the table.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The evaluation scripts import each other as top-level modules
+SEARCH_PATH = [ROOT, os.path.join(ROOT, "metrics")]
+
+IMPORT_BUDGETS: Dict[str, Dict[str, Any]] = {
+    # Most of this is fastapi/pydantic, which the server cannot avoid
+    "backend.main": {"budget_ms": 900, "deferred": ["numpy", "pandas", "httpx", "pyarrow", "tiktoken"]},
+    # pydantic comes in through backend.schemas
+    "backend.providers": {"budget_ms": 400, "deferred": ["numpy", "pandas", "httpx", "fastapi"]},
+    "eval_driver": {"budget_ms": 100, "deferred": ["numpy", "pandas"]},
+    "run_evaluation": {"budget_ms": 100, "deferred": ["numpy", "pandas"]},
+    "live_evaluation": {"budget_ms": 200, "deferred": ["numpy", "pandas", "httpx"]},
+    "load_test": {"budget_ms": 200, "deferred": ["numpy", "pandas", "httpx", "fastapi"]},
+}
+
+_PROBE = """\
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+ImportRecord = Tuple[str, int, int, int]
+
+def parse_importtime(stderr: str) -> List[ImportRecord]:
+    """(module, self_us, cumulative_us, depth) for every line of -X importtime output"""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        records.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return records
+
+def measure_import(module: str, repeat: int = 3) -> Dict[str, Any]:
+    """Import a module in fresh interpreters and keep the fastest run"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(SEARCH_PATH + [p for p in [env.get("PYTHONPATH")] if p])
+    best: Optional[Dict[str, Any]] = None
+    for _ in range(max(repeat, 1)):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+            capture_output=True,
+            text=True,
+            cwd=ROOT,
+            env=env
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+        probe = json.loads(completed.stdout.strip().splitlines()[-1])
+        if best is None or probe["seconds"] < best["seconds"]:
+            best = {"module": module, "seconds": probe["seconds"], "modules": probe["modules"],
+                    "imports": parse_importtime(completed.stderr)}
+    return best
+
+def slowest_imports(result: Dict[str, Any], top: int = 10) -> List[ImportRecord]:
+    """The imports with the largest self time in a measurement"""
+    return sorted(result["imports"], key=lambda record: record[1], reverse=True)[:top]
+
+def check_budget(result: Dict[str, Any], budget: Dict[str, Any], scale: float = 1.0) -> List[str]:
+    """Human-readable budget violations (empty when the import is within budget)"""
+    problems = []
+    elapsed_ms = result["seconds"] * 1000
+    limit_ms = budget["budget_ms"] * scale
+    if elapsed_ms > limit_ms:
+        problems.append(f"{result['module']}: import took {elapsed_ms:.0f} ms, budget {limit_ms:.0f} ms")
+    loaded = set(result["modules"])
+    for name in budget.get("deferred", []):
+        if name in loaded:
+            problems.append(f"{result['module']}: imports {name} at module level")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import time of the backend and evaluation CLIs")
+    parser.add_argument("--module", action="append", choices=sorted(IMPORT_BUDGETS), help="Check only these targets")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per target; the fastest counts")
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports to list per target")
+    parser.add_argument("--scale", type=float, default=float(os.getenv("IMPORT_BUDGET_SCALE", "1")), help="Multiply every budget")
+    parser.add_argument("--output", help="Also write the measurements as JSON")
+    args = parser.parse_args()
+
+    problems = []
+    report = {}
+    for module in args.module or sorted(IMPORT_BUDGETS):
+        budget = IMPORT_BUDGETS[module]
+        result = measure_import(module, repeat=args.repeat)
+        failures = check_budget(result, budget, args.scale)
+        problems.extend(failures)
+        report[module] = {
+            "import_ms": round(result["seconds"] * 1000, 1),
+            "budget_ms": budget["budget_ms"] * args.scale,
+            "ok": not failures,
+            "slowest": [{"module": name, "self_us": self_us, "cumulative_us": cumulative_us}
+                        for name, self_us, cumulative_us, _ in slowest_imports(result, args.top)]
+        }
+        print(f"{'ok  ' if not failures else 'FAIL'} {module:<20} {report[module]['import_ms']:>7.1f} ms (budget {report[module]['budget_ms']:.0f} ms)")
+        for entry in report[module]["slowest"]:
+            print(f"       {entry['self_us'] / 1000:>7.1f} ms  {entry['module']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if problems:
+        print("\nImport budget exceeded:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Evaluation runner that drives the live backend.
+
+Test cases are read lazily from a JSONL or CSV dataset and fanned out to
+either an in-process LLMClient or a running API (/predict) through an
+asyncio worker pool with bounded concurrency and an optional rate limit.
+Each result is scored as soon as it completes and appended to a JSONL
+checkpoint, so an interrupted run resumes without re-calling the model for
+finished cases.
+
+JSONL lines look like {"id": ..., "data": {PatientData fields}, "ground_truth": {"prediction": ..., "risk_factors": [...]}}.
+CSV rows carry the PatientData columns plus id, true_prediction and true_risk_factors (";"-separated).
+
+    python metrics/live_evaluation.py --dataset cases.jsonl --backend http --concurrency 32 --rate 50
+"""
+from eval_driver import LLMEvaluator
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Set
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+
+Backend = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+def iter_cases(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield test cases one at a time from a JSONL or CSV file"""
+    if path.endswith(".csv"):
+        from backend.records import coerce_csv_value
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                case_id = row.pop("id")
+                true_prediction = float(row.pop("true_prediction"))
+                factors = row.pop("true_risk_factors", "")
+                yield {
+                    "id": case_id,
+                    "data": {k: coerce_csv_value(v) for k, v in row.items()},
+                    "ground_truth": {
+                        "prediction": true_prediction,
+                        "risk_factors": [f for f in factors.split(";") if f]
+                    }
+                }
+    else:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Ids of cases already scored in a previous run"""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["test_case_id"])
+            except (ValueError, KeyError):
+                # A torn final line from an interrupted run is simply redone
+                continue
+    return done
+
+_TAIL_BLOCK = 8192
+
+def _truncate_torn_line(path: str):
+    """Drop a partial last line so new rows start on a fresh line"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        # Walk back block by block from the end instead of reading the whole checkpoint
+        while position > 0:
+            start = max(0, position - _TAIL_BLOCK)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+
+class RateLimiter:
+    """Spaces request starts evenly to at most `rate` per second"""
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+def client_backend():
+    """In-process LLMClient (provider chosen by LLM_PROVIDER); returns (backend, close)"""
+    from backend.features import PatientFeatures
+    from backend.llm_client import LLMClient
+    client = LLMClient()
+
+    async def predict(data: Dict[str, Any]) -> Dict[str, Any]:
+        # Validate exactly like the API does before spending a model call
+        return await client.apredict(PatientFeatures.from_dict(data))
+
+    return predict, client.aclose
+
+def http_backend(base_url: str, timeout: float = 60.0, max_connections: int = 100):
+    """POST to a running API's /predict; returns (backend, close)"""
+    import httpx
+    client = httpx.AsyncClient(
+        base_url=base_url,
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    )
+
+    async def predict(data: Dict[str, Any]) -> Dict[str, Any]:
+        response = await client.post("/predict", json={"data": data})
+        response.raise_for_status()
+        return response.json()["prediction"]
+
+    return predict, client.aclose
+
+async def run_live_evaluation(
+    cases: Iterator[Dict[str, Any]],
+    backend: Backend,
+    checkpoint_path: str,
+    evaluator: Optional[LLMEvaluator] = None,
+    concurrency: int = 16,
+    rate: Optional[float] = None,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """Score every case not already in the checkpoint; returns run counters"""
+    evaluator = evaluator or LLMEvaluator()
+    _truncate_torn_line(checkpoint_path)
+    done = load_checkpoint(checkpoint_path)
+    limiter = RateLimiter(rate)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    counters = {"skipped": 0, "scored": 0, "failed": 0}
+
+    directory = os.path.dirname(checkpoint_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    checkpoint = open(checkpoint_path, "a")
+
+    async def produce():
+        for case in cases:
+            if case["id"] in done:
+                counters["skipped"] += 1
+                continue
+            await queue.put(case)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work():
+        while True:
+            case = await queue.get()
+            if case is None:
+                return
+            await limiter.wait()
+            start = time.perf_counter()
+            try:
+                prediction = dict(await backend(case["data"]))
+            except Exception as e:
+                counters["failed"] += 1
+                print(f"Case {case['id']} failed: {e}")
+                continue
+            prediction["response_time"] = time.perf_counter() - start
+            row = {
+                "test_case_id": case["id"],
+                **evaluator.evaluate_prediction(prediction, case["ground_truth"])
+            }
+            # One complete line per case; the file is the checkpoint
+            checkpoint.write(json.dumps(row) + "\n")
+            checkpoint.flush()
+            counters["scored"] += 1
+            if on_result is not None:
+                on_result(row)
+
+    try:
+        await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+    finally:
+        checkpoint.close()
+    return counters
+
+def finalize(checkpoint_path: str, evaluator: LLMEvaluator):
+    """
+    Write the standard evaluation reports from the full checkpoint.
+    The checkpoint is one run in the results history, so finalizing a
+    resumed run adds only the cases scored since the last finalize.
+    """
+    import pandas as pd
+    df = pd.read_json(checkpoint_path, lines=True, dtype={"test_case_id": str})
+    if df.empty:
+        return df
+    # read_json infers int64 for whole-number columns; metrics are floats
+    metric_columns = [c for c in df.columns if c != "test_case_id"]
+    df[metric_columns] = df[metric_columns].astype(float)
+    run_id = "live-" + os.path.splitext(os.path.basename(checkpoint_path))[0]
+    return evaluator._finish_evaluation(df, run_id=run_id)
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the live backend against a dataset")
+    parser.add_argument("--dataset", required=True, help="JSONL or CSV test cases")
+    parser.add_argument("--backend", choices=["client", "http"], default="client")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=None, help="Max requests per second")
+    parser.add_argument("--checkpoint", default=os.path.join("reports", "live_evaluation.jsonl"))
+    parser.add_argument("--scorer", default="exact", help="exact, semantic or semantic:<sentence-transformers model>")
+    args = parser.parse_args()
+
+    from semantic_scorer import build_scorer
+    evaluator = LLMEvaluator(scorer=build_scorer(args.scorer))
+    progress = {"n": 0}
+
+    def report(row):
+        progress["n"] += 1
+        if progress["n"] % 100 == 0:
+            print(f"Scored {progress['n']} cases...")
+
+    async def run():
+        if args.backend == "http":
+            backend, close = http_backend(args.base_url, max_connections=args.concurrency)
+        else:
+            backend, close = client_backend()
+        try:
+            return await run_live_evaluation(
+                iter_cases(args.dataset), backend, args.checkpoint, evaluator,
+                concurrency=args.concurrency, rate=args.rate, on_result=report
+            )
+        finally:
+            await close()
+
+    counters = asyncio.run(run())
+    print(f"Scored {counters['scored']}, skipped {counters['skipped']} from checkpoint, failed {counters['failed']}")
+    results_df = finalize(args.checkpoint, evaluator)
+    if len(results_df):
+        print(f"Mean prediction accuracy over {len(results_df)} cases: {results_df['prediction_accuracy'].mean():.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Load test and latency benchmark for the CKD API.
+
+Drives /predict, /predict/batch or /health either in-process (ASGI, no
+network), against a uvicorn server it starts itself, or against any
+running URL. Two load models are supported:
+
+- closed loop: a fixed number of workers, each sending its next request as
+  soon as the previous one returns (measures capacity)
+- open loop: requests start on a fixed schedule regardless of completions;
+  latency is measured from the scheduled start so queueing delay is not
+  hidden (coordinated omission)
+
+Results (throughput, p50/p95/p99, log-bucketed histogram) are written to
+reports/benchmark_<scenario>_<mode>.json. With --baseline the run fails
+when throughput or tail latency regress beyond --max-regression.
+
+    python metrics/load_test.py --scenario predict --mode closed --concurrency 64 --duration 10
+    python metrics/load_test.py --scenario predict --mode open --rate 200 --baseline reports/benchmark_baseline.json
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+
+REPORTS_DIR = "reports"
+
+PATIENT_TEMPLATE = {
+    "age": 65,
+    "blood_pressure": 140,
+    "specific_gravity": 1.02,
+    "albumin": 1,
+    "sugar": 0,
+    "red_blood_cells": "normal",
+    "pus_cell": "normal",
+    "pus_cell_clumps": "notpresent",
+    "bacteria": "notpresent",
+    "blood_glucose_random": 117,
+    "blood_urea": 56,
+    "serum_creatinine": 3.8,
+    "sodium": 111,
+    "potassium": 2.5,
+    "hemoglobin": 11.2,
+    "packed_cell_volume": 32,
+    "white_blood_cell_count": 6700,
+    "red_blood_cell_count": 3.9,
+    "hypertension": "yes",
+    "diabetes_mellitus": "yes",
+    "coronary_artery_disease": "no",
+    "appetite": "good",
+    "pedal_edema": "yes",
+    "anemia": "yes"
+}
+
+def patient(i: int, unique: bool = True) -> Dict[str, Any]:
+    """The i-th benchmark patient; unique payloads defeat the prediction cache"""
+    if not unique:
+        return PATIENT_TEMPLATE
+    return dict(PATIENT_TEMPLATE, age=i % 121, blood_pressure=60 + (i // 121) % 191, blood_glucose_random=(i // 23111) % 501)
+
+def scenario_request(
+    scenario: str, batch_size: int, unique: bool, payloads: Optional[List[Dict[str, Any]]] = None
+) -> Callable[[int], Tuple[str, str, Optional[Dict[str, Any]]]]:
+    """Build (method, path, json) for the i-th request of a scenario; payloads (e.g. a synthetic cohort) are cycled"""
+    get = (lambda i: payloads[i % len(payloads)]) if payloads else (lambda i: patient(i, unique))
+    if scenario == "health":
+        return lambda i: ("GET", "/health", None)
+    if scenario == "predict":
+        return lambda i: ("POST", "/predict", {"data": get(i)})
+    if scenario == "batch":
+        return lambda i: ("POST", "/predict/batch", {"records": [get(i * batch_size + j) for j in range(batch_size)]})
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def histogram(latencies: List[float], buckets_per_decade: int = 10) -> List[Dict[str, float]]:
+    """Log-spaced latency histogram from 10us upwards"""
+    counts: Dict[int, int] = {}
+    for latency in latencies:
+        index = max(0, math.floor(math.log10(max(latency, 1e-5) / 1e-5) * buckets_per_decade))
+        counts[index] = counts.get(index, 0) + 1
+    return [
+        {"le": 1e-5 * 10 ** ((index + 1) / buckets_per_decade), "count": counts[index]}
+        for index in sorted(counts)
+    ]
+
+def summarize(latencies: List[float], errors: int, elapsed: float, settings: Dict[str, Any]) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        **settings,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "duration_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_s": {
+            "mean": sum(ordered) / len(ordered) if ordered else 0.0,
+            "p50": percentile(ordered, 50),
+            "p95": percentile(ordered, 95),
+            "p99": percentile(ordered, 99),
+            "max": ordered[-1] if ordered else 0.0
+        },
+        "histogram": histogram(ordered)
+    }
+
+async def _send(client, build, i: int) -> bool:
+    method, path, body = build(i)
+    try:
+        response = await client.request(method, path, json=body)
+        return response.status_code < 400
+    except Exception:
+        return False
+
+async def closed_loop(client, build, concurrency: int, duration: float) -> Tuple[List[float], int, float]:
+    latencies: List[float] = []
+    errors = 0
+    counter = 0
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def worker():
+        nonlocal errors, counter
+        while time.perf_counter() < deadline:
+            i = counter
+            counter += 1
+            sent = time.perf_counter()
+            ok = await _send(client, build, i)
+            if ok:
+                latencies.append(time.perf_counter() - sent)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+async def open_loop(client, build, rate: float, duration: float, max_outstanding: int) -> Tuple[List[float], int, float]:
+    latencies: List[float] = []
+    errors = 0
+    dropped = 0
+    interval = 1.0 / rate
+    outstanding = set()
+    start = time.perf_counter()
+
+    async def one(i: int, scheduled: float):
+        nonlocal errors
+        ok = await _send(client, build, i)
+        if ok:
+            # Measured from the intended start, so client-side queueing counts
+            latencies.append(time.perf_counter() - scheduled)
+        else:
+            errors += 1
+
+    i = 0
+    while True:
+        scheduled = start + i * interval
+        if scheduled - start >= duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(outstanding) >= max_outstanding:
+            # The server cannot keep up; count the request as failed instead of growing without bound
+            dropped += 1
+        else:
+            task = asyncio.ensure_future(one(i, scheduled))
+            outstanding.add(task)
+            task.add_done_callback(outstanding.discard)
+        i += 1
+
+    if outstanding:
+        await asyncio.gather(*outstanding)
+    return latencies, errors + dropped, time.perf_counter() - start
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_until_ready(base_url: str, path: str = "/ready", timeout: float = 30.0):
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(base_url + path, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout}s")
+
+def start_uvicorn(app: str = "backend.main:app", workers: int = 1) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    if app == "backend.main:app":
+        # Same entry point as production, including shared state across workers
+        command = [sys.executable, "-m", "backend", "serve"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", app]
+    process = subprocess.Popen(
+        command + ["--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url)
+    except RuntimeError:
+        process.terminate()
+        raise
+    return process, base_url
+
+async def run_benchmark(
+    scenario: str = "predict",
+    mode: str = "closed",
+    concurrency: int = 16,
+    rate: float = 50.0,
+    duration: float = 10.0,
+    batch_size: int = 16,
+    unique: bool = True,
+    base_url: Optional[str] = None,
+    app: Any = None,
+    max_outstanding: int = 10000,
+    payloads: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """Run one benchmark against base_url, or in-process against an ASGI app"""
+    import httpx
+    build = scenario_request(scenario, batch_size, unique, payloads)
+    limits = httpx.Limits(max_connections=max(concurrency, 100), max_keepalive_connections=max(concurrency, 100))
+    if app is not None:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=60.0)
+    else:
+        client = httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits)
+
+    async with client:
+        if mode == "closed":
+            latencies, errors, elapsed = await closed_loop(client, build, concurrency, duration)
+        elif mode == "open":
+            latencies, errors, elapsed = await open_loop(client, build, rate, duration, max_outstanding)
+        else:
+            raise ValueError(f"Unknown mode: {mode}")
+
+    settings = {"scenario": scenario, "mode": mode, "duration_target_s": duration}
+    if mode == "closed":
+        settings["concurrency"] = concurrency
+    else:
+        settings["rate_rps"] = rate
+    if scenario == "batch":
+        settings["batch_size"] = batch_size
+    return summarize(latencies, errors, elapsed, settings)
+
+def compare_to_baseline(result: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Regressions beyond the allowed fraction; empty means the run passes"""
+    problems = []
+    if baseline.get("throughput_rps") and result["throughput_rps"] < baseline["throughput_rps"] * (1 - max_regression):
+        problems.append(
+            f"throughput {result['throughput_rps']:.1f} rps < baseline {baseline['throughput_rps']:.1f} rps"
+        )
+    for key in ("p95", "p99"):
+        base = baseline.get("latency_s", {}).get(key)
+        if base and result["latency_s"][key] > base * (1 + max_regression):
+            problems.append(f"{key} latency {result['latency_s'][key] * 1000:.1f} ms > baseline {base * 1000:.1f} ms")
+    return problems
+
+def save_report(result: Dict[str, Any], path: Optional[str] = None) -> str:
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    path = path or os.path.join(REPORTS_DIR, f"benchmark_{result['scenario']}_{result['mode']}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the CKD API")
+    parser.add_argument("--scenario", choices=["predict", "batch", "health"], default="predict")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=16, help="Workers in closed-loop mode")
+    parser.add_argument("--rate", type=float, default=50.0, help="Requests per second in open-loop mode")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeat-payload", action="store_true", help="Send identical payloads (measures cache hits)")
+    parser.add_argument("--cohort", type=int, default=0, help="Cycle through this many synthetic cohort patients (metrics/cohort.py)")
+    parser.add_argument("--cohort-seed", type=int, default=0)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--base-url", help="Benchmark an already running server")
+    target.add_argument("--in-process", action="store_true", help="Drive backend.main:app over ASGI, without a server")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting a server")
+    parser.add_argument("--output", help="Report path (default reports/benchmark_<scenario>_<mode>.json)")
+    parser.add_argument("--baseline", help="Stored report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed fractional regression vs baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write this run to --baseline")
+    args = parser.parse_args()
+
+    payloads = None
+    if args.cohort:
+        from cohort import cohort_records, generate_cohort
+        payloads = [case["data"] for case in cohort_records(generate_cohort(args.cohort, args.cohort_seed))]
+
+    process = None
+    app = None
+    base_url = args.base_url
+    if args.in_process:
+        sys.path.insert(0, os.getcwd())
+        from backend.main import app
+    elif base_url is None:
+        process, base_url = start_uvicorn(workers=args.workers)
+
+    try:
+        result = asyncio.run(run_benchmark(
+            scenario=args.scenario,
+            mode=args.mode,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            duration=args.duration,
+            batch_size=args.batch_size,
+            unique=not args.repeat_payload,
+            base_url=base_url,
+            app=app,
+            payloads=payloads
+        ))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    path = save_report(result, args.output)
+    latency = result["latency_s"]
+    print(f"{result['scenario']} / {result['mode']}: {result['requests']} requests, {result['errors']} errors")
+    print(f"Throughput: {result['throughput_rps']:.1f} req/s")
+    print(f"Latency p50 {latency['p50'] * 1000:.1f} ms, p95 {latency['p95'] * 1000:.1f} ms, p99 {latency['p99'] * 1000:.1f} ms")
+    print(f"Report saved to {path}")
+
+    if args.baseline:
+        if args.save_baseline or not os.path.exists(args.baseline):
+            save_report(result, args.baseline)
+            print(f"Baseline saved to {args.baseline}")
+        else:
+            with open(args.baseline) as f:
+                problems = compare_to_baseline(result, json.load(f), args.max_regression)
+            if problems:
+                print("Regression against baseline:")
+                for problem in problems:
+                    print(f"  - {problem}")
+                sys.exit(1)
+            print("Within baseline thresholds")
+
+if __name__ == "__main__":
+    main()
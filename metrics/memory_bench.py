@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Peak-RSS benchmark of the evaluation pipeline.
+
+Each implementation runs in a fresh interpreter on the same synthetic cases:
+
+- frame: the previous implementation, the whole input flattened into one
+  DataFrame, float64 metrics and a timestamp string on every row
+- matrix: run_evaluation_matrix, chunks scored into preallocated float32
+  columns with categorical ids and one run timestamp
+- stream: run_evaluation_streaming fed by a generator, spilling to disk at
+  --memory-limit-mb
+
+Peak RSS is read from getrusage. "input" is the RSS once the case list is
+built. "overhead" is the peak above that, which is what the evaluation
+itself costs.
+
+    python metrics/memory_bench.py -n 500000
+"""
+from typing import Any, Dict, Iterator
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ("frame", "matrix", "stream")
+
+def synthetic_cases(n: int) -> Iterator[Dict[str, Any]]:
+    factors = ["high blood pressure", "diabetes", "age", "anemia", "albuminuria"]
+    for i in range(n):
+        yield {
+            "id": f"case_{i:08d}",
+            "prediction": {
+                "prediction": (i * 7919 % 1000) / 1000,
+                "confidence": (i * 104729 % 1000) / 1000,
+                "explanation": "Based on the provided data, there is a high risk of CKD. Key risk factors are present.",
+                "risk_factors": factors[:i % 4],
+                "response_time": (i % 50) / 100
+            },
+            "ground_truth": {
+                "prediction": (i * 6151 % 1000) / 1000,
+                "risk_factors": factors[:(i + 1) % 4]
+            }
+        }
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+
+def _run_child(mode: str, n: int, chunk_size: int, memory_limit_mb: float) -> Dict[str, Any]:
+    from datetime import datetime
+    import numpy  # noqa: F401 - imported up front so library RSS is not counted as overhead
+    import pandas  # noqa: F401
+    from eval_driver import LLMEvaluator, cases_to_frame
+    import result_columns  # noqa: F401
+
+    evaluator = LLMEvaluator()
+    evaluator.results_dir = tempfile.mkdtemp(prefix="memory-bench-")
+    cases = synthetic_cases(n) if mode == "stream" else list(synthetic_cases(n))
+    input_mb = _peak_rss_mb()
+
+    start = time.perf_counter()
+    if mode == "frame":
+        metrics = evaluator.evaluate_frame(cases_to_frame(cases))
+        metrics.insert(1, "timestamp", datetime.now().isoformat())
+        evaluator._finish_evaluation(metrics)
+    elif mode == "matrix":
+        evaluator.run_evaluation_matrix(cases, chunk_size=chunk_size)
+    else:
+        evaluator.run_evaluation_streaming(cases, chunk_size=chunk_size, memory_limit_mb=memory_limit_mb)
+    elapsed = time.perf_counter() - start
+
+    peak_mb = _peak_rss_mb()
+    return {
+        "mode": mode,
+        "cases": n,
+        "seconds": round(elapsed, 2),
+        "input_rss_mb": round(input_mb, 1),
+        "peak_rss_mb": round(peak_mb, 1),
+        "overhead_mb": round(peak_mb - input_mb, 1)
+    }
+
+def run_mode(mode: str, n: int, chunk_size: int, memory_limit_mb: float) -> Dict[str, Any]:
+    """Benchmark one implementation in a fresh interpreter"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([here] + [p for p in [env.get("PYTHONPATH")] if p])
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, "-n", str(n),
+         "--chunk-size", str(chunk_size), "--memory-limit-mb", str(memory_limit_mb)],
+        capture_output=True, text=True, env=env, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak-RSS benchmark of the evaluation pipeline")
+    parser.add_argument("-n", type=int, default=200_000, help="Synthetic cases")
+    parser.add_argument("--mode", action="append", choices=MODES, help="Implementations to run (default all)")
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--memory-limit-mb", type=float, default=16.0, help="Result buffer ceiling for the stream mode")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_run_child(args.child, args.n, args.chunk_size, args.memory_limit_mb)))
+        return
+
+    print(f"{'mode':<8} {'seconds':>8} {'input MB':>9} {'peak MB':>9} {'overhead MB':>12}")
+    for mode in args.mode or MODES:
+        result = run_mode(mode, args.n, args.chunk_size, args.memory_limit_mb)
+        print(f"{mode:<8} {result['seconds']:>8.2f} {result['input_rss_mb']:>9.1f} {result['peak_rss_mb']:>9.1f} {result['overhead_mb']:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Typed, preallocated columns for evaluation results.
+
+Evaluated chunks are copied straight into float32 metric arrays and an
+int32 code column for test case ids, instead of collecting per-case dicts
+and copying them into a DataFrame at the end. The run timestamp is stored
+once, as the single category of the timestamp column.
+"""
+from typing import Any, Dict, Hashable
+import sys
+
+import numpy as np
+import pandas as pd
+
+from results_store import METRIC_COLUMNS
+
+METRIC_DTYPE = np.float32
+
+# Metric values, the id code, and a short id string with its category entry;
+# sizes buffers from a memory budget
+ROW_BYTES = len(METRIC_COLUMNS) * np.dtype(METRIC_DTYPE).itemsize + 4 + 160
+
+class ResultColumns:
+    """Growable typed result buffer for one run"""
+
+    def __init__(self, capacity: int, timestamp: str):
+        self.capacity = max(int(capacity), 1)
+        self.timestamp = timestamp
+        self.size = 0
+        self.metrics = {name: np.empty(self.capacity, dtype=METRIC_DTYPE) for name in METRIC_COLUMNS}
+        self.codes = np.empty(self.capacity, dtype=np.int32)
+        self.categories: Dict[Hashable, int] = {}
+        self._id_bytes = 0
+
+    def _grow(self, needed: int):
+        capacity = max(needed, self.capacity * 2)
+        for name, column in self.metrics.items():
+            grown = np.empty(capacity, dtype=METRIC_DTYPE)
+            grown[:self.size] = column[:self.size]
+            self.metrics[name] = grown
+        codes = np.empty(capacity, dtype=np.int32)
+        codes[:self.size] = self.codes[:self.size]
+        self.codes = codes
+        self.capacity = capacity
+
+    def extend(self, frame: "pd.DataFrame"):
+        """Append the rows of an evaluate_frame result"""
+        stop = self.size + len(frame)
+        if stop > self.capacity:
+            self._grow(stop)
+        for name in METRIC_COLUMNS:
+            self.metrics[name][self.size:stop] = frame[name].to_numpy()
+        categories = self.categories
+        for offset, case_id in enumerate(frame["test_case_id"].tolist()):
+            code = categories.get(case_id)
+            if code is None:
+                code = categories[case_id] = len(categories)
+                self._id_bytes += sys.getsizeof(case_id)
+            self.codes[self.size + offset] = code
+        self.size = stop
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the buffer, including the id strings"""
+        return sum(column.nbytes for column in self.metrics.values()) + self.codes.nbytes + self._id_bytes
+
+    def clear(self):
+        """Drop the rows (after a spill) but keep the allocation"""
+        self.size = 0
+        self.categories = {}
+        self._id_bytes = 0
+
+    def to_frame(self) -> "pd.DataFrame":
+        data: Dict[str, Any] = {
+            "test_case_id": pd.Categorical.from_codes(self.codes[:self.size], categories=list(self.categories)),
+            "timestamp": pd.Categorical.from_codes(np.zeros(self.size, dtype=np.int8), categories=[self.timestamp]),
+        }
+        for name in METRIC_COLUMNS:
+            data[name] = self.metrics[name][:self.size]
+        return pd.DataFrame(data)
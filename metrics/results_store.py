@@ -0,0 +1,218 @@
+"""
+Append-only store for evaluation results.
+
+Every run writes its per-case metrics into a SQLite table partitioned by
+run id. Running aggregates (Welford count/mean/M2, min, max and fixed-bin
+histograms) are merged in the same transaction as the new rows, so summary
+reports and the dashboard are built from the aggregates plus the newest
+partition instead of re-reading the whole history.
+"""
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import math
+import os
+import sqlite3
+import time
+import uuid
+
+if TYPE_CHECKING:
+    # numpy is only needed once rows are appended
+    import numpy as np
+
+METRIC_COLUMNS = [
+    "prediction_accuracy",
+    "confidence_score",
+    "explanation_quality",
+    "response_time",
+    "risk_factors_accuracy"
+]
+
+# Upper bin edges; values past the last edge land in the last bin
+_UNIT_EDGES = [round(0.05 * i, 2) for i in range(1, 21)]
+HISTOGRAM_EDGES: Dict[str, List[float]] = {
+    "prediction_accuracy": _UNIT_EDGES,
+    "confidence_score": _UNIT_EDGES,
+    "explanation_quality": _UNIT_EDGES,
+    "risk_factors_accuracy": _UNIT_EDGES,
+    "response_time": [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0],
+}
+
+def bin_counts(metric: str, values: "np.ndarray") -> "np.ndarray":
+    """Counts of non-NaN values per HISTOGRAM_EDGES bin"""
+    import numpy as np
+
+    edges = HISTOGRAM_EDGES[metric]
+    values = values[~np.isnan(values)]
+    return np.bincount(np.minimum(np.searchsorted(edges, values, side="right"), len(edges) - 1), minlength=len(edges))
+
+def merge_moments(count: int, mean: float, m2: float, other_count: int, other_mean: float, other_m2: float) -> Tuple[int, float, float]:
+    """Combine two (count, mean, M2) summaries (Chan et al. parallel Welford update)"""
+    total = count + other_count
+    if total == 0:
+        return 0, 0.0, 0.0
+    delta = other_mean - mean
+    mean += delta * other_count / total
+    m2 += other_m2 + delta * delta * count * other_count / total
+    return total, mean, m2
+
+def batch_moments(values: "np.ndarray") -> Tuple[int, float, float]:
+    """(count, mean, M2) for one batch; batches are combined with merge_moments"""
+    mean = float(values.mean())
+    return len(values), mean, float(((values - mean) ** 2).sum())
+
+class ResultsStore:
+    """SQLite results partitioned by run id, with running aggregates"""
+
+    def __init__(self, path: str, clock=time.time):
+        self.path = path
+        self.clock = clock
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id TEXT PRIMARY KEY, created_at REAL NOT NULL, updated_at REAL NOT NULL,"
+            " cases INTEGER NOT NULL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS results ("
+            " run_id TEXT NOT NULL, test_case_id TEXT NOT NULL,"
+            + "".join(f" {name} REAL," for name in METRIC_COLUMNS) +
+            " PRIMARY KEY (run_id, test_case_id)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS aggregates ("
+            " metric TEXT PRIMARY KEY, count INTEGER NOT NULL, mean REAL NOT NULL, m2 REAL NOT NULL,"
+            " min REAL, max REAL);"
+            "CREATE TABLE IF NOT EXISTS histograms ("
+            " metric TEXT NOT NULL, bin INTEGER NOT NULL, count INTEGER NOT NULL,"
+            " PRIMARY KEY (metric, bin)) WITHOUT ROWID;"
+        )
+
+    def append(self, run_id: str, rows: Iterable[Dict[str, Any]], batch_size: int = 10_000) -> int:
+        """
+        Add a run's per-case metrics and fold them into the aggregates.
+        Cases already stored for this run are skipped, so re-appending a
+        resumed run only counts its new cases. Rows are consumed in batches,
+        so a generator of any length is held in memory one batch at a time.
+        Returns the rows added.
+        """
+        conn = self.conn
+        placeholders = ", ".join("?" * (len(METRIC_COLUMNS) + 2))
+        insert = f"INSERT INTO results (run_id, test_case_id, {', '.join(METRIC_COLUMNS)}) VALUES ({placeholders})"
+        added = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, created_at, updated_at) VALUES (?, ?, ?)",
+                (run_id, self.clock(), self.clock())
+            )
+            iterator = iter(rows)
+            while True:
+                chunk = list(islice(iterator, batch_size))
+                if not chunk:
+                    break
+                # Skip cases stored by an earlier append or batch of this run
+                seen = self._stored_cases(run_id, [str(row["test_case_id"]) for row in chunk])
+                batch = []
+                for row in chunk:
+                    case_id = str(row["test_case_id"])
+                    if case_id not in seen:
+                        seen.add(case_id)
+                        batch.append((run_id, case_id, *(float(row[name]) for name in METRIC_COLUMNS)))
+                conn.executemany(insert, batch)
+                if batch:
+                    for position, metric in enumerate(METRIC_COLUMNS, start=2):
+                        self._merge(metric, [row[position] for row in batch])
+                added += len(batch)
+            conn.execute(
+                "UPDATE runs SET cases = cases + ?, updated_at = ? WHERE run_id = ?",
+                (added, self.clock(), run_id)
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return added
+
+    def _stored_cases(self, run_id: str, case_ids: List[str], step: int = 500) -> Set[str]:
+        stored: Set[str] = set()
+        for start in range(0, len(case_ids), step):
+            part = case_ids[start:start + step]
+            stored.update(case_id for (case_id,) in self.conn.execute(
+                f"SELECT test_case_id FROM results WHERE run_id = ? AND test_case_id IN ({', '.join('?' * len(part))})",
+                (run_id, *part)
+            ))
+        return stored
+
+    def _merge(self, metric: str, values: List[float]):
+        import numpy as np
+
+        array = np.asarray(values, dtype=np.float64)
+        array = array[~np.isnan(array)]
+        if not array.size:
+            return
+        stored = self.conn.execute(
+            "SELECT count, mean, m2, min, max FROM aggregates WHERE metric = ?", (metric,)
+        ).fetchone()
+        count, mean, m2 = batch_moments(array)
+        low, high = float(array.min()), float(array.max())
+        if stored is not None:
+            count, mean, m2 = merge_moments(stored[0], stored[1], stored[2], count, mean, m2)
+            low, high = min(low, stored[3]), max(high, stored[4])
+        self.conn.execute(
+            "INSERT OR REPLACE INTO aggregates (metric, count, mean, m2, min, max) VALUES (?, ?, ?, ?, ?, ?)",
+            (metric, count, mean, m2, low, high)
+        )
+        bins = bin_counts(metric, array)
+        self.conn.executemany(
+            "INSERT INTO histograms (metric, bin, count) VALUES (?, ?, ?)"
+            " ON CONFLICT (metric, bin) DO UPDATE SET count = count + excluded.count",
+            [(metric, int(index), int(n)) for index, n in enumerate(bins) if n]
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """count/mean/std/min/max per metric over every stored run (std uses n - 1, like pandas)"""
+        stats = {}
+        for metric, count, mean, m2, low, high in self.conn.execute(
+            "SELECT metric, count, mean, m2, min, max FROM aggregates"
+        ):
+            stats[metric] = {
+                "count": count,
+                "mean": mean,
+                "std": math.sqrt(m2 / (count - 1)) if count > 1 else None,
+                "min": low,
+                "max": high
+            }
+        return stats
+
+    def histogram(self, metric: str) -> List[Dict[str, Any]]:
+        """Bin counts over every stored run as [{"low", "high", "count"}]"""
+        edges = HISTOGRAM_EDGES[metric]
+        counts = dict(self.conn.execute("SELECT bin, count FROM histograms WHERE metric = ?", (metric,)))
+        return [
+            {"low": edges[i - 1] if i else 0.0, "high": edges[i], "count": counts.get(i, 0)}
+            for i in range(len(edges))
+        ]
+
+    def runs(self) -> List[Dict[str, Any]]:
+        return [
+            {"run_id": run_id, "created_at": created_at, "cases": cases}
+            for run_id, created_at, cases in self.conn.execute(
+                "SELECT run_id, created_at, cases FROM runs ORDER BY created_at, run_id"
+            )
+        ]
+
+    def iter_run(self, run_id: str) -> Iterator[Dict[str, Any]]:
+        """One run's partition, in test case order"""
+        cursor = self.conn.execute(
+            f"SELECT test_case_id, {', '.join(METRIC_COLUMNS)} FROM results WHERE run_id = ? ORDER BY test_case_id",
+            (run_id,)
+        )
+        for row in cursor:
+            yield dict(zip(["test_case_id"] + METRIC_COLUMNS, row))
+
+    def close(self):
+        self.conn.close()
+
+def new_run_id(now: Optional[float] = None) -> str:
+    """Sortable by start time and unique across processes"""
+    return time.strftime("%Y%m%dT%H%M%S", time.localtime(now)) + "-" + uuid.uuid4().hex[:8]
@@ -1,70 +1,56 @@
 #!/usr/bin/env python3
 from eval_driver import LLMEvaluator
-from test_matrix import get_test_matrix
-import pandas as pd
+from test_matrix import get_synthetic_matrix, get_test_matrix
+from typing import TYPE_CHECKING
 import json
 import os
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 
-def generate_html_report(results_df: pd.DataFrame, summary: dict):
-    """Generate HTML report with interactive charts"""
-    # Create subplot figure
-    fig = make_subplots(
-        rows=2, cols=2,
-        subplot_titles=(
-            "Prediction Accuracy Distribution",
-            "Explanation Quality Distribution",
-            "Response Time Analysis",
-            "Risk Factors Accuracy"
-        )
-    )
+if TYPE_CHECKING:
+    import pandas as pd
+    from results_store import ResultsStore
 
-    # Add prediction accuracy histogram
-    fig.add_trace(
-        go.Histogram(x=results_df["prediction_accuracy"], name="Prediction Accuracy"),
-        row=1, col=1
-    )
+DETAILED_CASES = 20
 
-    # Add explanation quality histogram
-    fig.add_trace(
-        go.Histogram(x=results_df["explanation_quality"], name="Explanation Quality"),
-        row=1, col=2
-    )
+def generate_html_report(results_df: "pd.DataFrame", summary: dict, store: "ResultsStore"):
+    """
+    Generate the HTML dashboard.
+    It shows pre-aggregated histograms, quantiles and the worst cases, and
+    pages the per-case rows in from a sidecar directory, so its size does
+    not depend on the number of cases.
+    """
+    from dashboard import build_dashboard, frame_columns
 
-    # Add response time box plot
-    fig.add_trace(
-        go.Box(y=results_df["response_time"], name="Response Time"),
-        row=2, col=1
-    )
+    ids, columns = frame_columns(results_df)
+    return build_dashboard(ids, columns, summary["run_id"], store, os.path.join("reports", "llm_evaluation_report.html"))
 
-    # Add risk factors accuracy bar chart
-    fig.add_trace(
-        go.Bar(
-            x=results_df["test_case_id"],
-            y=results_df["risk_factors_accuracy"],
-            name="Risk Factors Accuracy"
-        ),
-        row=2, col=2
-    )
+def report_routing_savings(evaluator: LLMEvaluator):
+    """Score the Kaggle dataset with the baseline model and report what routing would save"""
+    try:
+        from backend.baseline import BaselineModel, load_dataset
+    except ImportError:
+        print("\nSkipping routing report: install the backend package (pip install -e .)")
+        return None
 
-    # Update layout
-    fig.update_layout(
-        height=800,
-        width=1200,
-        title_text="LLM Evaluation Results",
-        showlegend=False
+    import time
+    model = BaselineModel.load()
+    raw, labels = load_dataset()
+    start = time.perf_counter()
+    probability = model.score_raw(raw)
+    baseline_latency = (time.perf_counter() - start) / len(raw)
+    threshold = model.router_threshold
+    return evaluator.evaluate_routing(
+        probability, labels, threshold=threshold, baseline_latency=baseline_latency,
+        confident=model.fast_path_raw(raw, threshold, probability)
     )
 
-    # Save as HTML
-    fig.write_html(os.path.join("reports", "llm_evaluation_report.html"))
-
 def main():
     # Initialize evaluator
-    evaluator = LLMEvaluator(use_dummy=True)
+    from semantic_scorer import build_scorer
+    evaluator = LLMEvaluator(use_dummy=True, scorer=build_scorer(os.getenv("EVAL_SCORER", "exact")))
     
-    # Get test matrix
-    test_cases = get_test_matrix()
+    # Get test matrix; EVAL_SYNTHETIC_CASES=N evaluates N synthetic cohort patients instead
+    synthetic = int(os.getenv("EVAL_SYNTHETIC_CASES", "0"))
+    test_cases = get_synthetic_matrix(synthetic) if synthetic else get_test_matrix()
     
     # Run evaluation
     print("Running LLM evaluation matrix...")
@@ -72,6 +58,7 @@ def main():
     
     # Calculate summary
     summary = {
+        "run_id": evaluator.last_run_id,
         "mean_prediction_accuracy": results_df["prediction_accuracy"].mean(),
         "mean_confidence_score": results_df["confidence_score"].mean(),
         "mean_explanation_quality": results_df["explanation_quality"].mean(),
@@ -81,7 +68,7 @@ def main():
     }
     
     # Generate HTML report
-    generate_html_report(results_df, summary)
+    generate_html_report(results_df, summary, evaluator.results_store)
     
     # Print summary
     print("\nEvaluation Summary:")
@@ -92,21 +79,32 @@ def main():
     print(f"Mean response time: {results_df['response_time'].mean():.2f} seconds")
     print(f"Mean risk factors accuracy: {results_df['risk_factors_accuracy'].mean():.2f}")
     
-    # Print detailed results
+    # Print detailed results; past DETAILED_CASES only the worst cases by prediction accuracy
     print("\nDetailed Results:")
     print("================")
-    for _, row in results_df.iterrows():
+    detailed = results_df if len(results_df) <= DETAILED_CASES else results_df.nsmallest(DETAILED_CASES, "prediction_accuracy")
+    for _, row in detailed.iterrows():
         print(f"\nTest Case: {row['test_case_id']}")
         print(f"Prediction Accuracy: {row['prediction_accuracy']:.2f}")
         print(f"Explanation Quality: {row['explanation_quality']:.2f}")
         print(f"Response Time: {row['response_time']:.2f}s")
         print(f"Risk Factors Accuracy: {row['risk_factors_accuracy']:.2f}")
     
+    routing = report_routing_savings(evaluator)
+    if routing is not None:
+        print("\nBaseline Routing (threshold {:.2f}):".format(routing["threshold"]))
+        print(f"LLM calls: {routing['llm_calls']}/{routing['total_cases']} ({routing['llm_call_fraction']:.1%})")
+        print(f"Baseline accuracy when confident: {routing['baseline_accuracy_when_confident']:.2%}")
+        print(f"Latency savings: {routing['latency_savings_pct']:.1f}%")
+        print(f"Cost savings: {routing['cost_savings_pct']:.1f}%")
+
     print("\nResults saved in reports/ directory:")
     print("- llm_evaluation.csv")
     print("- llm_evaluation_summary.json")
     print("- llm_classification_report.json")
-    print("- llm_evaluation_report.html")
+    print("- llm_evaluation_report.html (rows in llm_evaluation_report_data/)")
+    if routing is not None:
+        print("- llm_routing_report.json")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,320 @@
+"""
+Semantic scoring of explanations and risk factors.
+
+The exact scorer in eval_driver looks for fixed substrings and compares
+risk factors by string equality, so "hypertension" and "high blood
+pressure" count as different factors. This scorer embeds text and
+matches it against precomputed vector indexes instead:
+
+- risk factors are mapped to canonical CKD terms through an index of the
+  terms and their synonyms, then compared as canonical labels
+- explanations are scored on the same four rubric concepts as the exact
+  scorer (risk, factors, probability, grounding in the data), each matched
+  by any word or word pair close enough to one of the concept's phrases
+
+The default embedder hashes character n-grams into a fixed-size vector
+(no model download, fully vectorized with NumPy). A sentence-transformers
+model can be plugged in when installed. Embeddings are computed in batches
+of unique texts and cached by text hash, so repeated explanations and
+vocabulary cost one lookup.
+
+    python metrics/semantic_scorer.py bench -n 200000
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import argparse
+import hashlib
+import re
+import time
+
+import numpy as np
+
+CKD_RISK_FACTORS: Dict[str, List[str]] = {
+    "hypertension": ["hypertension", "high blood pressure", "elevated blood pressure", "raised blood pressure", "high bp", "htn"],
+    "normal blood pressure": ["normal blood pressure", "normotensive", "blood pressure normal"],
+    "diabetes": ["diabetes", "diabetes mellitus", "diabetic", "high blood sugar", "hyperglycemia", "dm"],
+    "age": ["age", "advanced age", "older age", "elderly", "old age"],
+    "anemia": ["anemia", "anaemia", "low hemoglobin", "low haemoglobin", "low hemoglobin levels"],
+    "albuminuria": ["albuminuria", "proteinuria", "high albumin", "elevated albumin", "protein in urine"],
+    "elevated creatinine": ["elevated creatinine", "high creatinine", "high serum creatinine", "raised creatinine"],
+    "elevated urea": ["elevated urea", "high blood urea", "high urea", "uremia", "azotemia"],
+    "kidney damage": ["kidney damage", "renal damage", "kidney injury", "renal impairment"],
+    "coronary artery disease": ["coronary artery disease", "heart disease", "cad"],
+    "edema": ["edema", "oedema", "pedal edema", "swelling"],
+    "poor appetite": ["poor appetite", "loss of appetite", "anorexia"],
+}
+
+# The concepts of eval_driver.REQUIRED_EXPLANATION_TERMS, with paraphrases
+EXPLANATION_CONCEPTS: Dict[str, List[str]] = {
+    "risk": ["risk", "likelihood", "chance", "danger"],
+    "factors": ["factors", "contributors", "drivers", "indicators", "markers"],
+    "probability": ["probability", "percent", "likely", "odds", "estimated"],
+    "based on": ["based on", "given", "according to", "provided data", "these values"],
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+class Embedder:
+    """
+    Batched, cached text embeddings. Subclasses implement _embed_batch for
+    a list of unique, uncached texts and return unit-length rows.
+    """
+
+    dim: int
+
+    def __init__(self, batch_size: int = 4096, cache_size: int = 200_000):
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), dim) float32 matrix of unit vectors"""
+        keys = [text_key(text) for text in texts]
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        pending: Dict[bytes, List[int]] = {}
+        for row, key in enumerate(keys):
+            vector = self._cache.get(key)
+            if vector is not None:
+                out[row] = vector
+                self.hits += 1
+            else:
+                pending.setdefault(key, []).append(row)
+
+        missing = list(pending)
+        self.misses += len(missing)
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            vectors = self._embed_batch([texts[pending[key][0]] for key in batch])
+            for key, vector in zip(batch, vectors):
+                out[pending[key]] = vector
+                self._cache[key] = vector
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return out
+
+class HashedNgramEmbedder(Embedder):
+    """
+    Character n-grams of the normalized text, hashed into `dim` signed
+    buckets and L2-normalized. Spelling variants and inflections land close
+    together; unrelated words share almost no buckets.
+    """
+
+    _PRIME = np.uint64(1099511628211)
+    _MIX = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self, dim: int = 1024, ngram_range: Tuple[int, int] = (3, 5), **kwargs):
+        super().__init__(**kwargs)
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        # Every text padded with spaces so word starts and ends form n-grams
+        encoded = [f" {normalize(text)} ".encode("utf-8") for text in texts]
+        lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        owner = np.repeat(np.arange(len(encoded), dtype=np.int64), lengths)
+        keys, weights = [], []
+
+        with np.errstate(over="ignore"):
+            for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+                if len(data) < n:
+                    continue
+                windows = len(data) - n + 1
+                # Polynomial hash of each n-byte window, wrapping at 2**64
+                hashes = np.zeros(windows, dtype=np.uint64)
+                for offset in range(n):
+                    hashes = hashes * self._PRIME + data[offset:offset + windows]
+                hashes = (hashes + np.uint64(n)) * self._MIX
+                # Drop windows that straddle two texts
+                valid = owner[:windows] == owner[n - 1:]
+                hashes, rows = hashes[valid], owner[:windows][valid]
+                buckets = (hashes >> np.uint64(33)) % np.uint64(self.dim)
+                keys.append(rows * self.dim + buckets.astype(np.int64))
+                weights.append(np.where(hashes & np.uint64(1), 1.0, -1.0))
+
+        size = len(texts) * self.dim
+        if keys:
+            counts = np.bincount(np.concatenate(keys), weights=np.concatenate(weights), minlength=size)
+        else:
+            counts = np.zeros(size)
+        vectors = counts.astype(np.float32).reshape(len(texts), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+class SentenceTransformerEmbedder(Embedder):
+    """A small local sentence-transformers model (needs the optional package)"""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", **kwargs):
+        super().__init__(**kwargs)
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("SentenceTransformerEmbedder needs: pip install sentence-transformers") from e
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts, batch_size=256, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+
+class ConceptIndex:
+    """Precomputed unit vectors of every phrase of every concept"""
+
+    def __init__(self, concepts: Dict[str, Iterable[str]], embedder: Embedder, threshold: float):
+        self.labels = list(concepts)
+        self.embedder = embedder
+        self.threshold = threshold
+        phrases, owners = [], []
+        for label_index, label in enumerate(self.labels):
+            for phrase in concepts[label]:
+                phrases.append(phrase)
+                owners.append(label_index)
+        self.phrases = phrases
+        self.owners = np.asarray(owners, dtype=np.int64)
+        self.vectors = embedder.embed(phrases)
+
+    def match(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Best concept index per text (-1 below the threshold) and its similarity"""
+        labels = np.empty(len(texts), dtype=np.int64)
+        scores = np.empty(len(texts), dtype=np.float32)
+        # Embeddings are materialized one batch at a time to bound memory
+        step = self.embedder.batch_size
+        for start in range(0, len(texts), step):
+            similarity = self.embedder.embed(texts[start:start + step]) @ self.vectors.T
+            best = similarity.argmax(axis=1)
+            scores[start:start + step] = similarity[np.arange(len(best)), best]
+            labels[start:start + step] = self.owners[best]
+        labels[scores < self.threshold] = -1
+        return labels, scores
+
+class SemanticScorer:
+    """Explanation and risk-factor scores on the scale of the exact scorer"""
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        risk_factors: Optional[Dict[str, List[str]]] = None,
+        concepts: Optional[Dict[str, List[str]]] = None,
+        factor_threshold: float = 0.8,
+        concept_threshold: float = 0.55,
+    ):
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.factor_index = ConceptIndex(risk_factors or CKD_RISK_FACTORS, self.embedder, factor_threshold)
+        self.concept_index = ConceptIndex(concepts or EXPLANATION_CONCEPTS, self.embedder, concept_threshold)
+        # Word pairs are only worth embedding when they can match a two-word phrase
+        self._pair_heads = {phrase.split()[0] for phrase in self.concept_index.phrases if " " in phrase}
+
+    def canonicalize(self, terms: Sequence[str]) -> List[str]:
+        """Canonical CKD term for each input; unmatched terms are kept, normalized"""
+        unique: Dict[str, int] = {}
+        rows = [unique.setdefault(normalize(term), len(unique)) for term in terms]
+        distinct = list(unique)
+        labels, _ = self.factor_index.match(distinct)
+        canonical = [
+            self.factor_index.labels[label] if label >= 0 else text
+            for text, label in zip(distinct, labels)
+        ]
+        return [canonical[row] for row in rows]
+
+    def score_risk_factors(self, predicted: Sequence[Sequence[str]], actual: Sequence[Sequence[str]]) -> np.ndarray:
+        """Share of each row's actual factors that a predicted factor matches, as in the exact scorer"""
+        flat = [term for terms in predicted for term in terms] + [term for terms in actual for term in terms]
+        canonical = iter(self.canonicalize(flat))
+        predicted_labels = [[next(canonical) for _ in terms] for terms in predicted]
+        actual_labels = [[next(canonical) for _ in terms] for terms in actual]
+
+        scores = np.empty(len(predicted), dtype=np.float64)
+        for row, (guess, truth) in enumerate(zip(predicted_labels, actual_labels)):
+            if not truth:
+                scores[row] = 1.0 if not guess else 0.0
+            else:
+                wanted = set(truth)
+                scores[row] = sum(1 for label in guess if label in wanted) / len(truth)
+        return scores
+
+    def score_explanations(self, explanations: Sequence[str]) -> np.ndarray:
+        """0.25 per rubric concept that some word or word pair of the explanation matches"""
+        unique: Dict[str, int] = {}
+        rows = np.fromiter(
+            (unique.setdefault(text, len(unique)) for text in explanations), dtype=np.int64, count=len(explanations)
+        )
+
+        # Words (numbers carry no rubric meaning) and phrase-starting word pairs of each distinct explanation
+        vocabulary: Dict[str, int] = {}
+        spans = []
+        heads = self._pair_heads
+        for text in unique:
+            words = [word for word in _WORD.findall(text.lower()) if not word.isdigit()]
+            grams = words + [f"{a} {b}" for a, b in zip(words, words[1:]) if a in heads]
+            spans.append([vocabulary.setdefault(gram, len(vocabulary)) for gram in grams])
+
+        labels, _ = self.concept_index.match(list(vocabulary))
+        concept_count = len(self.concept_index.labels)
+        hits = np.zeros((len(unique), concept_count), dtype=bool)
+        for text_index, grams in enumerate(spans):
+            matched = labels[grams] if grams else labels[:0]
+            hits[text_index, matched[matched >= 0]] = True
+        return (hits.sum(axis=1) / concept_count)[rows]
+
+def build_scorer(name: str) -> Optional[SemanticScorer]:
+    """None for the exact scorer, else a SemanticScorer (`semantic` or `semantic:<sentence-transformers model>`)"""
+    if name == "exact":
+        return None
+    if name == "semantic":
+        return SemanticScorer()
+    if name.startswith("semantic:"):
+        return SemanticScorer(embedder=SentenceTransformerEmbedder(name.split(":", 1)[1]))
+    raise ValueError(f"Unknown scorer: {name!r}")
+
+def _synthetic_explanations(n: int, seed: int = 0) -> Tuple[List[str], List[List[str]], List[List[str]]]:
+    rng = np.random.default_rng(seed)
+    openers = ["Based on the provided data,", "Given these labs,", "According to the values,", "From the data,"]
+    levels = ["a high", "a moderate", "a low", "an elevated"]
+    nouns = ["risk", "likelihood", "chance", "probability"]
+    synonyms = [phrase for phrases in CKD_RISK_FACTORS.values() for phrase in phrases]
+    explanations, predicted, actual = [], [], []
+    for i in range(n):
+        factors = list(rng.choice(synonyms, size=rng.integers(0, 4)))
+        explanations.append(
+            f"{openers[i % 4]} there is {levels[i % 3]} {nouns[i % 4]} of CKD (case {i}). "
+            f"Key factors: {', '.join(factors) or 'none'}."
+        )
+        predicted.append(factors)
+        actual.append(list(rng.choice(synonyms, size=rng.integers(0, 4))))
+    return explanations, predicted, actual
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic scorer tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("bench", help="Time scoring of synthetic unique explanations")
+    bench.add_argument("-n", type=int, default=100_000)
+    args = parser.parse_args()
+
+    explanations, predicted, actual = _synthetic_explanations(args.n)
+    start = time.perf_counter()
+    scorer = SemanticScorer()
+    built = time.perf_counter()
+    explanation_scores = scorer.score_explanations(explanations)
+    scored = time.perf_counter()
+    factor_scores = scorer.score_risk_factors(predicted, actual)
+    done = time.perf_counter()
+    print(f"index build:        {built - start:.3f}s")
+    print(f"explanations:       {scored - built:.3f}s ({args.n / (scored - built):,.0f}/s, mean score {explanation_scores.mean():.3f})")
+    print(f"risk factors:       {done - scored:.3f}s ({args.n / (done - scored):,.0f}/s, mean score {factor_scores.mean():.3f})")
+    print(f"embedding cache:    {scorer.embedder.hits} hits, {scorer.embedder.misses} misses")
+
+if __name__ == "__main__":
+    main()
@@ -98,4 +98,13 @@ def get_test_matrix() -> List[Dict[str, Any]]:
                 "risk_factors": ["hypertension", "mild diabetes", "age", "family history"]
             }
         }
-    ] 
\ No newline at end of file
+    ]
+
+def get_synthetic_matrix(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """n cohort patients with simulated model answers, for evaluation at volume"""
+    import numpy as np
+    from cohort import cohort_records, generate_cohort, simulate_predictions
+
+    cohort = generate_cohort(n, seed)
+    predictions = simulate_predictions(cohort, np.random.default_rng([seed, 1]))
+    return list(cohort_records(cohort, predictions=predictions))
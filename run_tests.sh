@@ -27,7 +27,7 @@ fi
 
 # Run tests with both Playwright and coverage reports
 echo "Running tests and generating reports..."
-pytest --html=reports/playwright-report.html --self-contained-html --cov=backend --cov-report=html:reports/htmlcov
+pytest -n auto --html=reports/playwright-report.html --self-contained-html --cov=backend --cov-report=html:reports/htmlcov
 
 # Check if tests passed
 if [ $? -eq 0 ]; then
@@ -4,6 +4,7 @@ setup(
     name="ckd-llm-poc",
     version="0.1.0",
     packages=find_packages(),
+    package_data={"backend": ["baseline_model.json", "ckd_dataset.csv"]},
     install_requires=[
         "fastapi",
         "uvicorn",
@@ -17,6 +18,7 @@ setup(
         "pytest-html",
         "pytest-metadata",
         "httpx",
+        "numpy",
         "python-multipart",
     ],
     python_requires=">=3.8",
@@ -1,27 +1,77 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
+import socket
 import subprocess
+import sys
 import time
 import os
+import urllib.error
+import urllib.request
 from playwright.sync_api import Page
+from typing import Dict
+from backend.llm_client import result_events
 
-@pytest.fixture(scope="session", autouse=True)
-def start_server():
-    """Start the FastAPI server before running tests"""
+# The evaluation scripts import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "metrics"))
+
+READY_TIMEOUT = float(os.getenv("LIVE_SERVER_READY_TIMEOUT", "30"))
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_ready(url: str, server: subprocess.Popen, timeout: float):
+    """Poll /ready until the lifespan warm-up has finished"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with {server.returncode}: {server.stderr.read().decode(errors='replace')}")
+        try:
+            with urllib.request.urlopen(f"{url}/ready", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"Server at {url} not ready after {timeout}s")
+
+@pytest.fixture(scope="session")
+def live_server(tmp_path_factory):
+    """Run the app on a free port (one server per xdist worker) and yield its URL once /ready"""
+    state_dir = tmp_path_factory.mktemp("live-server")
+    env = dict(os.environ)
+    env.setdefault("JOBS_DB_PATH", str(state_dir / "jobs.db"))
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
     server = subprocess.Popen(
-        ["uvicorn", "backend.main:app", "--host", "0.0.0.0", "--port", "8000"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env
     )
-    time.sleep(2)
-    yield
-    server.terminate()
-    server.wait()
+    try:
+        _wait_ready(url, server, READY_TIMEOUT)
+        yield url
+    finally:
+        server.terminate()
+        server.wait()
+
+@pytest.fixture(scope="session")
+def base_url(request):
+    """--base-url if given, otherwise the live server; Playwright resolves page.goto("/") against it"""
+    return request.config.getoption("base_url") or request.getfixturevalue("live_server")
+
+@pytest.fixture(scope="session", autouse=True)
+def _verify_url():
+    """Replaces pytest-base-url's autouse check, which would start the server for every session"""
 
 @pytest.fixture
 def mock_llm_client():
-    """Fixture to mock LLM client responses"""
+    """Fixture to mock LLM client responses, including the client backend.main already built"""
+    import backend.main
     with patch('backend.llm_client.LLMClient') as mock:
         mock_instance = Mock()
         mock_instance.predict.return_value = {
@@ -29,8 +79,21 @@ def mock_llm_client():
             "confidence": 0.85,
             "explanation": "Based on the provided data, there is a high risk of CKD progression. The patient shows multiple risk factors including age, albumin levels, and presence of anemia."
         }
+        mock_instance.apredict = AsyncMock(side_effect=lambda data: mock_instance.predict(data))
+        mock_instance.apredict_batch = AsyncMock(
+            side_effect=lambda records: [mock_instance.predict(r) for r in records]
+        )
+
+        async def astream(data):
+            for event in result_events(mock_instance.predict(data)):
+                yield event
+
+        mock_instance.astream = astream
+        mock_instance.astart = AsyncMock()
+        mock_instance.aclose = AsyncMock()
         mock.return_value = mock_instance
-        yield mock_instance
+        with patch.object(backend.main, "llm_client", mock_instance):
+            yield mock_instance
 
 @pytest.fixture
 def test_client(mock_llm_client):
@@ -38,6 +101,8 @@ def test_client(mock_llm_client):
     from backend.main import app
     return TestClient(app)
 
+# pytest-playwright launches one browser per session, i.e. one per xdist
+# worker, and gives every test a fresh context and page from it
 @pytest.fixture
 def browser_context_args(browser_context_args):
     """Configure browser context for tests"""
@@ -48,4 +113,32 @@ def browser_context_args(browser_context_args):
             "height": 720,
         },
         "ignore_https_errors": True,
-    } 
\ No newline at end of file
+    }
+
+def pytest_addoption(parser):
+    parser.addoption("--timing-top", type=int, default=15, help="Tests to list in the timing breakdown (0 to disable)")
+
+_phase_durations: Dict[str, Dict[str, float]] = {}
+
+def pytest_runtest_logreport(report):
+    # Under xdist, worker reports are replayed on the controller, so this sees every test
+    _phase_durations.setdefault(report.nodeid, {})[report.when] = report.duration
+
+def pytest_terminal_summary(terminalreporter, config):
+    """Per-test setup/call/teardown breakdown, slowest first"""
+    top = config.getoption("--timing-top")
+    if not top or not _phase_durations:
+        return
+    rows = sorted(_phase_durations.items(), key=lambda item: -sum(item[1].values()))
+    terminalreporter.write_sep("=", "test timing breakdown")
+    terminalreporter.write_line(f"{'total':>8} {'setup':>8} {'call':>8} {'teardown':>8}  test")
+    for nodeid, phases in rows[:top]:
+        terminalreporter.write_line(
+            f"{sum(phases.values()):>8.2f} {phases.get('setup', 0):>8.2f} {phases.get('call', 0):>8.2f} "
+            f"{phases.get('teardown', 0):>8.2f}  {nodeid}"
+        )
+    totals = {when: sum(p.get(when, 0) for p in _phase_durations.values()) for when in ("setup", "call", "teardown")}
+    terminalreporter.write_line(
+        f"{sum(totals.values()):>8.2f} {totals['setup']:>8.2f} {totals['call']:>8.2f} {totals['teardown']:>8.2f}  "
+        f"all {len(_phase_durations)} tests"
+    )
@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+from backend.admission import AdmissionController, CircuitBreaker, RateLimiter, Rejected, run_with_deadline
+from backend.batching import MicroBatcher
+from backend.cache import MemoryCacheBackend, PredictionCache
+
+def test_admission_queues_then_rejects():
+    """Requests beyond max_concurrency wait; beyond max_queue they are refused"""
+    async def run():
+        admission = AdmissionController(max_concurrency=1, max_queue=1)
+        release = asyncio.Event()
+        order = []
+
+        async def work(name):
+            order.append(name)
+            await release.wait()
+            return name
+
+        first = asyncio.ensure_future(admission.run(lambda: work("first")))
+        second = asyncio.ensure_future(admission.run(lambda: work("second")))
+        await asyncio.sleep(0)
+        assert (admission.active, admission.waiting) == (1, 1)
+        with pytest.raises(Rejected) as excinfo:
+            await admission.run(lambda: work("third"))
+        assert excinfo.value.status_code == 503
+        assert "Retry-After" in excinfo.value.headers()
+        release.set()
+        assert await asyncio.gather(first, second) == ["first", "second"]
+        assert order == ["first", "second"]
+        assert (admission.active, admission.waiting) == (0, 0)
+
+    asyncio.run(run())
+
+def test_cancelled_waiter_frees_its_place():
+    """A queued request that gives up leaves no slot leaked"""
+    async def run():
+        admission = AdmissionController(max_concurrency=1, max_queue=4)
+        held = await admission.acquire()
+        waiter = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        admission.release(held)
+        assert (admission.active, admission.waiting) == (0, 0)
+
+    asyncio.run(run())
+
+def test_circuit_breaker_opens_and_recovers():
+    """Consecutive failures open the circuit; one probe after the timeout closes it"""
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+
+    async def fail():
+        raise RuntimeError("backend down")
+
+    async def succeed():
+        return "ok"
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await breaker.call(fail)
+        assert breaker.state == "open"
+        with pytest.raises(Rejected):
+            await breaker.call(succeed)
+        now[0] = 11
+        assert breaker.state == "half-open"
+        assert await breaker.call(succeed) == "ok"
+        assert breaker.state == "closed"
+
+    asyncio.run(run())
+
+def test_circuit_breaker_counts_all_error_batches():
+    """A batch where every record failed counts as a backend failure"""
+    breaker = CircuitBreaker(failure_threshold=1)
+
+    async def all_errors():
+        return [RuntimeError("x"), RuntimeError("y")]
+
+    asyncio.run(breaker.call(all_errors, failed=lambda results: all(isinstance(r, Exception) for r in results)))
+    assert breaker.state == "open"
+
+def test_rate_limiter_token_bucket():
+    """Each key gets burst requests, then refills at rate per second"""
+    now = [0.0]
+    limiter = RateLimiter(rate=2, burst=2, clock=lambda: now[0])
+    limiter.check("key")
+    limiter.check("key")
+    with pytest.raises(Rejected) as excinfo:
+        limiter.check("key")
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.retry_after == pytest.approx(0.5)
+    limiter.check("other")
+    now[0] = 0.5
+    limiter.check("key")
+
+def test_deadline_cancels_abandoned_work():
+    """Work past its deadline is cancelled all the way down to the batcher"""
+    calls = []
+
+    async def predict_batch(records):
+        calls.append(len(records))
+        return [{"prediction": 0.5} for _ in records]
+
+    async def run():
+        batcher = MicroBatcher(predict_batch, max_batch_size=32, max_wait_ms=50)
+        cache = PredictionCache(MemoryCacheBackend())
+        with pytest.raises(Rejected) as excinfo:
+            await run_with_deadline(cache.get_or_compute("k", lambda: batcher.submit({"age": 1})), 0.01)
+        assert excinfo.value.status_code == 504
+        await asyncio.sleep(0.1)
+        assert cache.get("k") is None
+
+    asyncio.run(run())
+    assert calls == []
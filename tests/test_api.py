@@ -43,12 +43,111 @@ def test_predict_endpoint(test_client):
     assert "prediction" in response.json()
 
 def test_predict_endpoint_invalid_data(test_client):
-    """Test the prediction endpoint with invalid data"""
+    """Test the prediction endpoint rejects data that fails PatientData validation"""
     payload = {"data": {"invalid": "data"}}
     response = test_client.post("/predict", json=payload)
-    assert response.status_code == 200
+    assert response.status_code == 422
+
+def test_predict_endpoint_out_of_range(test_client):
+    """Test the prediction endpoint rejects out-of-range values"""
+    data = valid_patient_data()
+    data["serum_creatinine"] = 42.0
+    response = test_client.post("/predict", json={"data": data})
+    assert response.status_code == 422
 
 def test_predict_endpoint_missing_data(test_client):
     """Test the prediction endpoint with missing data key"""
     response = test_client.post("/predict", json={})
-    assert response.status_code == 422 
\ No newline at end of file
+    assert response.status_code == 422 
+
+def test_predict_batch_endpoint(test_client):
+    """Test the batch prediction endpoint returns one result per record in order"""
+    records = [valid_patient_data() for _ in range(3)]
+    response = test_client.post("/predict/batch", json={"records": records})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert all("prediction" in r for r in results)
+
+def test_predict_batch_endpoint_empty(test_client):
+    """Test the batch prediction endpoint rejects an empty batch"""
+    response = test_client.post("/predict/batch", json={"records": []})
+    assert response.status_code == 422
+
+def test_cache_stats_endpoint(test_client):
+    """Test repeated predictions are served from the cache"""
+    payload = {"data": valid_patient_data()}
+    before = test_client.get("/cache/stats").json()
+    test_client.post("/predict", json=payload)
+    test_client.post("/predict", json=payload)
+    after = test_client.get("/cache/stats").json()
+    assert after["hits"] >= before["hits"] + 1
+
+def test_predict_stream_endpoint(test_client):
+    """Test the streaming endpoint sends the score first and finishes with done"""
+    payload = {"data": valid_patient_data()}
+    with test_client.stream("POST", "/predict/stream", json=payload) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [line[len("event: "):] for line in response.iter_lines() if line.startswith("event: ")]
+    assert events[0] == "score"
+    assert "explanation" in events
+    assert events[-1] == "done"
+
+def test_metrics_endpoint(test_client):
+    """Test /metrics exposes per-route request counters and stage latencies"""
+    test_client.post("/predict", json={"data": valid_patient_data()})
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'ckd_http_requests_total{method="POST",route="/predict",status="200"}' in response.text
+    assert 'ckd_stage_duration_seconds_count{stage="validation"}' in response.text
+    assert "ckd_cache_lookups" in response.text
+
+def test_predict_rate_limited_per_api_key(test_client, monkeypatch):
+    """Test a key over its token bucket gets 429 with Retry-After while other keys pass"""
+    from backend import main
+    from backend.admission import RateLimiter
+    monkeypatch.setattr(main, "rate_limiter", RateLimiter(rate=0.01, burst=1))
+    payload = {"data": valid_patient_data()}
+    assert test_client.post("/predict", json=payload, headers={"X-API-Key": "a"}).status_code == 200
+    response = test_client.post("/predict", json=payload, headers={"X-API-Key": "a"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert test_client.post("/predict", json=payload, headers={"X-API-Key": "b"}).status_code == 200
+
+def test_predict_rejected_when_queue_full(test_client, monkeypatch):
+    """Test requests beyond the concurrency limit and queue are refused with 503"""
+    from backend import main
+    from backend.admission import AdmissionController
+    monkeypatch.setattr(main, "admission", AdmissionController(max_concurrency=0, max_queue=0))
+    response = test_client.post("/predict", json={"data": valid_patient_data()})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert 'ckd_admission_rejections_total{reason="queue_full"}' in test_client.get("/metrics").text
+
+def test_predict_fails_fast_when_circuit_open(test_client, monkeypatch):
+    """Test an open circuit breaker answers 503 without calling the backend"""
+    from backend import main
+    from backend.admission import CircuitBreaker
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    monkeypatch.setattr(main, "breaker", breaker)
+    response = test_client.post("/predict", json={"data": valid_patient_data()})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) > 1
+
+def test_predict_invalid_request_timeout(test_client):
+    """Test a malformed X-Request-Timeout header is a client error"""
+    response = test_client.post("/predict", json={"data": valid_patient_data()}, headers={"X-Request-Timeout": "soon"})
+    assert response.status_code == 400
+
+def test_ready_after_startup(mock_llm_client):
+    """Test /ready is 503 until lifespan warm-up ran, while /health is always OK"""
+    from backend.main import app
+    client = TestClient(app)
+    assert client.get("/health").status_code == 200
+    assert client.get("/ready").status_code == 503
+    with TestClient(app) as started:
+        assert started.get("/ready").json() == {"status": "ready"}
+    assert client.get("/ready").status_code == 503
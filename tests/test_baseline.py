@@ -0,0 +1,68 @@
+import asyncio
+import numpy as np
+from backend.baseline import BaselineModel, BaselineProvider, RoutedProvider, features_matrix, load_dataset
+from backend.features import PatientFeatures
+from backend.providers import LLMProvider
+from tests.test_api import valid_patient_data
+
+class CountingProvider(LLMProvider):
+    model_name = "counting"
+
+    def __init__(self):
+        self.seen = []
+
+    async def complete(self, patient_data):
+        self.seen.append(patient_data)
+        return {"prediction": 0.5, "confidence": 0.5, "explanation": "llm", "risk_factors": []}
+
+def test_exported_model_matches_fresh_training():
+    """The committed weights reproduce a model trained from the dataset"""
+    raw, labels = load_dataset()
+    fresh = BaselineModel.fit(raw, labels)
+    stored = BaselineModel.load()
+    np.testing.assert_allclose(stored.score_raw(raw), fresh.score_raw(raw), atol=1e-6)
+
+def test_score_is_vectorized():
+    """Scoring a features matrix returns one probability per row"""
+    features = features_matrix([valid_patient_data()] * 1000)
+    probability = BaselineModel.load().score(features)
+    assert probability.shape == (1000,)
+    assert np.all((probability >= 0) & (probability <= 1))
+
+def test_baseline_provider_flags_elevated_labs():
+    """Clearly abnormal labs give a confident high-risk answer"""
+    result = asyncio.run(BaselineProvider().complete(PatientFeatures.from_dict(valid_patient_data())))
+    assert result["prediction"] > 0.9
+    assert "elevated serum creatinine" in result["risk_factors"]
+
+def test_router_only_calls_llm_for_uncertain_cases():
+    """Confident records are answered locally; uncertain ones go to the LLM"""
+    confident = valid_patient_data()
+    uncertain = dict(valid_patient_data(), serum_creatinine=1.0, blood_urea=30, blood_pressure=110)
+    llm = CountingProvider()
+    router = RoutedProvider(llm, threshold=0.9)
+
+    results = asyncio.run(router.complete_batch([confident, uncertain]))
+    assert llm.seen == [uncertain]
+    assert results[0]["prediction"] > 0.9
+    assert results[1]["explanation"] == "llm"
+    assert router.stats()["llm_call_fraction"] == 0.5
+
+def test_calibration_and_threshold_come_from_held_out_rows():
+    """The stored model records its Platt calibration and the router threshold chosen on held-out rows"""
+    model = BaselineModel.load()
+    assert model.metadata["held_out_rows"] == 1000
+    assert model.metadata["calibration"]["method"] == "platt"
+    router = model.metadata["router"]
+    assert 0.5 < router["threshold"] < 1.0 and router["held_out_accuracy"] >= router["target_accuracy"]
+    assert RoutedProvider(CountingProvider()).threshold == router["threshold"]
+
+def test_high_blood_pressure_with_normal_labs_is_not_fast_pathed():
+    """A confident CKD score driven by blood pressure alone still goes to the LLM"""
+    contradictory = dict(valid_patient_data(), serum_creatinine=0.8, blood_urea=30, blood_pressure=160)
+    assert BaselineModel.load().score(features_matrix([contradictory]))[0] > 0.9
+    llm = CountingProvider()
+    router = RoutedProvider(llm)
+    results = asyncio.run(router.complete_batch([valid_patient_data(), contradictory]))
+    assert llm.seen == [contradictory]
+    assert results[1]["explanation"] == "llm"
@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from backend.batching import MicroBatcher
+
+def test_concurrent_submits_share_one_backend_call():
+    """Concurrent submits inside the wait window are merged into one batch"""
+    calls = []
+
+    async def predict_batch(records):
+        calls.append(len(records))
+        return [{"prediction": r["age"] / 100} for r in records]
+
+    async def run():
+        batcher = MicroBatcher(predict_batch, max_batch_size=32, max_wait_ms=20)
+        return await asyncio.gather(*(batcher.submit({"age": age}) for age in range(10)))
+
+    results = asyncio.run(run())
+    assert calls == [10]
+    assert [r["prediction"] for r in results] == [age / 100 for age in range(10)]
+
+def test_batch_size_limit_splits_batches():
+    """Reaching max_batch_size flushes immediately"""
+    calls = []
+
+    async def predict_batch(records):
+        calls.append(len(records))
+        return [{} for _ in records]
+
+    async def run():
+        batcher = MicroBatcher(predict_batch, max_batch_size=4, max_wait_ms=20)
+        await batcher.submit_many([{} for _ in range(10)])
+
+    asyncio.run(run())
+    assert calls == [4, 4, 2]
+
+def test_per_item_errors_do_not_fail_the_batch():
+    """An exception in one slot is only raised for that record"""
+    async def predict_batch(records):
+        return [ValueError("bad record") if r.get("bad") else {"ok": True} for r in records]
+
+    async def run():
+        batcher = MicroBatcher(predict_batch, max_batch_size=8, max_wait_ms=5)
+        return await batcher.submit_many([{}, {"bad": True}, {}])
+
+    results = asyncio.run(run())
+    assert results[0] == {"ok": True}
+    assert isinstance(results[1], ValueError)
+    assert results[2] == {"ok": True}
+
+def test_backend_failure_propagates_to_all_waiters():
+    """A failed backend call is raised for every record in the batch"""
+    async def predict_batch(records):
+        raise RuntimeError("backend down")
+
+    async def run():
+        batcher = MicroBatcher(predict_batch, max_batch_size=8, max_wait_ms=5)
+        await batcher.submit({})
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import pytest
+from backend.cache import MemoryCacheBackend, PredictionCache, SQLiteCacheBackend, cache_key
+from backend.features import PatientFeatures
+from tests.test_api import valid_patient_data
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_cache_key_is_canonical():
+    """Key ignores field order but covers values, model and prompt version"""
+    data = valid_patient_data()
+    features = PatientFeatures.from_dict(data)
+    a = cache_key(features, "model", "v1")
+    assert a == cache_key(PatientFeatures.from_dict(dict(reversed(list(data.items())))), "model", "v1")
+    assert a != cache_key(features._replace(age=66), "model", "v1")
+    assert a != cache_key(features, "other-model", "v1")
+    assert a != cache_key(features, "model", "v2")
+
+def test_memory_backend_lru_and_ttl():
+    """Least recently used entries are evicted and expired entries vanish"""
+    clock = FakeClock()
+    backend = MemoryCacheBackend(max_entries=2, ttl=10, clock=clock)
+    backend.set("a", {"v": 1})
+    backend.set("b", {"v": 2})
+    backend.get("a")
+    backend.set("c", {"v": 3})
+    assert backend.get("b") is None
+    assert backend.get("a") == {"v": 1}
+    assert backend.evictions == 1
+
+    clock.now = 11
+    assert backend.get("a") is None
+
+def test_sqlite_backend_survives_restart(tmp_path):
+    """Entries written to disk are visible to a fresh backend"""
+    path = str(tmp_path / "cache.db")
+    backend = SQLiteCacheBackend(path)
+    backend.set("key", {"prediction": 0.5})
+    backend.close()
+
+    reopened = SQLiteCacheBackend(path)
+    assert reopened.get("key") == {"prediction": 0.5}
+    reopened.close()
+
+def test_sqlite_backend_trims_with_a_tracked_count(tmp_path):
+    """The row count follows inserts, replaces and evictions; other writers are picked up on recount"""
+    clock = FakeClock()
+    path = str(tmp_path / "cache.db")
+    backend = SQLiteCacheBackend(path, max_entries=3, clock=clock, recount_every=3)
+    for i, key in enumerate(["a", "b", "a", "c", "d"]):
+        clock.now = i
+        backend.set(key, {"v": i})
+    assert len(backend) == 3 and backend.evictions == 1
+    assert backend.get("b") is None and backend.get("a") == {"v": 2}
+
+    other = SQLiteCacheBackend(path, max_entries=100)
+    other.set("e", {"v": 5})
+    other.set("f", {"v": 6})
+    assert len(backend) == 3
+    clock.now = 10
+    backend.set("g", {"v": 7})
+    assert len(backend) == 3 and backend.evictions == 4
+    assert backend._recount() == 3
+    other.close()
+    backend.close()
+
+def test_concurrent_misses_compute_once():
+    """Concurrent identical misses share a single computation"""
+    cache = PredictionCache(MemoryCacheBackend())
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"prediction": 0.85}
+
+    async def run():
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+        results.append(await cache.get_or_compute("k", compute))
+        return results
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r == {"prediction": 0.85} for r in results)
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 1)
+
+def test_errors_are_not_cached():
+    """A failed computation is retried on the next lookup"""
+    cache = PredictionCache(MemoryCacheBackend())
+
+    async def fail():
+        raise RuntimeError("backend down")
+
+    async def succeed():
+        return {"prediction": 0.1}
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute("k", fail)
+        return await cache.get_or_compute("k", succeed)
+
+    assert asyncio.run(run()) == {"prediction": 0.1}
+
+def test_disk_tier_runs_off_the_event_loop(tmp_path):
+    """Disk reads and writes happen on the cache thread; a fresh cache is served from disk"""
+    path = str(tmp_path / "cache.db")
+    threads = []
+
+    def tracked(disk):
+        get, set_ = disk.get, disk.set
+        disk.get = lambda *args: threads.append(threading.get_ident()) or get(*args)
+        disk.set = lambda *args: threads.append(threading.get_ident()) or set_(*args)
+        return disk
+
+    async def compute():
+        return {"prediction": 0.4}
+
+    async def run(cache):
+        value = await cache.get_or_compute("k", compute)
+        await cache.flush()
+        return value, threading.get_ident()
+
+    first = PredictionCache(MemoryCacheBackend(), tracked(SQLiteCacheBackend(path)))
+    assert asyncio.run(run(first))[0] == {"prediction": 0.4}
+    second = PredictionCache(MemoryCacheBackend(), tracked(SQLiteCacheBackend(path)))
+    value, loop_thread = asyncio.run(run(second))
+    assert value == {"prediction": 0.4}
+    assert (first.stats()["misses"], second.stats()["hits"], second.stats()["misses"]) == (1, 1, 0)
+    assert len(threads) == 3 and loop_thread not in threads
+
+def test_stats_do_not_wait_on_disk_writes(tmp_path):
+    """stats() reads counters only, even while a disk write holds the backend lock"""
+    disk = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+    cache = PredictionCache(MemoryCacheBackend(), disk)
+    cache.set("k", {"prediction": 0.2})
+    stats = []
+    with disk._lock:
+        reader = threading.Thread(target=lambda: stats.append(cache.stats()), daemon=True)
+        reader.start()
+        reader.join(1)
+        assert not reader.is_alive()
+    assert (stats[0]["memory_entries"], stats[0]["disk_entries"]) == (1, 1)
+    disk.close()
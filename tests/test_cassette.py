@@ -0,0 +1,74 @@
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from backend.cache import cache_key
+from backend.cassette import HEADER, Cassette, CassetteMiss, CassetteProvider
+from backend.features import PatientFeatures
+from backend.llm_client import LLMClient
+from backend.providers import LLMProvider, MockProvider
+from test_api import valid_patient_data
+
+class OfflineProvider(LLMProvider):
+    """Fails if a replay ever reaches the backend"""
+
+    model_name = MockProvider.model_name
+
+    async def complete(self, patient_data):
+        raise AssertionError("replay called the backend")
+
+def patients(n):
+    return [PatientFeatures.from_dict({**valid_patient_data(), "age": 20 + i}) for i in range(n)]
+
+def test_replay_is_byte_identical_and_offline(tmp_path):
+    """Answers recorded from a provider are replayed without it, byte for byte"""
+    path = str(tmp_path / "llm.cassette")
+    records = patients(5)
+    recorder = CassetteProvider(MockProvider(latency=0), Cassette(path), mode="record")
+    recorded = asyncio.run(recorder.complete_batch(records))
+    recorder.close()
+    assert recorder.stats()["recorded"] == 5
+
+    replay = CassetteProvider(OfflineProvider(), Cassette(path), mode="replay")
+    replayed = asyncio.run(replay.complete_batch(records))
+    assert [json.dumps(r) for r in replayed] == [json.dumps(r) for r in recorded]
+    assert asyncio.run(replay.complete(records[0])) == recorded[0]
+    assert replay.stats()["hits"] == 6
+
+    with pytest.raises(CassetteMiss):
+        asyncio.run(replay.complete(patients(6)[5]))
+    assert isinstance(asyncio.run(replay.complete_batch(patients(6)))[5], CassetteMiss)
+
+def test_auto_mode_records_misses_and_survives_torn_writes(tmp_path):
+    """auto records only what is missing; a torn tail record is dropped on reopen"""
+    path = tmp_path / "llm.cassette"
+    provider = CassetteProvider(MockProvider(latency=0), Cassette(str(path)), mode="auto")
+    asyncio.run(provider.complete_batch(patients(2)))
+    asyncio.run(provider.complete_batch(patients(3)))
+    assert provider.stats()["recorded"] == 3
+    assert provider.stats()["hits"] == 2
+    provider.close()
+
+    with open(path, "ab") as f:
+        f.write(HEADER.pack(b"\x01" * 32, 100) + b'{"predic')
+    reopened = Cassette(str(path))
+    assert len(reopened) == 3
+    key = cache_key(patients(4)[3], MockProvider.model_name, "v1")
+    reopened.put(key, {"prediction": 0.1})
+    reopened.close()
+    assert Cassette(str(path)).get(key) == {"prediction": 0.1}
+
+def test_api_replays_from_cassette(tmp_path, monkeypatch):
+    """An API backed by a replay cassette serves the recorded answer"""
+    import backend.main as main
+
+    data = {**valid_patient_data(), "age": 97, "blood_pressure": 71}
+    answer = {"prediction": 0.123, "confidence": 0.456, "explanation": "Recorded.", "risk_factors": ["age"]}
+    cassette = Cassette(str(tmp_path / "api.cassette"))
+    cassette.put(cache_key(PatientFeatures.from_dict(data), MockProvider.model_name, "v1"), answer)
+    monkeypatch.setattr(main, "llm_client", LLMClient(CassetteProvider(OfflineProvider(), cassette, mode="replay")))
+
+    with TestClient(main.app) as client:
+        response = client.post("/predict", json={"data": data})
+    assert response.status_code == 200
+    assert response.json() == {"prediction": answer}
@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+from backend.schemas import PatientData
+from cohort import BLOCK_SIZE, CohortModel, cohort_records, generate_cohort, jsonl_lines, write_shards
+
+def test_cohort_is_reproducible_and_valid():
+    """Same seed gives the same rows whatever the size; every record passes PatientData"""
+    small = generate_cohort(500, seed=7)
+    large = generate_cohort(BLOCK_SIZE + 100, seed=7)
+    for name, column in small.items():
+        np.testing.assert_array_equal(column, large[name][:500])
+    assert not np.array_equal(generate_cohort(500, seed=8)["age"], small["age"])
+    from test_matrix import get_synthetic_matrix
+    for case in get_synthetic_matrix(300):
+        PatientData.model_validate(case["data"])
+        assert set(case["prediction"]["risk_factors"]) <= set(case["ground_truth"]["risk_factors"])
+
+def test_cohort_follows_fitted_distributions():
+    """Lab values keep the dataset's per-class medians and correlation; prevalence can be overridden"""
+    from backend.baseline import load_dataset
+    raw, labels = load_dataset()
+    cohort = generate_cohort(200_000, seed=0)
+    ckd = cohort["ckd_stage"] > 0
+    assert abs(ckd.mean() - labels.mean()) < 0.005
+    for column, name in enumerate(("serum_creatinine", "blood_urea", "blood_pressure")):
+        for label in (0, 1):
+            expected = np.median(raw[labels == label, column])
+            assert abs(np.median(cohort[name][ckd == label]) - expected) / expected < 0.1
+    correlation = np.corrcoef(np.log(cohort["serum_creatinine"][ckd]), np.log(cohort["blood_urea"][ckd]))[0, 1]
+    assert correlation > 0.8
+    assert cohort["true_prediction"][ckd].mean() > cohort["true_prediction"][~ckd].mean()
+
+    balanced = generate_cohort(20_000, seed=0, prevalence=0.5)
+    assert abs((balanced["ckd_stage"] > 0).mean() - 0.5) < 0.02
+    assert np.allclose(CohortModel.fit().component_weights(0.5).sum(), 1.0)
+
+def test_shards_feed_live_evaluation(tmp_path):
+    """JSONL and CSV shards hold every row once and read back as live_evaluation cases"""
+    from live_evaluation import iter_cases
+
+    cohort = generate_cohort(200, seed=3)
+    assert list(jsonl_lines(cohort)) == [json.dumps(case) + "\n" for case in cohort_records(cohort)]
+
+    for fmt in ("jsonl", "csv"):
+        paths = write_shards(str(tmp_path / fmt), 1000, seed=3, fmt=fmt, shard_size=300)
+        assert len(paths) == 4
+        cases = [case for path in paths for case in iter_cases(path)]
+        assert [c["id"] for c in cases] == [f"synthetic_{i:08d}" for i in range(1000)]
+        PatientData.model_validate(cases[-1]["data"])
+    jsonl_case = next(iter_cases(str(tmp_path / "jsonl" / "cohort-00000.jsonl")))
+    csv_case = next(iter_cases(str(tmp_path / "csv" / "cohort-00000.csv")))
+    assert csv_case["data"] == jsonl_case["data"]
+    assert csv_case["ground_truth"]["risk_factors"] == jsonl_case["ground_truth"]["risk_factors"]
+
+def test_cohort_runs_without_the_backend_package():
+    """The generator is standalone: same dataset and urea factor as the baseline, no backend import"""
+    import cohort
+    from backend import baseline
+    assert os.path.samefile(cohort.DATASET_PATH, baseline.DATASET_PATH)
+    assert cohort.UREA_PER_BUN == baseline.UREA_PER_BUN
+    code = "import sys; sys.modules['backend'] = None; import cohort; cohort.CohortModel.fit()"
+    subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(cohort.__file__), check=True)
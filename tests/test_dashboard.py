@@ -0,0 +1,50 @@
+import json
+import os
+import numpy as np
+from dashboard import build_dashboard, histogram_quantiles, worst_cases
+from results_store import HISTOGRAM_EDGES, METRIC_COLUMNS, ResultsStore, bin_counts
+
+def run(n, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = np.array([f"case_{i:06d}" for i in range(n)], dtype=object)
+    return ids, {name: rng.random(n) for name in METRIC_COLUMNS}
+
+def test_aggregates_match_exact_values():
+    """Binned quantiles approximate exact ones; worst cases are the lowest values, NaN skipped"""
+    values = np.random.default_rng(1).random(100_000)
+    approx = histogram_quantiles(bin_counts("prediction_accuracy", values), HISTOGRAM_EDGES["prediction_accuracy"], (0.1, 0.5, 0.9))
+    np.testing.assert_allclose(approx, np.quantile(values, (0.1, 0.5, 0.9)), atol=0.01)
+
+    values[[3, 7]] = np.nan
+    order = worst_cases(values, 10)
+    assert order.tolist() == [i for i in np.argsort(values, kind="stable") if not np.isnan(values[i])][:10]
+    assert worst_cases(np.full(3, np.nan), 5).size == 0
+
+def test_dashboard_size_is_bounded(tmp_path):
+    """The HTML does not grow with the run; rows are paged into the sidecar directory"""
+    store = ResultsStore(str(tmp_path / "results.sqlite3"))
+    sizes = []
+    for n in (50, 20_000):
+        ids, columns = run(n)
+        path = build_dashboard(ids, columns, f"run-{n}", store, str(tmp_path / f"report-{n}.html"), page_size=1000)
+        sizes.append(os.path.getsize(path))
+    assert abs(sizes[1] - sizes[0]) < 512
+    pages = sorted(os.listdir(tmp_path / "report-20000_data"))
+    assert len(pages) == 20
+    with open(tmp_path / "report-20000_data" / pages[-1]) as f:
+        text = f.read()
+    page = json.loads(text[text.index(",") + 1:text.rindex(")")])
+    assert page["test_case_id"][-1] == "case_019999"
+    assert len(page["prediction_accuracy"]) == 1000
+
+def test_dashboard_escapes_ids_and_tolerates_nan(tmp_path):
+    ids, columns = run(30)
+    ids[0] = "<script>alert(1)</script>"
+    columns["prediction_accuracy"][0] = -1.0
+    columns["response_time"][1] = np.nan
+    path = build_dashboard(ids, columns, "run", None, str(tmp_path / "report.html"))
+    with open(path) as f:
+        html = f.read()
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in html and "<script>alert" not in html
+    with open(tmp_path / "report_data" / "page-00000.js") as f:
+        assert "null" in f.read()
@@ -0,0 +1,24 @@
+import pytest
+from pydantic import ValidationError
+from backend.features import FEATURE_NAMES, PatientFeatures
+from tests.test_api import valid_patient_data
+
+def test_features_round_trip():
+    """Encoding then decoding gives back the validated fields"""
+    data = valid_patient_data()
+    features = PatientFeatures.from_dict(data)
+    assert len(features) == len(FEATURE_NAMES)
+    assert all(isinstance(v, float) for v in features)
+    assert features.to_dict() == data
+
+def test_categoricals_encode_risk_level_as_one():
+    """Risk-associated categorical levels encode as 1.0"""
+    features = PatientFeatures.from_dict(valid_patient_data())
+    assert features.hypertension == 1.0
+    assert features.red_blood_cells == 0.0
+    assert features.appetite == 0.0
+
+def test_from_dict_rejects_invalid_data():
+    """Invalid records never become features"""
+    with pytest.raises(ValidationError):
+        PatientFeatures.from_dict({"invalid": "data"})
@@ -0,0 +1,30 @@
+from import_budget import IMPORT_BUDGETS, check_budget, measure_import, parse_importtime
+
+SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _json
+import time:      1500 |       1620 | json
+import time:     30000 |      31620 | slowmod
+"""
+
+def test_parse_importtime():
+    """Self time, cumulative time and nesting depth come from -X importtime lines"""
+    records = parse_importtime(SAMPLE)
+    assert records[0] == ("_json", 120, 120, 1)
+    assert records[2] == ("slowmod", 30000, 31620, 0)
+    assert len(records) == 3
+
+def test_check_budget_reports_time_and_deferred_modules():
+    """A slow import and an eagerly loaded heavy dependency are both violations"""
+    budget = {"budget_ms": 50, "deferred": ["pandas"]}
+    assert check_budget({"module": "m", "seconds": 0.01, "modules": ["json"]}, budget) == []
+    problems = check_budget({"module": "m", "seconds": 0.2, "modules": ["json", "pandas"]}, budget)
+    assert len(problems) == 2
+    assert check_budget({"module": "m", "seconds": 0.06, "modules": []}, budget, scale=2) == []
+
+def test_heavy_dependencies_are_deferred():
+    """Importing the backend and the evaluation CLIs does not load numpy, pandas or httpx"""
+    for module in ("backend.main", "eval_driver", "run_evaluation"):
+        result = measure_import(module, repeat=1)
+        problems = [p for p in check_budget(result, IMPORT_BUDGETS[module]) if "at module level" in p]
+        assert problems == []
@@ -0,0 +1,86 @@
+import asyncio
+from backend.instrumentation import Histogram, Registry, SharedMetricsStore, add_stage_hook, arender_metrics, remove_stage_hook, render_metrics, timed_stage
+
+def test_histogram_renders_cumulative_buckets():
+    """Histogram samples follow the Prometheus cumulative bucket format"""
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "/predict")
+    text = registry.render()
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{route="/predict",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/predict",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{route="/predict",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{route="/predict"} 4' in text
+
+def test_counter_and_collectors():
+    """Counters accumulate and collectors run at render time"""
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requests", ("status",))
+    gauge = registry.gauge("entries", "Entries")
+    registry.add_collector(lambda: gauge.set(7))
+    counter.inc(1, "200")
+    counter.inc(2, "200")
+    text = registry.render()
+    assert 'requests_total{status="200"} 3' in text
+    assert "entries 7" in text
+
+def test_stage_hooks_receive_timings():
+    """Stage hooks see every timed stage"""
+    seen = []
+    hook = lambda stage, seconds: seen.append((stage, seconds))
+    add_stage_hook(hook)
+    try:
+        with timed_stage("encode"):
+            pass
+    finally:
+        remove_stage_hook(hook)
+    assert seen and seen[0][0] == "encode" and seen[0][1] >= 0
+
+def test_shared_store_sums_workers(tmp_path):
+    """Worker snapshots are summed; gauges of workers that stopped publishing are dropped"""
+    now = [100.0]
+
+    def worker(name, requests, inflight):
+        registry = Registry()
+        registry.counter("requests_total", "Requests", ("status",)).inc(requests, "200")
+        registry.gauge("inflight", "In flight").set(inflight)
+        registry.histogram("latency_seconds", "Latency", buckets=(1.0,)).observe(0.5)
+        store = SharedMetricsStore(str(tmp_path / "metrics.sqlite3"), worker_id=name, stale_after=10, clock=lambda: now[0])
+        store.publish(registry.snapshot())
+        return registry, store
+
+    worker("a", 3, 2)
+    now[0] = 105.0
+    registry, store = worker("b", 4, 1)
+    text = render_metrics(registry, store)
+    assert 'requests_total{status="200"} 7' in text
+    assert "inflight 3" in text
+    assert "latency_seconds_count 2" in text
+
+    now[0] = 112.0
+    text = render_metrics(registry, store)
+    assert 'requests_total{status="200"} 7' in text
+    assert "inflight 1" in text
+
+def test_shared_store_io_stays_off_the_event_loop(tmp_path):
+    """While another writer holds the store, the loop keeps running and the render finishes afterwards"""
+    registry = Registry()
+    registry.counter("requests_total", "Requests").inc(2)
+    store = SharedMetricsStore(str(tmp_path / "metrics.sqlite3"), worker_id="a")
+
+    async def run():
+        ticks = 0
+        store._lock.acquire()
+        render = asyncio.ensure_future(arender_metrics(registry, store))
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not render.done()
+        store._lock.release()
+        return ticks, await render
+
+    ticks, text = asyncio.run(run())
+    assert ticks == 5 and "requests_total 2" in text
+    store.close()
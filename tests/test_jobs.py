@@ -0,0 +1,136 @@
+import asyncio
+import csv
+import threading
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi.testclient import TestClient
+from backend.jobs import JobInputError, JobRunner, JobStore, iter_csv_rows
+from tests.test_api import valid_patient_data
+
+def csv_upload(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+async def fake_predict_batch(records):
+    return [{"prediction": r.age / 100, "confidence": 0.9, "explanation": "ok", "risk_factors": ["age"]} for r in records]
+
+def test_csv_rows_are_typed():
+    """CSV cells become numbers where they parse as numbers"""
+    rows = list(iter_csv_rows(io.BytesIO(csv_upload([valid_patient_data()]))))
+    assert rows[0]["age"] == 65
+    assert rows[0]["specific_gravity"] == 1.02
+    assert rows[0]["anemia"] == "yes"
+
+def test_empty_upload_is_rejected(tmp_path):
+    """A file without data rows does not create a job"""
+    store = JobStore(str(tmp_path / "jobs.db"))
+    with pytest.raises(JobInputError):
+        store.create_job("empty.csv", iter([]), chunk_size=10)
+
+def test_restart_resumes_unfinished_chunks(tmp_path):
+    """Only chunks that were not completed are scored after a restart"""
+    path = str(tmp_path / "jobs.db")
+    rows = [dict(valid_patient_data(), age=20 + i) for i in range(5)]
+    store = JobStore(path)
+    job = store.create_job("cohort.csv", rows, chunk_size=2)
+
+    # First process: one chunk finished, one was mid-flight when it died
+    job_id, chunk_index, start, stop, _ = store.claim_chunk()
+    store.complete_chunk(job_id, chunk_index, [(i, {"prediction": 0.1}, None) for i in range(start, stop)])
+    store.claim_chunk()
+
+    scored = []
+
+    async def predict_batch(records):
+        scored.extend(r.age for r in records)
+        return await fake_predict_batch(records)
+
+    async def run():
+        runner = JobRunner(predict_batch, path=path, workers=2)
+        runner.resume()
+        for _ in range(200):
+            if runner.store.get_job(job["id"])["status"] == "completed":
+                break
+            await asyncio.sleep(0.01)
+        await runner.stop()
+        return runner.store
+
+    store = asyncio.run(run())
+    assert sorted(scored) == [22, 23, 24]
+    assert store.get_job(job["id"])["processed_rows"] == 5
+    assert [index for index, _, _ in store.iter_results(job["id"])] == [0, 1, 2, 3, 4]
+
+def test_jobs_api_end_to_end(tmp_path, monkeypatch):
+    """Upload a CSV, poll the job and download the results in both formats"""
+    from backend import main
+    monkeypatch.setattr(main, "job_runner", JobRunner(fake_predict_batch, path=str(tmp_path / "jobs.db"), chunk_size=3))
+    bad = dict(valid_patient_data(), serum_creatinine=42.0)
+    rows = [dict(valid_patient_data(), age=30 + i) for i in range(6)] + [bad]
+
+    with TestClient(main.app) as client:
+        response = client.post("/jobs", files={"file": ("cohort.csv", csv_upload(rows), "text/csv")})
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+        assert response.headers["Location"] == f"/jobs/{job_id}"
+
+        for _ in range(200):
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] == "completed":
+                break
+            time.sleep(0.01)
+        assert (job["total_rows"], job["processed_rows"], job["failed_rows"]) == (7, 7, 1)
+        assert job["progress"] == 1.0
+
+        lines = [json.loads(line) for line in client.get(f"/jobs/{job_id}/results").text.splitlines()]
+        assert [line["row"] for line in lines] == list(range(7))
+        assert lines[0]["prediction"]["prediction"] == 0.3
+        assert "error" in lines[6]
+
+        table = list(csv.DictReader(io.StringIO(client.get(f"/jobs/{job_id}/results?format=csv").text)))
+        assert table[1]["risk_factors"] == "age"
+        assert client.get("/jobs/missing").status_code == 404
+
+def test_results_download_pages_across_threads(tmp_path, monkeypatch):
+    """Downloads longer than one page survive being advanced from different threads"""
+    from backend import main
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job = store.create_job("big.csv", [dict(valid_patient_data(), age=30)] * 2500, chunk_size=2500)
+    job_id, chunk_index, start, stop, _ = store.claim_chunk()
+    store.complete_chunk(job_id, chunk_index, [(i, {"prediction": 0.3}, None) for i in range(start, stop)])
+
+    rows = store.iter_results(job_id)
+    first = next(rows)
+    rest = []
+    reader = threading.Thread(target=lambda: rest.extend(rows))
+    reader.start()
+    reader.join()
+    assert [first[0]] + [index for index, _, _ in rest] == list(range(2500))
+
+    runner = JobRunner(fake_predict_batch, path=str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(main, "job_runner", runner)
+    with TestClient(main.app) as client:
+        def download(_):
+            return len(client.get(f"/jobs/{job_id}/results").text.splitlines())
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            assert list(pool.map(download, range(8))) == [2500] * 8
+
+def test_restart_leaves_live_workers_chunks(tmp_path):
+    """A starting worker only re-queues chunks whose owning process is gone"""
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.create_job("cohort.csv", [valid_patient_data() for _ in range(4)], chunk_size=1)
+    for _ in range(3):
+        store.claim_chunk()
+    conn = store._conn()
+    conn.execute("UPDATE job_chunks SET worker = ? WHERE chunk_index = 0", (os.getppid(),))
+    conn.execute("UPDATE job_chunks SET worker = 2147483647 WHERE chunk_index = 1")
+    assert store.requeue_interrupted() == 2
+    statuses = [row[0] for row in conn.execute("SELECT status FROM job_chunks ORDER BY chunk_index")]
+    assert statuses == ["running", "pending", "pending", "pending"]
@@ -0,0 +1,72 @@
+import asyncio
+import json
+from live_evaluation import finalize, iter_cases, load_checkpoint, run_live_evaluation
+from eval_driver import LLMEvaluator
+from tests.test_api import valid_patient_data
+
+def write_cases(path, n):
+    with open(path, "w") as f:
+        for i in range(n):
+            f.write(json.dumps({
+                "id": f"case_{i}",
+                "data": valid_patient_data(),
+                "ground_truth": {"prediction": 0.8, "risk_factors": ["diabetes"]}
+            }) + "\n")
+
+def fake_backend(calls):
+    async def predict(data):
+        calls.append(data)
+        await asyncio.sleep(0.01)
+        return {"prediction": 0.85, "confidence": 0.9, "explanation": "Based on risk factors", "risk_factors": ["diabetes"]}
+    return predict
+
+def test_live_evaluation_scores_every_case(tmp_path):
+    """Every case is scored once and written to the checkpoint"""
+    dataset, checkpoint = tmp_path / "cases.jsonl", tmp_path / "results.jsonl"
+    write_cases(dataset, 20)
+    evaluator = LLMEvaluator()
+    evaluator.results_dir = str(tmp_path)
+    calls = []
+
+    counters = asyncio.run(run_live_evaluation(
+        iter_cases(str(dataset)), fake_backend(calls), str(checkpoint), evaluator, concurrency=8
+    ))
+    assert counters == {"skipped": 0, "scored": 20, "failed": 0}
+    assert len(calls) == 20
+    assert load_checkpoint(str(checkpoint)) == {f"case_{i}" for i in range(20)}
+
+def test_live_evaluation_resumes_from_checkpoint(tmp_path):
+    """A second run skips cases already in the checkpoint"""
+    dataset, checkpoint = tmp_path / "cases.jsonl", tmp_path / "results.jsonl"
+    write_cases(dataset, 10)
+    evaluator = LLMEvaluator()
+    evaluator.results_dir = str(tmp_path)
+    first = list(iter_cases(str(dataset)))[:6]
+    asyncio.run(run_live_evaluation(iter(first), fake_backend([]), str(checkpoint), evaluator))
+    # Simulate a torn line left by an interrupted write
+    with open(checkpoint, "a") as f:
+        f.write('{"test_case_id": "case_6", "predic')
+
+    calls = []
+    counters = asyncio.run(run_live_evaluation(
+        iter_cases(str(dataset)), fake_backend(calls), str(checkpoint), evaluator
+    ))
+    assert counters["skipped"] == 6
+    assert counters["scored"] == 4
+    assert len(calls) == 4
+    assert sorted(finalize(str(checkpoint), evaluator)["test_case_id"]) == sorted(f"case_{i}" for i in range(10))
+
+def test_torn_line_is_found_across_blocks(tmp_path, monkeypatch):
+    """The torn tail is cut by reading back from the end, even when it spans several blocks"""
+    import live_evaluation
+    monkeypatch.setattr(live_evaluation, "_TAIL_BLOCK", 4)
+    path = tmp_path / "results.jsonl"
+    for content, expected in [
+        (b'{"a": 1}\n{"b": 2}\n{"torn": "tail"', b'{"a": 1}\n{"b": 2}\n'),
+        (b'{"a": 1}\n', b'{"a": 1}\n'),
+        (b'no newline at all', b''),
+        (b'', b''),
+    ]:
+        path.write_bytes(content)
+        live_evaluation._truncate_torn_line(str(path))
+        assert path.read_bytes() == expected
@@ -0,0 +1,46 @@
+import asyncio
+import time
+from backend.llm_client import LLMClient
+
+def test_apredict_matches_predict():
+    """Async and sync prediction return the same payload"""
+    client = LLMClient(latency=0)
+    try:
+        assert asyncio.run(client.apredict({"age": 65})) == client.predict({"age": 65})
+    finally:
+        client.close()
+
+def test_apredict_overlaps_concurrent_calls():
+    """Concurrent async predictions run in parallel on the worker pool"""
+    client = LLMClient(latency=0.2, max_workers=4)
+
+    async def run():
+        return await asyncio.gather(*(client.apredict({"age": 65}) for _ in range(4)))
+
+    try:
+        start = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+    finally:
+        client.close()
+
+    assert len(results) == 4
+    assert elapsed < 0.6
+
+def test_astream_reassembles_to_predict():
+    """Streamed events carry the same content as a full prediction"""
+    client = LLMClient(latency=0)
+
+    async def collect():
+        return [event async for event in client.astream({"age": 65})]
+
+    try:
+        events = asyncio.run(collect())
+        expected = client.predict({"age": 65})
+    finally:
+        client.close()
+
+    assert events[0] == ("score", {"prediction": expected["prediction"], "confidence": expected["confidence"]})
+    assert "".join(data["token"] for name, data in events if name == "explanation") == expected["explanation"]
+    assert [data["risk_factor"] for name, data in events if name == "risk_factor"] == expected["risk_factors"]
+    assert events[-1] == ("done", {})
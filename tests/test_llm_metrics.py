@@ -39,4 +39,87 @@ def test_llm_explanation_quality(mock_llm_client):
     
     # Check explanation content
     assert "risk" in explanation.lower()
-    assert "factors" in explanation.lower() 
\ No newline at end of file
+    assert "factors" in explanation.lower()
+
+def test_routing_savings_report(tmp_path):
+    """Test the routing report counts LLM calls and savings"""
+    import numpy as np
+    from eval_driver import LLMEvaluator
+
+    evaluator = LLMEvaluator()
+    evaluator.results_dir = str(tmp_path)
+    report = evaluator.evaluate_routing(
+        np.array([0.99, 0.02, 0.6, 0.45]),
+        np.array([1, 0, 1, 0]),
+        threshold=0.9,
+        llm_latency=1.0,
+        llm_cost_per_call=1.0
+    )
+    assert report["llm_calls"] == 2
+    assert report["baseline_accuracy_when_confident"] == 1.0
+    assert report["cost_savings_pct"] == 50.0
+    assert (tmp_path / "llm_routing_report.json").exists()
+
+def test_vectorized_evaluation_matches_per_case(tmp_path):
+    """Test the columnar evaluation path gives the same metrics as the per-case path"""
+    import random
+    import pandas as pd
+    from eval_driver import LLMEvaluator
+    from test_matrix import get_test_matrix
+
+    rng = random.Random(7)
+    vocabulary = ["age", "diabetes", "hypertension", "anemia", "high blood pressure"]
+    explanations = ["Based on the data, RISK is high.", "Probability of CKD; factors unclear.", "", "Normal."]
+    cases = get_test_matrix()
+    for i in range(200):
+        cases.append({
+            "id": f"random_{i}",
+            "prediction": {
+                "prediction": rng.random(),
+                "confidence": rng.random(),
+                "explanation": rng.choice(explanations),
+                "risk_factors": [rng.choice(vocabulary) for _ in range(rng.randint(0, 4))],
+                "response_time": rng.random()
+            },
+            "ground_truth": {
+                "prediction": rng.random(),
+                "risk_factors": [rng.choice(vocabulary) for _ in range(rng.randint(0, 3))]
+            }
+        })
+
+    evaluator = LLMEvaluator()
+    evaluator.results_dir = str(tmp_path)
+    metric_columns = [
+        "test_case_id", "prediction_accuracy", "confidence_score",
+        "explanation_quality", "response_time", "risk_factors_accuracy"
+    ]
+    expected = evaluator.run_evaluation_matrix_per_case(cases)[metric_columns]
+    actual = evaluator.run_evaluation_matrix(cases, chunk_size=64)
+    assert list(actual.columns) == ["test_case_id", "timestamp"] + metric_columns[1:]
+    # Metrics are stored as float32, ids as categories and the run timestamp once
+    assert (actual[metric_columns[1:]].dtypes == "float32").all()
+    assert actual["timestamp"].cat.categories.size == 1
+    actual = actual[metric_columns].astype({"test_case_id": object})
+    expected = expected.astype({name: "float32" for name in metric_columns[1:]})
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False, rtol=0, atol=0)
+
+def test_streaming_evaluation_spills_to_disk(tmp_path):
+    """A generator of cases is evaluated in bounded memory and spilled chunk by chunk"""
+    import json
+    import pandas as pd
+    from eval_driver import LLMEvaluator
+    from test_matrix import get_test_matrix
+
+    template = get_test_matrix()
+    cases = ({**template[i % len(template)], "id": f"case_{i}"} for i in range(100))
+
+    evaluator = LLMEvaluator()
+    evaluator.results_dir = str(tmp_path)
+    summary = evaluator.run_evaluation_streaming(cases, chunk_size=8, memory_limit_mb=0.001)
+    assert summary["total_test_cases"] == 100
+
+    written = pd.read_csv(tmp_path / "llm_evaluation.csv")
+    assert list(written["test_case_id"]) == [f"case_{i}" for i in range(100)]
+    assert abs(written["prediction_accuracy"].mean() - summary["mean_prediction_accuracy"]) < 1e-6
+    assert json.loads((tmp_path / "llm_evaluation_summary.json").read_text())["run_id"] == summary["run_id"]
+    assert evaluator.results_store.runs()[-1]["cases"] == 100
@@ -0,0 +1,33 @@
+import asyncio
+from load_test import compare_to_baseline, histogram, percentile, run_benchmark
+
+def test_percentile_nearest_rank():
+    """Percentiles use nearest rank on sorted samples"""
+    values = [i / 100 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.5
+    assert percentile(values, 99) == 0.99
+    assert percentile([], 50) == 0.0
+
+def test_histogram_counts_every_sample():
+    """Histogram buckets are increasing and add up to the sample count"""
+    latencies = [0.001, 0.002, 0.01, 0.1, 0.1, 1.5]
+    buckets = histogram(latencies)
+    assert sum(b["count"] for b in buckets) == len(latencies)
+    assert [b["le"] for b in buckets] == sorted(b["le"] for b in buckets)
+
+def test_baseline_regression_detection():
+    """Runs slower than the baseline beyond the threshold are flagged"""
+    baseline = {"throughput_rps": 100.0, "latency_s": {"p95": 0.1, "p99": 0.2}}
+    ok = {"throughput_rps": 95.0, "latency_s": {"p95": 0.11, "p99": 0.21}}
+    slow = {"throughput_rps": 50.0, "latency_s": {"p95": 0.5, "p99": 0.21}}
+    assert compare_to_baseline(ok, baseline, 0.2) == []
+    assert len(compare_to_baseline(slow, baseline, 0.2)) == 2
+
+def test_in_process_closed_loop_benchmark():
+    """A short in-process run against the app reports throughput and latency"""
+    from backend.main import app
+    result = asyncio.run(run_benchmark(scenario="health", mode="closed", concurrency=4, duration=0.3, app=app))
+    assert result["errors"] == 0
+    assert result["throughput_rps"] > 0
+    latency = result["latency_s"]
+    assert latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
@@ -0,0 +1,48 @@
+import pytest
+from backend.features import PatientFeatures
+from backend.prompts import PromptBudgetError, PromptBuilder, estimate_tokens
+from backend.providers import OpenAICompatibleProvider
+from tests.test_api import valid_patient_data
+
+def test_compact_prompt_layout():
+    """v2 renders one key=value line and lists only the flags that are present"""
+    builder = PromptBuilder("v2", count_tokens=estimate_tokens)
+    user = builder.messages(PatientFeatures.from_dict(valid_patient_data()))[1]["content"]
+    assert user == (
+        "age=65 bp=140 sg=1.02 al=1 su=0 bgr=117 bu=56 sc=3.8 sod=111 pot=2.5 "
+        "hemo=11.2 pcv=32 wc=6700 rc=3.9 flags:htn,dm,pe,ane"
+    )
+
+def test_prompts_share_a_stable_prefix():
+    """Every request of a version starts with the same system message; only the patient line differs"""
+    builder = PromptBuilder("v2", count_tokens=estimate_tokens)
+    other = dict(valid_patient_data(), age=40, anemia="no")
+    first = builder.messages(PatientFeatures.from_dict(valid_patient_data()))
+    second = builder.messages(PatientFeatures.from_dict(other))
+    assert first[0] == second[0]
+    assert first[1] != second[1]
+    # Raw dicts and encoded features render identically
+    assert builder.messages(other) == second
+
+def test_budget_drops_least_informative_fields():
+    """Over budget, optional fields go first and key labs are kept"""
+    features = PatientFeatures.from_dict(valid_patient_data())
+    full = PromptBuilder("v2", count_tokens=estimate_tokens).build(features)
+    trimmed = PromptBuilder("v2", max_tokens=full.tokens - 5, count_tokens=estimate_tokens).build(features)
+    assert trimmed.tokens <= full.tokens - 5
+    assert "white_blood_cell_count" in trimmed.dropped
+    assert "sc=3.8" in trimmed.messages[1]["content"]
+    assert "wc=" not in trimmed.messages[1]["content"]
+
+def test_budget_too_small_is_an_error():
+    """A budget below the mandatory fields cannot be met"""
+    builder = PromptBuilder("v2", max_tokens=10, count_tokens=estimate_tokens)
+    with pytest.raises(PromptBudgetError):
+        builder.build(PatientFeatures.from_dict(valid_patient_data()))
+
+def test_provider_uses_prompt_version():
+    """The HTTP provider sends the builder's messages and reports its version for cache keys"""
+    provider = OpenAICompatibleProvider("http://fake/v1", "fake-llm", prompt_builder=PromptBuilder("v1"))
+    body = provider._request_body({"age": 65})
+    assert provider.prompt_version == "v1"
+    assert body["messages"][1]["content"] == '{"age":65}'
@@ -0,0 +1,100 @@
+import asyncio
+import httpx
+import pytest
+from backend.fake_llm_server import create_app
+from backend.llm_client import LLMClient
+from backend.providers import OpenAICompatibleProvider, ProviderError, _StreamingJSONParser
+
+def fake_provider(**kwargs):
+    transport = httpx.ASGITransport(app=create_app(latency=0, token_delay=0))
+    return OpenAICompatibleProvider("http://fake/v1", "fake-llm", transport=transport, **kwargs)
+
+def test_openai_provider_complete():
+    """The HTTP provider parses a chat completion into a prediction"""
+    client = LLMClient(provider=fake_provider())
+
+    async def run():
+        try:
+            return await client.apredict({"age": 65})
+        finally:
+            await client.aclose()
+
+    result = asyncio.run(run())
+    assert client.model_name == "fake-llm"
+    assert result["prediction"] == 0.85
+    assert result["risk_factors"] == ["high blood pressure", "diabetes", "age"]
+
+def test_openai_provider_stream_sends_score_first():
+    """Streaming yields the score before any explanation text"""
+    provider = fake_provider()
+
+    async def run():
+        try:
+            return [event async for event in provider.stream({"age": 65})]
+        finally:
+            await provider.aclose()
+
+    events = asyncio.run(run())
+    assert events[0] == ("score", {"prediction": 0.85, "confidence": 0.92})
+    explanation = "".join(data["token"] for name, data in events if name == "explanation")
+    assert explanation.startswith("Based on the provided data")
+    assert events[-1] == ("done", {})
+
+def test_openai_provider_retries_transient_errors():
+    """503s are retried with backoff before succeeding"""
+    attempts = []
+
+    def handler(request):
+        attempts.append(1)
+        if len(attempts) < 3:
+            return httpx.Response(503, headers={"Retry-After": "0"})
+        content = '{"prediction": 0.4, "confidence": 0.7, "explanation": "ok", "risk_factors": []}'
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    provider = OpenAICompatibleProvider("http://fake/v1", "fake-llm", transport=httpx.MockTransport(handler), backoff_base=0)
+    result = asyncio.run(provider.complete({}))
+    assert len(attempts) == 3
+    assert result["prediction"] == 0.4
+
+def test_openai_provider_gives_up_on_client_errors():
+    """Non-retryable statuses fail immediately"""
+    attempts = []
+
+    def handler(request):
+        attempts.append(1)
+        return httpx.Response(400, text="bad request")
+
+    provider = OpenAICompatibleProvider("http://fake/v1", "fake-llm", transport=httpx.MockTransport(handler))
+    with pytest.raises(ProviderError):
+        asyncio.run(provider.complete({}))
+    assert len(attempts) == 1
+
+def test_streaming_parser_handles_split_escapes():
+    """Escape sequences split across chunks decode correctly"""
+    parser = _StreamingJSONParser()
+    text = '{"prediction": 0.5, "confidence": 0.6, "explanation": "line\\none \\u00e9 end", "risk_factors": []}'
+    tokens = []
+    for i in range(0, len(text), 3):
+        tokens.extend(data["token"] for name, data in parser.feed(text[i:i + 3]) if name == "explanation")
+    assert "".join(tokens) == "line\none é end"
+
+def test_sync_predict_reuses_one_client(monkeypatch):
+    """Repeated sync predict calls share one pooled client, which close() shuts"""
+    created = []
+    original = httpx.AsyncClient
+
+    def tracking_client(*args, **kwargs):
+        created.append(original(*args, **kwargs))
+        return created[-1]
+
+    def handler(request):
+        content = '{"prediction": 0.4, "confidence": 0.7, "explanation": "ok", "risk_factors": []}'
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    monkeypatch.setattr(httpx, "AsyncClient", tracking_client)
+    client = LLMClient(provider=OpenAICompatibleProvider("http://fake/v1", "fake-llm", transport=httpx.MockTransport(handler)))
+    assert client.predict({"age": 65})["prediction"] == 0.4
+    assert client.predict_batch([{"age": 66}])[0]["prediction"] == 0.4
+    assert len(created) == 1 and not created[0].is_closed
+    client.close()
+    assert created[0].is_closed
@@ -0,0 +1,61 @@
+import random
+from results_store import METRIC_COLUMNS, ResultsStore
+
+def make_rows(rng, prefix, n):
+    return [
+        {"test_case_id": f"{prefix}_{i}", **{name: rng.random() for name in METRIC_COLUMNS}}
+        for i in range(n)
+    ]
+
+def test_running_aggregates_match_full_recompute(tmp_path):
+    """Welford aggregates merged run by run equal statistics over all rows"""
+    import pandas as pd
+
+    rng = random.Random(3)
+    store = ResultsStore(str(tmp_path / "results.sqlite3"))
+    everything = []
+    for run in range(4):
+        rows = make_rows(rng, f"r{run}", rng.randint(1, 300))
+        assert store.append(f"run_{run}", rows) == len(rows)
+        everything.extend(rows)
+
+    expected = pd.DataFrame(everything)
+    stats = store.stats()
+    for name in METRIC_COLUMNS:
+        assert stats[name]["count"] == len(everything)
+        assert abs(stats[name]["mean"] - expected[name].mean()) < 1e-12
+        assert abs(stats[name]["std"] - expected[name].std()) < 1e-12
+        assert stats[name]["min"] == expected[name].min()
+        assert stats[name]["max"] == expected[name].max()
+        assert sum(b["count"] for b in store.histogram(name)) == len(everything)
+
+def test_reappending_a_run_only_adds_new_cases(tmp_path):
+    """A resumed run's already stored cases are not counted twice"""
+    rng = random.Random(5)
+    store = ResultsStore(str(tmp_path / "results.sqlite3"))
+    rows = make_rows(rng, "case", 10)
+    assert store.append("live", rows[:6]) == 6
+    assert store.append("live", rows) == 4
+    assert store.stats()["prediction_accuracy"]["count"] == 10
+    assert [run["cases"] for run in store.runs()] == [10]
+    assert len(list(store.iter_run("live"))) == 10
+
+def test_evaluator_reports_cover_history(tmp_path):
+    """Each evaluation appends a run and the classification report spans all runs"""
+    import json
+    from eval_driver import LLMEvaluator
+    from test_matrix import get_test_matrix
+
+    evaluator = LLMEvaluator()
+    evaluator.results_dir = str(tmp_path)
+    cases = get_test_matrix()
+    evaluator.run_evaluation_matrix(cases)
+    first = evaluator.last_run_id
+    evaluator.run_evaluation_matrix(cases)
+    assert evaluator.last_run_id != first
+
+    report = json.loads((tmp_path / "llm_classification_report.json").read_text())
+    assert report["history"] == {"runs": 2, "test_cases": 2 * len(cases)}
+    summary = json.loads((tmp_path / "llm_evaluation_summary.json").read_text())
+    assert summary["run_id"] == evaluator.last_run_id
+    assert summary["total_test_cases"] == len(cases)
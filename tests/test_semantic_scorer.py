@@ -0,0 +1,54 @@
+import numpy as np
+from semantic_scorer import HashedNgramEmbedder, SemanticScorer
+
+def test_synonymous_risk_factors_match():
+    """Synonyms map to one canonical term; opposite findings do not"""
+    scorer = SemanticScorer()
+    assert scorer.canonicalize(["High blood pressure", "HTN", "anaemia", "obesity"]) == [
+        "hypertension", "hypertension", "anemia", "obesity"
+    ]
+    scores = scorer.score_risk_factors(
+        [["high blood pressure", "Diabetic"], ["normal blood pressure"], []],
+        [["hypertension", "diabetes"], ["hypertension"], []]
+    )
+    assert list(scores) == [1.0, 0.0, 1.0]
+
+def test_explanation_scoring_accepts_paraphrases():
+    """Rubric concepts are matched through paraphrases and inflections, not just fixed substrings"""
+    from eval_driver import LLMEvaluator
+    from test_matrix import get_test_matrix
+
+    scorer = SemanticScorer()
+    exact = LLMEvaluator()
+    explanations = [case["prediction"]["explanation"] for case in get_test_matrix()]
+    semantic = scorer.score_explanations(explanations)
+    assert all(s >= exact._evaluate_explanation(e) for s, e in zip(semantic, explanations))
+
+    paraphrase = "Given these values, the likelihood of CKD is high; main contributors are anemia and age."
+    assert exact._evaluate_explanation(paraphrase) == 0
+    assert scorer.score_explanations([paraphrase, "Normal."]).tolist() == [0.75, 0.0]
+
+def test_embeddings_are_batched_and_cached():
+    """Batch size does not change vectors, and repeated texts are served from the cache"""
+    texts = [f"risk factor {i % 7}" for i in range(50)]
+    small, large = HashedNgramEmbedder(batch_size=3), HashedNgramEmbedder(batch_size=1000)
+    vectors = small.embed(texts)
+    np.testing.assert_allclose(vectors, large.embed(texts), atol=1e-6)
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+    assert small.misses == 7
+    small.embed(texts)
+    assert small.hits == 50
+
+def test_vectorized_semantic_evaluation_matches_per_case(tmp_path):
+    """evaluate_frame with a semantic scorer agrees with evaluate_prediction"""
+    from eval_driver import LLMEvaluator, cases_to_frame
+    from test_matrix import get_test_matrix
+
+    evaluator = LLMEvaluator(scorer=SemanticScorer())
+    evaluator.results_dir = str(tmp_path)
+    cases = get_test_matrix()
+    frame = evaluator.evaluate_frame(cases_to_frame(cases))
+    for case, (_, row) in zip(cases, frame.iterrows()):
+        expected = evaluator.evaluate_prediction(case["prediction"], case["ground_truth"])
+        assert row["explanation_quality"] == expected["explanation_quality"]
+        assert row["risk_factors_accuracy"] == expected["risk_factors_accuracy"]
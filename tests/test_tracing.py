@@ -0,0 +1,112 @@
+import asyncio
+import csv
+import io
+import time
+import pytest
+from fastapi.testclient import TestClient
+from backend import tracing
+from backend.jobs import JobRunner
+from backend.llm_client import LLMClient
+from backend.providers import MockProvider
+from backend.tracing import FileExporter, Tracer, format_trace, load_traces, parse_traceparent, summarize
+from test_api import valid_patient_data
+
+class Collect:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+@pytest.fixture
+def tracer(monkeypatch):
+    installed = Tracer(Collect(), sample_rate=0.0, slow_seconds=0.05)
+    monkeypatch.setattr(tracing, "_tracer", installed)
+    return installed
+
+def test_head_and_tail_sampling(tracer):
+    """Fast unsampled traces are dropped; slow, failed and head-sampled ones are kept whole"""
+    with tracing.span("fast"):
+        with tracing.span("child"):
+            pass
+    assert tracer.exporter.spans == [] and tracer.dropped == 1
+
+    with tracing.span("slow") as root:
+        with tracing.span("child") as child:
+            time.sleep(0.06)
+    assert [s.name for s in tracer.exporter.spans] == ["child", "slow"]
+    assert child.parent_id == root.span_id and child.trace_id == root.trace_id
+
+    with pytest.raises(ValueError):
+        with tracing.span("failed"):
+            with tracing.span("child"):
+                raise ValueError("bad input")
+    assert tracer.exporter.spans[-1].error == "ValueError: bad input"
+
+    # A remote parent's sampled flag is a head decision
+    parent = parse_traceparent("00-" + "a" * 32 + "-" + "b" * 16 + "-01")
+    with tracing.span("remote", parent=parent) as remote:
+        assert tracing.current_traceparent() == f"00-{'a' * 32}-{remote.span_id}-01"
+    assert remote.trace_id == "a" * 32 and remote.parent_id == "b" * 16
+    assert tracer.exporter.spans[-1] is remote
+    assert parse_traceparent("00-" + "0" * 32 + "-" + "b" * 16 + "-01") is None
+    assert parse_traceparent("garbage") is None
+    assert tracer.kept == 3
+
+def test_api_traces_stages_batches_and_jobs(tmp_path, monkeypatch):
+    """A sampled /predict trace shows its stages and the linked batch; job chunks continue the upload's trace"""
+    from backend import main
+
+    async def predict_batch(records):
+        return await main.llm_client.apredict_batch(records)
+
+    path = str(tmp_path / "traces.jsonl")
+    installed = Tracer(FileExporter(path), sample_rate=0.0, slow_seconds=60)
+    monkeypatch.setattr(tracing, "_tracer", installed)
+    monkeypatch.setattr(main, "llm_client", LLMClient(MockProvider(latency=0)))
+    monkeypatch.setattr(main, "job_runner", JobRunner(predict_batch, path=str(tmp_path / "jobs.db"), chunk_size=2))
+    sampled = "00-" + "c" * 32 + "-" + "d" * 16 + "-01"
+    upload = io.StringIO()
+    writer = csv.DictWriter(upload, fieldnames=list(valid_patient_data()))
+    writer.writeheader()
+    writer.writerows([{**valid_patient_data(), "age": 30 + i} for i in range(3)])
+
+    with TestClient(main.app) as client:
+        response = client.post("/predict", json={"data": valid_patient_data()}, headers={"traceparent": sampled})
+        assert response.headers["x-trace-id"] == "c" * 32
+        client.post("/predict", json={"data": {**valid_patient_data(), "age": 70}})
+        job = client.post("/jobs", files={"file": ("rows.csv", upload.getvalue())}, headers={"traceparent": "00-" + "f" * 32 + "-" + "e" * 16 + "-01"}).json()
+        for _ in range(200):
+            if client.get(f"/jobs/{job['id']}").json()["status"] == "completed":
+                break
+            time.sleep(0.01)
+    installed.exporter.close()
+
+    traces = load_traces(path)
+    request = traces["c" * 32]
+    assert [s["name"] for s in request if s["parentSpanId"] == "d" * 16] == ["POST /predict"]
+    assert {"validation", "encode", "batch.wait", "serialize"} <= {s["name"] for s in request}
+    job_names = [s["name"] for s in traces["f" * 32]]
+    assert job_names.count("job.chunk") == 2 and job_names.count("llm.predict_batch") == 2
+    # The unsampled, fast request is gone; the batch that served the sampled one is kept
+    assert len(traces) == 3
+    chart = "\n".join(format_trace(request, traces=traces))
+    assert "~ linked trace" in chart and "      llm.predict_batch" in chart
+    paths = {row["path"]: row for row in summarize(traces.values())}
+    assert paths["POST /predict;batch.wait"]["count"] == 1
+    assert paths["batch;llm.predict_batch"]["count"] == 1
+
+def test_disabled_tracing_is_a_noop(monkeypatch):
+    """Without a tracer spans cost nothing and nothing propagates"""
+    monkeypatch.setattr(tracing, "_tracer", None)
+    with tracing.span("anything") as span:
+        span.set_attribute("key", "value")
+        assert tracing.propagation_headers() == {}
+    assert span is tracing.NOOP_SPAN
+
+    async def run():
+        from backend.batching import MicroBatcher
+        batcher = MicroBatcher(lambda records: asyncio.sleep(0, [{}] * len(records)), max_batch_size=2, max_wait_ms=1)
+        return await batcher.submit_many([{}, {}, {}])
+
+    assert asyncio.run(run()) == [{}, {}, {}]
@@ -1,11 +1,8 @@
 import pytest
 from playwright.sync_api import Page, expect
-import time
 
 def test_home_page(page: Page):
     """Test the home page loads correctly"""
-    # Wait for server to be ready
-    time.sleep(2)
     page.goto("/")
     
     # Check page title
@@ -17,8 +14,6 @@ def test_home_page(page: Page):
 
 def test_prediction_form(page: Page):
     """Test the prediction form submission"""
-    # Wait for server to be ready
-    time.sleep(2)
     page.goto("/")
     
     # Fill form
@@ -38,8 +33,6 @@ def test_prediction_form(page: Page):
 
 def test_form_validation(page: Page):
     """Test form validation"""
-    # Wait for server to be ready
-    time.sleep(2)
     page.goto("/")
     
     # Try to submit empty form
@@ -51,8 +44,6 @@ def test_form_validation(page: Page):
 
 def test_responsive_design(page: Page):
     """Test responsive design"""
-    # Wait for server to be ready
-    time.sleep(2)
     
     # Test mobile view
     page.set_viewport_size({"width": 375, "height": 667})
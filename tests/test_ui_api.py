@@ -1 +1,14 @@
-# test_ui_api.py placeholder content
\ No newline at end of file
+import httpx
+
+def test_live_server_is_ready(live_server):
+    """The live server fixture only yields once /ready reports OK"""
+    response = httpx.get(f"{live_server}/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+def test_live_server_serves_frontend(live_server):
+    """The frontend the Playwright tests drive is served from the live server"""
+    response = httpx.get(f"{live_server}/")
+    assert response.status_code == 200
+    assert "CKD Prediction System" in response.text
+    assert httpx.get(f"{live_server}/health").json() == {"status": "healthy"}
@@ -0,0 +1,68 @@
+import json
+import zlib
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from backend.web import CompressionMiddleware, FastJSONResponse, accepted_encodings, dumps
+from test_api import valid_patient_data
+
+def test_frontend_is_cached_and_revalidated(test_client):
+    """/ and /static answer with ETag and Cache-Control, then 304 while unchanged"""
+    response = test_client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == "no-cache"
+    assert "localhost:8000" not in response.text
+    etag = response.headers["etag"]
+    revalidated = test_client.get("/", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert test_client.get("/", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+    asset = test_client.get("/static/metrics/confusion_matrix.png")
+    assert asset.headers["cache-control"].startswith("public, max-age=")
+    assert "content-encoding" not in asset.headers
+    revalidated = test_client.get("/static/metrics/confusion_matrix.png", headers={"If-None-Match": asset.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["cache-control"] == asset.headers["cache-control"]
+
+def test_responses_are_compressed_above_threshold(test_client):
+    """Large JSON bodies are gzipped, small ones and event streams are not"""
+    records = [{**valid_patient_data(), "age": 20 + i} for i in range(40)]
+    response = test_client.post("/predict/batch", json={"records": records}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()["results"]) == 40
+
+    assert "content-encoding" not in test_client.get("/health", headers={"Accept-Encoding": "gzip"}).headers
+    with test_client.stream("POST", "/predict/stream", json={"data": valid_patient_data()}, headers={"Accept-Encoding": "gzip"}) as stream:
+        assert "content-encoding" not in stream.headers
+        assert "event: " in stream.read().decode()
+    assert accepted_encodings(Headers({"accept-encoding": "gzip;q=0, br ,deflate;q=0.5"})) == {"br", "deflate"}
+
+def test_streamed_bodies_are_compressed_chunk_by_chunk():
+    """Each streamed chunk is flushed as decodable gzip and Content-Length is dropped"""
+    chunks = [b"x" * 2000, b"y" * 10, b"z" * 300]
+
+    async def stream(request):
+        async def body():
+            for chunk in chunks:
+                yield chunk
+        return StreamingResponse(body(), media_type="text/plain", headers={"Content-Length": "2310"})
+
+    app = CompressionMiddleware(Starlette(routes=[Route("/", stream)]), minimum_size=1024)
+    with TestClient(app) as client:
+        with client.stream("GET", "/", headers={"Accept-Encoding": "gzip"}) as response:
+            assert response.headers["content-encoding"] == "gzip"
+            assert response.headers["vary"] == "Accept-Encoding"
+            assert "content-length" not in response.headers
+            raw = b"".join(response.iter_raw())
+        assert zlib.decompress(raw, 16 + zlib.MAX_WBITS) == b"".join(chunks)
+        assert "content-encoding" not in client.get("/", headers={"Accept-Encoding": "identity"}).headers
+
+def test_fast_json_matches_stdlib():
+    """dumps gives compact JSON that reads back like json.dumps, with or without orjson"""
+    payload = {"prediction": 0.25, "risk_factors": ["age", "anämie"], "nested": {"n": [1, None, True]}}
+    assert json.loads(dumps(payload)) == payload
+    assert dumps(payload) == json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+    assert FastJSONResponse(payload).body == dumps(payload)